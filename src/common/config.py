@@ -1,6 +1,8 @@
 
 import logging
+import os
 from starlette.config import Config
+from starlette.datastructures import CommaSeparatedStrings
 
 logging.getLogger("watchfiles").setLevel(logging.WARNING)
 log = logging.getLogger(__name__)
@@ -38,6 +40,31 @@ MILVUS_DATABASE_NAME = config("MILVUS_DATABASE_NAME", default="stock_data")
 MILVUS_DATABASE_PORT = config("MILVUS_DATABASE_PORT", default="19530")
 # endregion
 
+# region candles cache
+CANDLES_CACHE_ENABLED = config("CANDLES_CACHE_ENABLED", cast=bool, default=True)
+CANDLES_CACHE_DIR = config("CANDLES_CACHE_DIR", default=".cache/candles")
+CANDLES_MEMORY_CACHE_MAX_MB = config("CANDLES_MEMORY_CACHE_MAX_MB", cast=int, default=512)
+CANDLES_STORED_TIMEFRAMES = config("CANDLES_STORED_TIMEFRAMES", cast=CommaSeparatedStrings, default="1m,5m,60m,1d")  # Other timeframes are resampled from these; each needs a source synced over a window at least as long as its own
+CANDLES_SYNC_MAX_WORKERS = config("CANDLES_SYNC_MAX_WORKERS", cast=int, default=8)  # Concurrent downloads from the data provider
+CANDLES_SYNC_REQUESTS_PER_SECOND = config("CANDLES_SYNC_REQUESTS_PER_SECOND", cast=float, default=2.0)  # Provider rate limit, 0 for none
+CANDLES_SYNC_WRITE_BATCH_SIZE = config("CANDLES_SYNC_WRITE_BATCH_SIZE", cast=int, default=50_000)  # Downloaded candles deduplicated and inserted together
+# endregion
+
+# region backtests
+BACKTEST_EXECUTOR_MODE = config("BACKTEST_EXECUTOR_MODE", default="thread")  # sequential | thread | process
+BACKTEST_MAX_WORKERS = config("BACKTEST_MAX_WORKERS", cast=int, default=os.cpu_count() or 1)
+BACKTEST_JOBS_MAX_CONCURRENT = config("BACKTEST_JOBS_MAX_CONCURRENT", cast=int, default=2)
+BACKTEST_JOBS_MAX_FINISHED = config("BACKTEST_JOBS_MAX_FINISHED", cast=int, default=100)  # Finished jobs kept for polling
+BACKTEST_LAZY_STREAMING = config("BACKTEST_LAZY_STREAMING", cast=bool, default=False)  # Collect the lazy engine's plan with the streaming engine
+BACKTEST_SWEEP_MAX_POINTS = config("BACKTEST_SWEEP_MAX_POINTS", cast=int, default=500)  # Largest parameter grid a sweep accepts
+BACKTEST_RESULT_CACHE_ENABLED = config("BACKTEST_RESULT_CACHE_ENABLED", cast=bool, default=True)  # Reuse stored results of identical backtests
+BACKTEST_EXTENSION_WARMUP_FACTOR = config("BACKTEST_EXTENSION_WARMUP_FACTOR", cast=int, default=20)  # Warmup bars per bar of the largest indicator window when extending a stored backtest
+BACKTEST_EXTENSION_MIN_WARMUP_BARS = config("BACKTEST_EXTENSION_MIN_WARMUP_BARS", cast=int, default=200)
+BACKTEST_PORTFOLIO_INITIAL_CAPITAL = config("BACKTEST_PORTFOLIO_INITIAL_CAPITAL", cast=float, default=100_000.0)
+BACKTEST_PORTFOLIO_POSITION_SIZE = config("BACKTEST_PORTFOLIO_POSITION_SIZE", cast=float, default=0.1)  # Fraction of equity allocated per position
+BACKTEST_PORTFOLIO_MAX_POSITIONS = config("BACKTEST_PORTFOLIO_MAX_POSITIONS", cast=int, default=10)  # Open positions at once, 0 for no limit
+# endregion
+
 # region openai
 OPENAI_API_KEY = config("OPENAI_API_KEY", cast=Secret)
 # endregion
\ No newline at end of file
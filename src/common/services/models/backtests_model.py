@@ -1,5 +1,5 @@
 from pydantic import Field
-from typing import Optional
+from typing import Any, Dict, Optional
 from server.src.common.base.mongo_base_model import MongoBaseModel
 from server.src.common.types import PydanticObjectId
 
@@ -12,5 +12,9 @@ class BackTestsModel(MongoBaseModel):
     entry_conditions_id: str = Field(..., description="string of entry conditions symbol sorted by abc and combined by -")
     exit_conditions: list[str] = Field(..., description="List of exit conditions")
     exit_conditions_id: str = Field(..., description="string of exit conditions symbol sorted by abc and combined by -")
-    trades: list[str] = Field(..., description="List of trades executed during the backtest")
-    profit: float = Field(..., description="Total profit earned during the backtest")
\ No newline at end of file
+    trades: list[Dict[str, Any]] = Field(..., description="List of trades executed during the backtest")
+    profit: float = Field(..., description="Total profit earned during the backtest")
+    cache_key: str = Field(..., description="Hash of ticker, range, engine and each condition's symbol, params and code version")
+    engine_type: str = Field(..., description="Backtest engine the trades were produced by")
+    base_key: str = Field(..., description="Hash of the cache key fields except the end date, shared by extensions of one backtest")
+    resume_state: Optional[Dict[str, Any]] = Field(None, description="Where an extension with later candles restarts, see backtests_extension")
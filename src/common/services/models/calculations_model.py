@@ -40,5 +40,6 @@ class DataFrameByTimeFrames(TypedDict):
     TimeFrame: pl.DataFrame
 
 
-class CompiledCalc(TypedDict):
+class CompiledCalc(TypedDict, total=False):
     calc_pl: Callable[[DataFrameByTimeFrames, Dict[str, Any]], DataFrameByTimeFrames]
+    calc_expr: Callable[[Dict[str, Any]], Union[pl.Expr, List[pl.Expr]]]  # Optional expression form, fusable into lazy plans
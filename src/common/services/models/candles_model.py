@@ -23,3 +23,9 @@ class CandleStickModel(BaseModel):
     high: float = Field(..., description="The highest price")
     low: float = Field(..., description="The lowest price")
     close: float = Field(..., description="The closing price")
+
+class CandleSyncWatermarkModel(MongoBaseModel):
+    stock_name: str = Field(..., description="The name of the stock")
+    timeframe: str = Field(..., description="The synced timeframe")
+    last_datetime: dt = Field(..., description="Datetime of the latest synced candle")
+    synced_at: dt = Field(..., description="When the stock and timeframe were last synced")
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import Callable, List, Optional, Dict, Any, TypedDict
 from bson import ObjectId
 
 from common.base.mongo_base_model import MongoBaseModel
@@ -24,3 +24,13 @@ class ConditionsModel(MongoBaseModel):
     required_calculations: List[str] = Field(..., description="Other calculations required by this condition (e.g., 'Sma', 'Rsi')")
     calc_pl: str = Field(..., description="Python class definition for this condition")
     embedding: Optional[List[float]] = Field(None, description="Embedding to find and validate conditions")
+
+
+class ConditionPlan(TypedDict):
+    symbol: str
+    version: str  # Hash of the condition's calc_pl and of its calculation closure
+    params: Dict[str, Any]  # The condition's default params
+    calc_pl: Callable[[Dict[str, Any], Dict[str, Any]], Any]
+    calc_expr: Optional[Callable[[Dict[str, Any]], Any]]  # Condition as one boolean pl.Expr on its timeframe, when defined
+    calc_pl_source: str
+    calculation_sources: Dict[str, str]  # Required calculation symbol -> calc_pl, dependencies first
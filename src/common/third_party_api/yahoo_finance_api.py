@@ -55,7 +55,8 @@ class YahooFinanceApi(StockDataApi):
         - interval: The data interval (e.g., '1d', '1h', '5m').
         Returns: Polars DataFrame with stock data.
         """
-        stock_data = yf.download(ticker, start=start_date, end=end_date, interval=interval)
+        # Ticker.history keeps no module level state, unlike yf.download, so concurrent syncs do not mix tickers
+        stock_data = yf.Ticker(ticker).history(start=start_date, end=end_date, interval=interval, auto_adjust=False)
         stock_data["Datetime"] = stock_data.index
         
         # Convert Pandas DataFrame to Polars DataFrame
@@ -0,0 +1,29 @@
+import threading
+from time import monotonic, sleep
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket: allows `rate` calls per second on average and bursts of up to `burst` calls.
+    """
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated_at = monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a call is allowed. A rate of 0 or less disables limiting."""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            sleep(wait)
@@ -1,7 +1,18 @@
+import asyncio
+
+from fastapi import HTTPException
+
 from common.base.base_api import BaseApi
 from typing import Any, Dict, List
 from features.big_data.backtests.backtests_orch import BackTestsOrch
-from server.src.features.big_data.backtests.contracts.backtests_api_contract import BackTestCondition, BackTestPosition, BackTestRequest, BackTestResponse
+from features.big_data.backtests.backtests_jobs_manager import BacktestJob
+from server.src.common.config import BACKTEST_SWEEP_MAX_POINTS
+from server.src.features.big_data.backtests.contracts.backtests_api_contract import (BackTestCondition, BackTestEquityPoint, BackTestJobResponse, BackTestMetrics, BackTestPortfolioRequest,
+                                                                                     BackTestPortfolioResponse, BackTestPortfolioSummary, BackTestPortfolioTrade,
+                                                                                     BackTestPosition, BackTestRequest, BackTestResponse,
+                                                                                     BackTestSweepRequest, BackTestSweepResponse, BackTestSweepRow,
+                                                                                     BackTestWalkForwardRequest, BackTestWalkForwardResponse, BackTestWalkForwardWindow)
+from server.src.features.big_data.backtests.types import BacktestEngineOptions, BacktestPortfolioResult, BacktestRunResult, BacktestSweepResult, BacktestWalkForwardResult
 from server.src.common.services.models.backtests_model import BackTestsModel
 
 class BacktestsApi(BaseApi[BackTestsOrch, BackTestsModel]):
@@ -10,24 +21,112 @@ class BacktestsApi(BaseApi[BackTestsOrch, BackTestsModel]):
         super().__init__(BackTestsOrch(), enabled_routes=enabled_routes, dependencies=dependencies)
         self.router.post("/run_example", dependencies=dependencies)(self.run_example) #type:ignore
         self.router.post("/backtest", dependencies=dependencies)(self.backtest) #type:ignore
+        self.router.post("/jobs", dependencies=dependencies)(self.submit_backtest_job) #type:ignore
+        self.router.get("/jobs/{job_id}", dependencies=dependencies)(self.get_backtest_job) #type:ignore
+        self.router.get("/jobs/{job_id}/result", dependencies=dependencies)(self.get_backtest_job_result) #type:ignore
+        self.router.post("/sweep", dependencies=dependencies)(self.sweep) #type:ignore
+        self.router.post("/walk_forward", dependencies=dependencies)(self.walk_forward) #type:ignore
+        self.router.post("/portfolio", dependencies=dependencies)(self.portfolio_backtest) #type:ignore
 
     async def run_example(self):
         return self.orch.run_example() 
     
     async def backtest(self, request: BackTestRequest):
+        # Runs on the jobs pool and awaits it, so the event loop stays free while the backtest runs
+        job = self._submit(request)
+        result = await asyncio.wrap_future(job.future)
+        return self._to_response(result)
+
+    async def sweep(self, request: BackTestSweepRequest):
+        point_count = self.orch.count_sweep_points(request.entry_conditions, request.exit_conditions)
+        if point_count > BACKTEST_SWEEP_MAX_POINTS:
+            raise HTTPException(status_code=400, detail=f"Sweep has {point_count} combinations, the limit is {BACKTEST_SWEEP_MAX_POINTS}")
+
+        job = self.orch.submit_sweep(stocks=request.tickers, from_date=request.from_datetime, to_date=request.to_datetime,
+                                     entry_conditions=request.entry_conditions, exit_conditions=request.exit_conditions,
+                                     type=request.type, rank_by=request.rank_by, top=request.top,
+                                     executor_mode=request.executor, max_workers=request.max_workers,
+                                     engine_options=BacktestEngineOptions(stop_loss=request.stop_loss, take_profit=request.take_profit,
+                                                                          position_mode=request.position_mode))
+        result: BacktestSweepResult = await asyncio.wrap_future(job.future)
+        rows = [
+            BackTestSweepRow(entry_params=row['point']['entry_params'], exit_params=row['point']['exit_params'],
+                             trades=row['trades'], total_profit=row['total_profit'], avg_profit=row['avg_profit'],
+                             win_rate=row['win_rate'], profit_by_stock=row['profit_by_stock'])
+            for row in result['rows']
+        ]
+        return BackTestSweepResponse(rows=rows, timings=result['timings'])
+
+    async def walk_forward(self, request: BackTestWalkForwardRequest):
+        entry_conditions = [BackTestCondition(symbol=condition.symbol, params=condition.params) for condition in request.entry_conditions]
+        exit_conditions = [BackTestCondition(symbol=condition.symbol, params=condition.params) for condition in request.exit_conditions]
+        job = self.orch.submit_walk_forward(stocks=request.tickers, from_date=request.from_datetime, to_date=request.to_datetime,
+                                            entry_conditions=entry_conditions, exit_conditions=exit_conditions, type=request.type,
+                                            train_days=request.train_days, test_days=request.test_days,
+                                            step_days=request.step_days, anchored=request.anchored,
+                                            executor_mode=request.executor, max_workers=request.max_workers,
+                                            engine_options=BacktestEngineOptions(stop_loss=request.stop_loss, take_profit=request.take_profit,
+                                                                                 position_mode=request.position_mode),
+                                            use_cache=request.use_cache)
+        result: BacktestWalkForwardResult = await asyncio.wrap_future(job.future)
+        return BackTestWalkForwardResponse(windows=[BackTestWalkForwardWindow(**window) for window in result['windows']],
+                                           timings=result['timings'])
+
+    async def portfolio_backtest(self, request: BackTestPortfolioRequest):
+        entry_conditions = [BackTestCondition(symbol=condition.symbol, params=condition.params) for condition in request.entry_conditions]
+        exit_conditions = [BackTestCondition(symbol=condition.symbol, params=condition.params) for condition in request.exit_conditions]
+        job = self.orch.submit_portfolio_backtest(stocks=request.tickers, from_date=request.from_datetime, to_date=request.to_datetime,
+                                                  entry_conditions=entry_conditions, exit_conditions=exit_conditions,
+                                                  initial_capital=request.initial_capital, position_size=request.position_size,
+                                                  max_positions=request.max_positions, equity_every=request.equity_every)
+        result: BacktestPortfolioResult = await asyncio.wrap_future(job.future)
+        return BackTestPortfolioResponse(trades=[BackTestPortfolioTrade(**trade) for trade in result['trades']],
+                                         equity_curve=[BackTestEquityPoint(**point) for point in result['equity_curve']],
+                                         summary=BackTestPortfolioSummary(**result['summary']), seconds=result['seconds'])
+
+    async def submit_backtest_job(self, request: BackTestRequest):
+        return self._to_job_response(self._submit(request))
+
+    async def get_backtest_job(self, job_id: str):
+        return self._to_job_response(self._get_job(job_id))
+
+    async def get_backtest_job_result(self, job_id: str):
+        job = self._get_job(job_id)
+        if job.status == 'failed':
+            raise HTTPException(status_code=500, detail=job.error)
+        if job.status != 'completed':
+            raise HTTPException(status_code=409, detail=f"Backtest job {job_id} is {job.status}")
+        return self._to_response(job.future.result())
+
+    def _submit(self, request: BackTestRequest) -> BacktestJob:
         entry_conditions = [BackTestCondition(symbol=condition.symbol, params=condition.params) for condition in request.entry_conditions]
         exit_conditions = [BackTestCondition(symbol=condition.symbol, params=condition.params) for condition in request.exit_conditions]
         
-        raw_positions=self.orch.backtest(stocks=request.tickers, from_date=request.from_datetime, to_date=request.to_datetime,
-                                entry_conditions=entry_conditions, exit_conditions=exit_conditions,
-                                type=request.type)
-               
+        return self.orch.submit_backtest(stocks=request.tickers, from_date=request.from_datetime, to_date=request.to_datetime,
+                                         entry_conditions=entry_conditions, exit_conditions=exit_conditions,
+                                         type=request.type, executor_mode=request.executor, max_workers=request.max_workers,
+                                         engine_options=BacktestEngineOptions(stop_loss=request.stop_loss, take_profit=request.take_profit,
+                                                                              position_mode=request.position_mode),
+                                         use_cache=request.use_cache, include_trades=request.include_trades,
+                                         include_metrics=request.include_metrics)
+
+    def _get_job(self, job_id: str) -> BacktestJob:
+        job = self.orch.get_backtest_job(job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail=f"Backtest job {job_id} not found")
+        return job
+
+    def _to_job_response(self, job: BacktestJob) -> BackTestJobResponse:
+        return BackTestJobResponse(job_id=job.job_id, status=job.status, submitted_at=job.submitted_at,
+                                   started_at=job.started_at, finished_at=job.finished_at, error=job.error)
+
+    def _to_response(self, result: BacktestRunResult) -> BackTestResponse:
         positions = {
             ticker: [
                 BackTestPosition(**position) for position in positions
-            ] for ticker, positions in raw_positions.items()
+            ] for ticker, positions in result["positions_by_stock"].items()
         }
         
-        res = BackTestResponse(positions=positions)
+        metrics = {ticker: BackTestMetrics(**metrics) for ticker, metrics in result.get("metrics_by_stock", {}).items()}
+        res = BackTestResponse(positions=positions, timings=result["timings"], metrics=metrics)
         return res
-        
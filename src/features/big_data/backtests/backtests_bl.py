@@ -1,3 +1,5 @@
+from datetime import date, datetime, time
+from typing import Any, Dict, List
 
 from common.base.base_mongo_bl import BaseMongoBl
 from features.big_data.backtests.backtests_dal import BackTestsDal
@@ -6,3 +8,23 @@ from server.src.common.services.models.backtests_model import BackTestsModel
 class BackTestsBl(BaseMongoBl[BackTestsDal, BackTestsModel]):
     def __init__(self):
         super().__init__(BackTestsDal)
+
+    def get_cached_backtests(self, cache_keys: List[str]) -> Dict[str, BackTestsModel]:
+        return self.dal.get_backtests_by_cache_keys(cache_keys)
+
+    def get_latest_backtests(self, base_keys: List[str], before_to_datetime: str) -> Dict[str, BackTestsModel]:
+        return self.dal.get_latest_backtests_by_base_keys(base_keys, before_to_datetime)
+
+    def save_backtests(self, documents: List[Dict[str, Any]]) -> Dict[str, int]:
+        for document in documents:
+            document['trades'] = [
+                {key: self._to_bson_value(value) for key, value in trade.items()} for trade in document['trades']
+            ]
+        return self.dal.upsert_backtests(documents)
+
+    @staticmethod
+    def _to_bson_value(value: Any) -> Any:
+        # BSON has no date-only type, so dates (e.g. entry_date) are stored as midnight datetimes
+        if isinstance(value, date) and not isinstance(value, datetime):
+            return datetime.combine(value, time.min)
+        return value
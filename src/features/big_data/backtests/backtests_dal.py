@@ -1,26 +1,66 @@
 
-from pymongo import ASCENDING
+from typing import Any, Dict, List
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
 from common.base.base_mongo_dal import BaseMongoDal
 from common.services.models.backtests_model import BackTestsModel
 from server.src.common.utils.singleton import singleton
 
 COLLECTION_NAME = "backtests"
+LEGACY_UNIQUE_INDEX = "ticker_1_from_datetime_1_to_datetime_1_entry_conditions_id_1_exit_conditions_id_1"
 
 @singleton
 class BackTestsDal(BaseMongoDal[BackTestsModel]):
     def __init__(self):
         super().__init__(collection_name="backtests", data_class=BackTestsModel)
-        # Ensure the combination of 'ticker', 'from_datetime', 'to_datetime', 'entry_conditions_id', and 'exit_conditions_id' is unique
-        self.collection.create_index(
-            [
-                ("ticker", ASCENDING),
-                ("from_datetime", ASCENDING),
-                ("to_datetime", ASCENDING),
-                ("entry_conditions_id", ASCENDING),
-                ("exit_conditions_id", ASCENDING),
-            ],
-            unique=True,
-        )
+        # Results are addressed by their cache key; the old (ticker, range, condition symbols) key
+        # could not tell apart runs with different params, code versions or engines.
+        # Documents are stored with the model's camelCase aliases, so queries and indexes use them too
+        if LEGACY_UNIQUE_INDEX in self.collection.index_information():
+            self.collection.drop_index(LEGACY_UNIQUE_INDEX)
+        self.collection.create_index([("cacheKey", ASCENDING)], unique=True)
+        self.collection.create_index([("baseKey", ASCENDING), ("toDatetime", DESCENDING)])
+
+    def get_backtests_by_cache_keys(self, cache_keys: List[str]) -> Dict[str, BackTestsModel]:
+        """
+        Retrieves the cached backtests of several keys with a single query.
+        Returns a dict of cache key to BackTestsModel, without the keys that are not cached.
+        """
+        if not cache_keys:
+            return {}
+        return {backtest.cache_key: backtest for backtest in self.find({"cacheKey": {"$in": cache_keys}})}
+
+    def get_latest_backtests_by_base_keys(self, base_keys: List[str], before_to_datetime: str) -> Dict[str, BackTestsModel]:
+        """
+        Retrieves, for each base key, the stored backtest with the latest end date before before_to_datetime.
+        Returns a dict of base key to BackTestsModel, without the keys that have none.
+        """
+        if not base_keys:
+            return {}
+        pipeline = [
+            {"$match": {"baseKey": {"$in": base_keys}, "toDatetime": {"$lt": before_to_datetime}}},
+            {"$sort": {"baseKey": 1, "toDatetime": -1}},
+            {"$group": {"_id": "$baseKey", "backtest": {"$first": "$$ROOT"}}},
+        ]
+        return {document["_id"]: self.data_class(**document["backtest"]) for document in self.aggregate(pipeline)}
+
+    def upsert_backtests(self, documents: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Writes backtest results by cache key in one unordered bulk write.
+        Returns the upserted and modified counts.
+        """
+        if not documents:
+            return {"upserted_count": 0, "modified_count": 0}
+        operations = [
+            UpdateOne({"cacheKey": document["cache_key"]}, {"$set": self.data_class(**document).model_dump(by_alias=True, exclude={'id'})}, upsert=True)
+            for document in documents
+        ]
+        try:
+            result = self.collection.bulk_write(operations, ordered=False)
+            return {"upserted_count": result.upserted_count, "modified_count": result.modified_count}
+        except BulkWriteError as bwe:
+            print(f"Bulk write error: {bwe.details}")
+            raise
 
     def get_backtest_by_ticker(self, ticker: str) -> BackTestsModel:
         """
@@ -0,0 +1,217 @@
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from time import perf_counter
+from typing import Any, Dict, Iterable, List, Tuple
+
+import polars as pl
+import polars_talib as plta
+
+from features.big_data.backtests.engines.back_test_engine_vectorized_first_daily_trade import BackTestEngineVectorizedFirstDailyTrade
+from features.big_data.backtests.engines.backtest_engine_lazy import BackTestEngineLazy
+from features.big_data.backtests.engines.backtest_engine_numba import BackTestEngineNumba
+from features.big_data.backtests.engines.backtest_engine_models import BacktestEngineCondition, BacktestFrames
+from features.big_data.backtests.engines.backtest_engine_vectorized_each_day import BackTestEngineVectorizedEachDay
+from server.src.features.big_data.calculations.compile_utils import calc_pl_from_expr, exec_definitions
+from server.src.features.big_data.calculations.indicator_cache import IndicatorCache, attach_indicator, make_calc_indicator, make_indicator_expr
+from server.src.features.big_data.calculations.timeframe_alignment import TimeframeAlignment, align_timeframe
+from server.src.features.big_data.backtests.types import (BacktestConditionSource, BacktestEngineOptions, BacktestEngineType, BacktestExecutorMode,
+                                                        BacktestRunResult, BacktestSweepPoint, BacktestTradesSummary)
+
+logger = logging.getLogger(__name__)
+
+
+def run_ticker_backtest(dfs: Dict[str, pl.DataFrame], entry_conditions: List[BacktestEngineCondition],
+                        exit_conditions: List[BacktestEngineCondition], engine_type: BacktestEngineType,
+                        engine_options: BacktestEngineOptions | None = None) -> Tuple[List[Dict[str, Any]], float]:
+    """Runs one ticker through the selected engine and returns its positions and the seconds it took."""
+    start_time = perf_counter()
+    dfs = BacktestFrames(dfs)  # Fresh indicator cache and timeframe alignment shared by this ticker's entry and exit conditions
+    trades = _run_engine(dfs, entry_conditions, exit_conditions, engine_type, engine_options)
+    return trades.to_dicts(), perf_counter() - start_time
+
+
+def run_ticker_sweep(dfs: Dict[str, pl.DataFrame], entry_conditions: List[BacktestEngineCondition],
+                     exit_conditions: List[BacktestEngineCondition], points: List[BacktestSweepPoint],
+                     engine_type: BacktestEngineType, engine_options: BacktestEngineOptions | None = None) -> Tuple[List[BacktestTradesSummary], float]:
+    """
+    Runs one ticker through every sweep point and returns a trades summary per point and the seconds it took.
+    All points share one indicator cache and timeframe alignment, so an indicator or a cross-timeframe row mapping
+    used by several points is computed once per ticker.
+    """
+    start_time = perf_counter()
+    indicator_cache = IndicatorCache()
+    timeframe_alignment = TimeframeAlignment()
+    summaries = []
+    for point in points:
+        point_entry_conditions = [BacktestEngineCondition(condition.name, params, condition.calc, condition.expr)
+                                  for condition, params in zip(entry_conditions, point['entry_params'])]
+        point_exit_conditions = [BacktestEngineCondition(condition.name, params, condition.calc, condition.expr)
+                                 for condition, params in zip(exit_conditions, point['exit_params'])]
+        # Engines write their working frame back into dfs, so each point starts from the loaded candles
+        point_dfs = BacktestFrames(dfs, indicator_cache, timeframe_alignment)
+        trades = _run_engine(point_dfs, point_entry_conditions, point_exit_conditions, engine_type, engine_options)
+        summaries.append(summarize_trades(trades))
+    logger.debug("Sweep indicator cache: %s", indicator_cache.get_stats())
+    return summaries, perf_counter() - start_time
+
+
+def summarize_trades(trades: pl.DataFrame) -> BacktestTradesSummary:
+    count = trades.height
+    total_profit = float(trades['profit'].sum()) if count else 0.0
+    return BacktestTradesSummary(
+        trades=count,
+        total_profit=total_profit,
+        avg_profit=total_profit / count if count else 0.0,
+        win_rate=float((trades['profit'] > 0).sum()) / count if count else 0.0,
+    )
+
+
+def merge_trades_summaries(summaries: Iterable[BacktestTradesSummary]) -> BacktestTradesSummary:
+    """Combines summaries of disjoint trade sets, e.g. of several tickers, into one."""
+    summaries = list(summaries)
+    count = sum(summary['trades'] for summary in summaries)
+    total_profit = sum(summary['total_profit'] for summary in summaries)
+    wins = sum(summary['win_rate'] * summary['trades'] for summary in summaries)
+    return BacktestTradesSummary(
+        trades=count,
+        total_profit=total_profit,
+        avg_profit=total_profit / count if count else 0.0,
+        win_rate=wins / count if count else 0.0,
+    )
+
+
+def _run_engine(dfs: BacktestFrames, entry_conditions: List[BacktestEngineCondition], exit_conditions: List[BacktestEngineCondition],
+                engine_type: BacktestEngineType, engine_options: BacktestEngineOptions | None) -> pl.DataFrame:
+    engine_options = engine_options or {}
+    if engine_type == 'first_daily_trade':
+        return BackTestEngineVectorizedFirstDailyTrade().backtest(dfs, entry_conditions, exit_conditions)
+    if engine_type == 'each_day':
+        return BackTestEngineVectorizedEachDay(engine_options.get('position_mode')).backtest(dfs, entry_conditions, exit_conditions)
+    if engine_type == 'lazy':
+        return BackTestEngineLazy().backtest(dfs, entry_conditions, exit_conditions)
+    if engine_type == 'numba':
+        return BackTestEngineNumba(engine_options.get('stop_loss'), engine_options.get('take_profit')).backtest(dfs, entry_conditions, exit_conditions)
+    raise ValueError(f"Unknown backtest type: {engine_type}")
+
+
+def compile_condition_source(source: BacktestConditionSource) -> BacktestEngineCondition:
+    """
+    Rebuilds a condition from its source the same way ConditionsBl and CalculationsBl compile it,
+    for worker processes that cannot receive exec'd functions by pickling.
+    """
+    namespace: Dict[str, Any] = {'__builtins__': __builtins__, 'pl': pl, 'plta': plta}
+    for calculation_symbol, calc_pl in source['calculations'].items():
+        calculation_namespace = exec_definitions(calc_pl, f"<calculation {calculation_symbol}>", namespace)
+        if 'calc_pl' not in calculation_namespace and 'calc_expr' in calculation_namespace:
+            calculation_namespace['calc_pl'] = calc_pl_from_expr(calculation_namespace['calc_expr'])
+        namespace[calculation_symbol] = calculation_namespace
+
+    calculations = {symbol: namespace[symbol] for symbol in source['calculations']}
+    condition_namespace = exec_definitions(source['calc_pl'], f"<condition {source['symbol']}>", {
+        **namespace, 'attach_indicator': attach_indicator, 'align_timeframe': align_timeframe,
+        'calc_indicator': make_calc_indicator(calculations), 'indicator_expr': make_indicator_expr(calculations),
+    })
+    return BacktestEngineCondition(name=source['symbol'], params=source['params'], calc=condition_namespace['calc_pl'],
+                                   expr=condition_namespace.get('calc_expr'))
+
+
+def _run_ticker_backtest_in_process(dfs: Dict[str, pl.DataFrame], entry_sources: List[BacktestConditionSource],
+                                    exit_sources: List[BacktestConditionSource], engine_type: BacktestEngineType,
+                                    engine_options: BacktestEngineOptions | None) -> Tuple[List[Dict[str, Any]], float]:
+    entry_conditions = [compile_condition_source(source) for source in entry_sources]
+    exit_conditions = [compile_condition_source(source) for source in exit_sources]
+    return run_ticker_backtest(dfs, entry_conditions, exit_conditions, engine_type, engine_options)
+
+
+def _run_ticker_sweep_in_process(dfs: Dict[str, pl.DataFrame], entry_sources: List[BacktestConditionSource],
+                                 exit_sources: List[BacktestConditionSource], points: List[BacktestSweepPoint],
+                                 engine_type: BacktestEngineType, engine_options: BacktestEngineOptions | None) -> Tuple[List[BacktestTradesSummary], float]:
+    # Conditions are compiled once per process; the points only change their params
+    entry_conditions = [compile_condition_source(source) for source in entry_sources]
+    exit_conditions = [compile_condition_source(source) for source in exit_sources]
+    return run_ticker_sweep(dfs, entry_conditions, exit_conditions, points, engine_type, engine_options)
+
+
+class BacktestsExecutor:
+    """
+    Fans independent per-ticker backtests out over a thread or process pool.
+    Threads suit the Polars-heavy engines, which release the GIL; processes suit Python-heavy condition code.
+    """
+    def __init__(self, mode: BacktestExecutorMode, max_workers: int):
+        self.mode = mode
+        self.max_workers = max(1, max_workers)
+
+    def run(self, dfs_by_stock: Dict[str, Dict[str, pl.DataFrame]],
+            entry_conditions: List[BacktestEngineCondition], exit_conditions: List[BacktestEngineCondition],
+            entry_sources: List[BacktestConditionSource], exit_sources: List[BacktestConditionSource],
+            engine_type: BacktestEngineType, engine_options: BacktestEngineOptions | None = None) -> BacktestRunResult:
+        """
+        Backtests every stock and merges the results in the order of dfs_by_stock.
+        Compiled conditions are used in-process; their sources are shipped to worker processes instead.
+        """
+        positions_by_stock: Dict[str, List[Dict[str, Any]]] = {}
+        timings: Dict[str, float] = {}
+
+        if self.mode == 'sequential' or len(dfs_by_stock) <= 1 or self.max_workers == 1:
+            for stock, dfs in dfs_by_stock.items():
+                positions_by_stock[stock], timings[stock] = run_ticker_backtest(dfs, entry_conditions, exit_conditions, engine_type, engine_options)
+            return BacktestRunResult(positions_by_stock=positions_by_stock, timings=timings)
+
+        max_workers = min(self.max_workers, len(dfs_by_stock))
+        with self._create_pool(max_workers) as pool:
+            if self.mode == 'process':
+                futures = {
+                    stock: pool.submit(_run_ticker_backtest_in_process, dfs, entry_sources, exit_sources, engine_type, engine_options)
+                    for stock, dfs in dfs_by_stock.items()
+                }
+            else:
+                futures = {
+                    stock: pool.submit(run_ticker_backtest, dfs, entry_conditions, exit_conditions, engine_type, engine_options)
+                    for stock, dfs in dfs_by_stock.items()
+                }
+            for stock, future in futures.items():
+                positions_by_stock[stock], timings[stock] = future.result()
+
+        return BacktestRunResult(positions_by_stock=positions_by_stock, timings=timings)
+
+    def run_sweep(self, dfs_by_stock: Dict[str, Dict[str, pl.DataFrame]],
+                  entry_conditions: List[BacktestEngineCondition], exit_conditions: List[BacktestEngineCondition],
+                  entry_sources: List[BacktestConditionSource], exit_sources: List[BacktestConditionSource],
+                  points: List[BacktestSweepPoint], engine_type: BacktestEngineType,
+                  engine_options: BacktestEngineOptions | None = None) -> Tuple[Dict[str, List[BacktestTradesSummary]], Dict[str, float]]:
+        """
+        Sweeps every stock over all points, one task per stock, and returns the summaries per stock (in point order) and the timings.
+        """
+        summaries_by_stock: Dict[str, List[BacktestTradesSummary]] = {}
+        timings: Dict[str, float] = {}
+
+        if self.mode == 'sequential' or len(dfs_by_stock) <= 1 or self.max_workers == 1:
+            for stock, dfs in dfs_by_stock.items():
+                summaries_by_stock[stock], timings[stock] = run_ticker_sweep(dfs, entry_conditions, exit_conditions, points, engine_type, engine_options)
+            return summaries_by_stock, timings
+
+        max_workers = min(self.max_workers, len(dfs_by_stock))
+        with self._create_pool(max_workers) as pool:
+            if self.mode == 'process':
+                futures = {
+                    stock: pool.submit(_run_ticker_sweep_in_process, dfs, entry_sources, exit_sources, points, engine_type, engine_options)
+                    for stock, dfs in dfs_by_stock.items()
+                }
+            else:
+                futures = {
+                    stock: pool.submit(run_ticker_sweep, dfs, entry_conditions, exit_conditions, points, engine_type, engine_options)
+                    for stock, dfs in dfs_by_stock.items()
+                }
+            for stock, future in futures.items():
+                summaries_by_stock[stock], timings[stock] = future.result()
+
+        return summaries_by_stock, timings
+
+    def _create_pool(self, max_workers: int) -> Executor:
+        if self.mode == 'process':
+            # Forking after Polars started its thread pool can deadlock the children, so always spawn
+            return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+        if self.mode == 'thread':
+            return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="backtest")
+        raise ValueError(f"Unknown backtest executor mode: {self.mode}")
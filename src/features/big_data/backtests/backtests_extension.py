@@ -0,0 +1,131 @@
+"""
+Incremental extension of a stored backtest with newly synced candles.
+
+A stored run keeps a resume state: the moment from which its trades could still change once later candles exist,
+and the row count and last candle of each frame it ran on. Extending it reloads candles from a warmup tail
+before that moment up to the new end, runs the engine with entries before the moment masked out,
+and appends the new trades to the stored ones that entered earlier.
+Indicators get WARMUP_FACTOR x their largest window of warmup bars, enough for rolling windows to be exact
+and for recursive ones (EMA) to converge to within float precision.
+Stored candles are assumed append-only: an extension never sees changes to bars the stored run used.
+"""
+
+import math
+from datetime import datetime, time, timedelta
+from typing import Any, Dict, List
+
+import polars as pl
+
+from server.src.common.config import BACKTEST_EXTENSION_MIN_WARMUP_BARS, BACKTEST_EXTENSION_WARMUP_FACTOR
+from server.src.features.big_data.backtests.types import BacktestConditionSource, BacktestEngineType, BacktestFrameState, BacktestResumeState
+
+RESUME_SYMBOL = "resumeFrom"
+
+RESUME_CONDITION_SOURCE = """
+import polars as pl
+
+def calc_pl(dfs, params):
+    return dfs[params['condition_timeframe']].select(calc_expr(params))
+
+def calc_expr(params):
+    if params['resume_inclusive']:
+        condition = pl.col('Datetime') >= params['resume_from']
+    else:
+        condition = pl.col('Datetime') > params['resume_from']
+    return condition.alias("Condition")
+"""
+
+_TIMEFRAME_MINUTES = {"1m": 1, "5m": 5, "15m": 15, "30m": 30, "1h": 60, "4h": 240, "1d": 1440}
+_TRADING_MINUTES_PER_DAY = 390  # Regular equity session, the sparsest market the candles come from
+
+
+def get_resume_state(positions: List[Dict[str, Any]], engine_type: BacktestEngineType,
+                     frames: Dict[str, BacktestFrameState]) -> BacktestResumeState | None:
+    """
+    Returns where an extension of this run restarts, or None when it has no closed trade to restart after.
+    The numba engine walks one position at a time, so it restarts right after the last exit;
+    the other engines select entries per day, so they restart at the start of the last exit's day.
+    """
+    exit_times = [position['exit_time'] for position in positions if position.get('exit_time') is not None]
+    if not exit_times:
+        return None
+    last_exit_time = max(exit_times)
+    if engine_type == 'numba':
+        return BacktestResumeState(resume_from=last_exit_time, resume_inclusive=False, frames=frames)
+    day_start = datetime.combine(last_exit_time.date(), time.min, tzinfo=last_exit_time.tzinfo)
+    return BacktestResumeState(resume_from=day_start, resume_inclusive=True, frames=frames)
+
+
+def get_frames_state(dfs: Dict[str, pl.DataFrame]) -> Dict[str, BacktestFrameState]:
+    """Rows and last candle of each frame of a run, with rows counted from the start of the full range."""
+    return {
+        timeframe: BacktestFrameState(rows=int(df['index'][-1]) + 1 if df.height else 0,
+                                      last_datetime=df['Datetime'][-1] if df.height else None)
+        for timeframe, df in dfs.items()
+    }
+
+
+def get_warmup_bars(params_list: List[Dict[str, Any]]) -> int:
+    windows = [value for params in params_list for name, value in params.items()
+               if 'window' in name and isinstance(value, (int, float)) and not isinstance(value, bool)]
+    return max(BACKTEST_EXTENSION_MIN_WARMUP_BARS, int(max(windows, default=0) * BACKTEST_EXTENSION_WARMUP_FACTOR))
+
+
+def get_load_start(from_date: str, resume_state: BacktestResumeState, timeframes: List[str], warmup_bars: int) -> str:
+    """
+    First date to reload so every timeframe has at least warmup_bars before the resume point,
+    assuming the sparsest calendar (regular sessions, five trading days a week, a few holidays).
+    """
+    warmup_days = 0
+    for timeframe in timeframes:
+        bars_per_day = max(1, _TRADING_MINUTES_PER_DAY // _TIMEFRAME_MINUTES.get(timeframe, 1))
+        warmup_days = max(warmup_days, math.ceil(warmup_bars / bars_per_day * 7 / 5) + 5)
+    load_start = resume_state['resume_from'].date() - timedelta(days=warmup_days)
+    return max(load_start, datetime.strptime(from_date, "%Y-%m-%d").date()).isoformat()
+
+
+def align_frames(dfs: Dict[str, pl.DataFrame], resume_state: BacktestResumeState) -> Dict[str, pl.DataFrame] | None:
+    """
+    Renumbers the reloaded frames so their index continues the stored run's rows, as a full rerun would number them.
+    Returns None when a frame no longer lines up with the stored one, e.g. because stored candles changed.
+    """
+    aligned = {}
+    for timeframe, df in dfs.items():
+        frame_state = resume_state['frames'].get(timeframe)
+        if frame_state is None or frame_state['last_datetime'] is None:
+            return None
+        overlap_rows = df['Datetime'].search_sorted(frame_state['last_datetime'], side="right")
+        offset = frame_state['rows'] - overlap_rows
+        if offset < 0 or overlap_rows == 0 or df['Datetime'][overlap_rows - 1] != frame_state['last_datetime']:
+            return None
+        aligned[timeframe] = df.drop('index').with_row_index(offset=offset)
+    return aligned
+
+
+def get_resume_condition_source(primary_timeframe: str, resume_state: BacktestResumeState) -> BacktestConditionSource:
+    """Entry condition that masks entries before the resume point; entry conditions are AND-ed by every engine."""
+    return BacktestConditionSource(symbol=RESUME_SYMBOL, calc_pl=RESUME_CONDITION_SOURCE, calculations={}, params={
+        'condition_timeframe': primary_timeframe,
+        'resume_from': resume_state['resume_from'],
+        'resume_inclusive': resume_state['resume_inclusive'],
+    })
+
+
+def merge_positions(stored_positions: List[Dict[str, Any]], new_positions: List[Dict[str, Any]],
+                    resume_state: BacktestResumeState) -> List[Dict[str, Any]]:
+    """
+    Keeps the stored trades that entered before the resume point and appends the extension's trades.
+    The extension's position ids continue after the last kept id; engines that number trades consecutively
+    therefore match a full rerun, while each_day/lazy ids (which also count unclosed entries) may leave smaller gaps.
+    """
+    resume_from = resume_state['resume_from']
+    if resume_state['resume_inclusive']:
+        kept = [position for position in stored_positions if position['entry_time'] is None or position['entry_time'] < resume_from]
+    else:
+        kept = [position for position in stored_positions if position['entry_time'] is None or position['entry_time'] <= resume_from]
+    # Rows without an entry only come from the warmup of the reloaded frames
+    added = [position for position in new_positions if position.get('entry_time') is not None]
+    if added and kept:
+        id_offset = max(position['position_id'] for position in kept) + 1 - min(position['position_id'] for position in added)
+        added = [{**position, 'position_id': position['position_id'] + id_offset} for position in added]
+    return kept + added
@@ -0,0 +1,73 @@
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+
+from server.src.common.config import BACKTEST_JOBS_MAX_CONCURRENT, BACKTEST_JOBS_MAX_FINISHED
+from server.src.common.utils.singleton import singleton
+from server.src.features.big_data.backtests.types import BacktestJobStatus, BacktestRunResult
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BacktestJob:
+    job_id: str
+    future: Future
+    status: BacktestJobStatus = 'queued'
+    submitted_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+
+
+@singleton
+class BacktestsJobsManager:
+    """
+    Runs backtests as jobs on a bounded worker pool, off the FastAPI event loop.
+    Finished jobs are kept for polling until more than BACKTEST_JOBS_MAX_FINISHED have accumulated.
+    """
+    def __init__(self, max_concurrent: int = BACKTEST_JOBS_MAX_CONCURRENT, max_finished: int = BACKTEST_JOBS_MAX_FINISHED):
+        self.pool = ThreadPoolExecutor(max_workers=max(1, max_concurrent), thread_name_prefix="backtest-job")
+        self.max_finished = max_finished
+        self.jobs: OrderedDict[str, BacktestJob] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, func: Callable[..., BacktestRunResult], **kwargs: Any) -> BacktestJob:
+        job_id = uuid.uuid4().hex
+        future: Future = Future()
+        job = BacktestJob(job_id=job_id, future=future)
+        with self._lock:
+            self.jobs[job_id] = job
+            self._evict_finished()
+        self.pool.submit(self._run, job, func, kwargs)
+        return job
+
+    def get_job(self, job_id: str) -> Optional[BacktestJob]:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def _run(self, job: BacktestJob, func: Callable[..., BacktestRunResult], kwargs: Dict[str, Any]):
+        job.status = 'running'
+        job.started_at = datetime.now(timezone.utc)
+        try:
+            result = func(**kwargs)
+        except Exception as e:
+            logger.exception("Backtest job %s failed", job.job_id)
+            job.error = str(e)
+            job.status = 'failed'
+            job.finished_at = datetime.now(timezone.utc)
+            job.future.set_exception(e)
+            return
+        job.status = 'completed'
+        job.finished_at = datetime.now(timezone.utc)
+        job.future.set_result(result)
+
+    def _evict_finished(self):
+        finished_ids = [job_id for job_id, job in self.jobs.items() if job.future.done()]
+        for job_id in finished_ids[:max(0, len(finished_ids) - self.max_finished)]:
+            del self.jobs[job_id]
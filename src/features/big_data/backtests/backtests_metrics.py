@@ -0,0 +1,131 @@
+"""
+Performance metrics of backtest trades, computed server side so clients can skip downloading every trade.
+
+All tickers' trades are stacked into one frame and every metric is a Polars expression grouped by ticker.
+Profits are per share, as the engines report them; returns are profit / entry_price, one share per trade.
+Sharpe and Sortino are annualized from daily returns over every weekday of the backtest range (plus the weekend
+days trades closed on), so days without closed trades count as flat days.
+"""
+
+import math
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+import polars as pl
+
+from server.src.features.big_data.backtests.types import BacktestDailyStats, BacktestMetrics
+
+TRADING_DAYS_PER_YEAR = 252
+
+
+def get_trades_frame(positions_by_stock: Dict[str, List[Dict[str, Any]]]) -> pl.DataFrame:
+    """Closed trades of every stock in one frame with a ticker column, sorted by ticker and exit time."""
+    frames = [
+        pl.DataFrame(positions).select(
+            pl.lit(stock).alias("ticker"),
+            pl.col("entry_time").cast(pl.Datetime("us")),
+            pl.col("exit_time").cast(pl.Datetime("us")),
+            pl.col("entry_price").cast(pl.Float64),
+            pl.col("profit").cast(pl.Float64),
+        )
+        for stock, positions in positions_by_stock.items() if positions
+    ]
+    schema = {"ticker": pl.Utf8, "entry_time": pl.Datetime("us"), "exit_time": pl.Datetime("us"), "entry_price": pl.Float64, "profit": pl.Float64}
+    trades = pl.concat(frames) if frames else pl.DataFrame(schema=schema)
+    return trades.filter(pl.col("entry_time").is_not_null() & pl.col("exit_time").is_not_null()).sort(["ticker", "exit_time"])
+
+
+def compute_metrics(positions_by_stock: Dict[str, List[Dict[str, Any]]], from_date: str, to_date: str) -> Dict[str, BacktestMetrics]:
+    """Metrics of every stock's trades over the backtest range from_date (inclusive) to to_date (exclusive)."""
+    trades = get_trades_frame(positions_by_stock)
+    period_start = datetime.strptime(from_date, "%Y-%m-%d")
+    period_end = datetime.strptime(to_date, "%Y-%m-%d")
+    weekdays = pl.select(pl.business_day_count(period_start.date(), period_end.date())).item()
+
+    daily = _get_daily_stats(trades)
+    summaries = {
+        row["ticker"]: row for row in
+        _get_summary(trades, period_end - period_start).join(_get_risk_ratios(daily, weekdays), on="ticker", how="left").to_dicts()
+    }
+    daily_by_stock = {ticker: rows for (ticker,), rows in daily.drop("return").partition_by("ticker", as_dict=True, include_key=False).items()}
+
+    metrics = {}
+    for stock in positions_by_stock:
+        summary = summaries.get(stock)
+        if summary is None:
+            metrics[stock] = BacktestMetrics(trades=0, total_profit=0.0, win_rate=0.0, profit_factor=None, avg_win=None, avg_loss=None,
+                                             max_drawdown=0.0, sharpe=None, sortino=None, exposure=0.0, daily=[])
+            continue
+        metrics[stock] = BacktestMetrics(
+            trades=summary["trades"],
+            total_profit=summary["total_profit"],
+            win_rate=summary["win_rate"],
+            profit_factor=_finite_or_none(summary["profit_factor"]),
+            avg_win=summary["avg_win"],
+            avg_loss=summary["avg_loss"],
+            max_drawdown=summary["max_drawdown"],
+            sharpe=_finite_or_none(summary["sharpe"]),
+            sortino=_finite_or_none(summary["sortino"]),
+            exposure=summary["exposure"],
+            daily=[BacktestDailyStats(**day) for day in daily_by_stock[stock].to_dicts()],
+        )
+    return metrics
+
+
+def _get_summary(trades: pl.DataFrame, period: timedelta) -> pl.DataFrame:
+    profit = pl.col("profit")
+    # Trades are sorted by exit time; equity starts at 0, so a first losing trade already draws down from the 0 peak
+    equity = profit.cum_sum()
+    drawdown = pl.max_horizontal(equity.cum_max(), pl.lit(0.0)) - equity
+    # Time in market is the union of the trades' intervals, so overlapping positions are not counted twice
+    entry_time = pl.col("entry_time").sort_by("entry_time")
+    exit_time = pl.col("exit_time").sort_by("entry_time")
+    covered_from = pl.max_horizontal(entry_time, exit_time.cum_max().shift(1))
+    in_market = (exit_time - covered_from).clip(lower_bound=pl.duration(seconds=0))
+    return (
+        trades.group_by("ticker", maintain_order=True)
+        .agg(
+            pl.len().alias("trades"),
+            profit.sum().alias("total_profit"),
+            (profit > 0).mean().alias("win_rate"),
+            (profit.filter(profit > 0).sum() / -profit.filter(profit < 0).sum()).alias("profit_factor"),
+            profit.filter(profit > 0).mean().alias("avg_win"),
+            profit.filter(profit < 0).mean().alias("avg_loss"),
+            drawdown.max().alias("max_drawdown"),
+            in_market.sum().dt.total_seconds().alias("in_market_seconds"),
+        )
+        .with_columns((pl.col("in_market_seconds") / max(period.total_seconds(), 1)).clip(upper_bound=1.0).alias("exposure"))
+    )
+
+
+def _get_daily_stats(trades: pl.DataFrame) -> pl.DataFrame:
+    """Closed trades, profit, win rate, per-share return and running equity of every day with a closed trade."""
+    return (
+        trades.group_by("ticker", pl.col("exit_time").dt.date().alias("date"), maintain_order=True)
+        .agg(
+            pl.len().alias("trades"),
+            pl.col("profit").sum().alias("profit"),
+            (pl.col("profit") > 0).mean().alias("win_rate"),
+            (pl.col("profit") / pl.col("entry_price")).sum().alias("return"),
+        )
+        .with_columns(pl.col("profit").cum_sum().over("ticker").alias("equity"))
+    )
+
+
+def _get_risk_ratios(daily: pl.DataFrame, weekdays: int) -> pl.DataFrame:
+    # Days without closed trades are flat, so the moments are taken over all trading days, not only the listed ones;
+    # weekend days count as trading days only when trades closed on them (24/7 markets)
+    returns = pl.col("return")
+    trading_days = weekdays + (pl.col("date").dt.weekday() > 5).sum()
+    mean = returns.sum() / trading_days
+    variance = (returns.pow(2).sum() - trading_days * mean.pow(2)) / pl.max_horizontal(trading_days - 1, 1)
+    downside_deviation = (returns.clip(upper_bound=0.0).pow(2).sum() / trading_days).sqrt()
+    annualization = math.sqrt(TRADING_DAYS_PER_YEAR)
+    return daily.group_by("ticker").agg(
+        (mean / variance.sqrt() * annualization).alias("sharpe"),
+        (mean / downside_deviation * annualization).alias("sortino"),
+    )
+
+
+def _finite_or_none(value: float | None) -> float | None:
+    return value if value is not None and math.isfinite(value) else None
@@ -1,21 +1,41 @@
 
-from typing import Any, Dict, List, Literal  # Import datetime
+import hashlib
+import itertools
+import json
+import logging
+import math
+from datetime import date, datetime, time, timedelta
+from time import perf_counter
+from typing import Any, Dict, List, Tuple  # Import datetime
 
 from features.big_data.backtests.engines.back_test_engine_vectorized_first_daily_trade import BackTestEngineVectorizedFirstDailyTrade
 from features.big_data.backtests.engines.backtest_engine_models import BacktestEngineCondition
+from features.big_data.backtests.engines.backtest_engine_portfolio import BackTestEnginePortfolio
 from features.big_data.backtests.engines.backtest_engine_vectorized_each_day import BackTestEngineVectorizedEachDay
 from features.big_data.backtests.mocks import entry_conditions, entry_lazy, exit_conditions, exit_lazy
 from features.big_data.backtests.backtests_bl import BackTestsBl
+from features.big_data.backtests.backtests_executor import BacktestsExecutor, compile_condition_source, merge_trades_summaries, summarize_trades
+from features.big_data.backtests.backtests_extension import align_frames, get_frames_state, get_load_start, get_resume_condition_source, get_resume_state, get_warmup_bars, merge_positions
+from features.big_data.backtests.backtests_metrics import compute_metrics
+from features.big_data.backtests.backtests_jobs_manager import BacktestJob, BacktestsJobsManager
 import polars as pl
 
 from server.src.common.base.base_orch import BaseOrch
+from server.src.common.config import (BACKTEST_EXECUTOR_MODE, BACKTEST_MAX_WORKERS, BACKTEST_PORTFOLIO_INITIAL_CAPITAL, BACKTEST_PORTFOLIO_MAX_POSITIONS,
+                                     BACKTEST_PORTFOLIO_POSITION_SIZE, BACKTEST_RESULT_CACHE_ENABLED)
+from server.src.common.services.models.conditions_model import ConditionPlan
 from server.src.common.services.models.backtests_model import BackTestsModel
-from server.src.features.big_data.backtests.contracts.backtests_api_contract import BackTestCondition
+from server.src.features.big_data.backtests.contracts.backtests_api_contract import BackTestCondition, BackTestSweepCondition
 from server.src.features.big_data.backtests.engines.backtest_engine_utils import BacktestEngineUtils
+from server.src.features.big_data.backtests.types import (BacktestConditionSource, BacktestEngineOptions, BacktestEngineType, BacktestExecutorMode, BacktestFrameState,
+                                                        BacktestPortfolioResult, BacktestPortfolioSummary, BacktestRunResult, BacktestSweepPoint, BacktestSweepResult, BacktestSweepRow, BacktestTradesSummary,
+                                                        BacktestWalkForwardResult, BacktestWalkForwardWindow)
 from server.src.features.big_data.candles.candles_orch import CandlesOrch
 from server.src.features.stocks.stocks_orch import StocksOrch
 from server.src.features.big_data.conditions.conditions_orch import ConditionsOrch
 
+logger = logging.getLogger(__name__)
+
 def create_candles_orch():
     return CandlesOrch()
 
@@ -30,6 +50,7 @@ def create_conditions_orch():
 class BackTestsOrch(BaseOrch[BackTestsBl, BackTestsModel]):
     def __init__(self):
         super().__init__(BackTestsBl())
+        self.jobs_manager = BacktestsJobsManager()
         
         
     def get_timeframes_df (self,stock_symbol: str,from_date: str, to_date: str,timeframes: List[str]):
@@ -44,7 +65,19 @@ class BackTestsOrch(BaseOrch[BackTestsBl, BackTestsModel]):
 
         
         return by_timeframe_dfs
-        
+
+    def get_timeframes_dfs_by_stocks(self, stock_symbols: List[str], from_date: str, to_date: str, timeframes: List[str]) -> Dict[str, Dict[str, pl.DataFrame]]:
+        """
+        Loads every stock x timeframe with one bulk candles query and adds a row index to each frame.
+        """
+        candles_orch = create_candles_orch()
+        stocks_orch = create_stocks_orch()
+        stocks_orch.get_stocks_by_tickers(stock_symbols)  # Fails fast on unknown tickers
+        dfs_by_stock = candles_orch.get_candles_by_tickers_from_to(stock_symbols, from_date, to_date, timeframes)
+        return {
+            stock_symbol: {timeframe: df.with_row_index() for timeframe, df in by_timeframe_dfs.items()}
+            for stock_symbol, by_timeframe_dfs in dfs_by_stock.items()
+        }
         
         
     def run_example(self):
@@ -73,44 +106,396 @@ class BackTestsOrch(BaseOrch[BackTestsBl, BackTestsModel]):
         for e in exit_lazy.exit_conditions_lazy:
             e_condiitons_lazy.append(BacktestEngineCondition(e["name"],e["params"],e["logic_func"]))
         
-        # BacktestEngineLazy().backtest(dfs_lazy,c_condiitons_lazy,e_condiitons_lazy)
-        # BackTestEngineLoopingLazy().backtest(dfs1,c_condiitons,e_condiitons)
-        # print(BackTestEngineVectorizedLazy().backtest(dfs_lazy2,c_condiitons_lazy,e_condiitons_lazy))
+        # BackTestEngineLazy().backtest(by_timeframe_dfs,c_condiitons,e_condiitons)
                 
         
-    def backtest(self,stocks: List[str],from_date: str, to_date: str,entry_conditions: List[BackTestCondition],exit_conditions: List[BackTestCondition],type: Literal['first_daily_trade','each_day']) -> Dict[str, List[Dict[str, Any]]]:
+    def backtest(self,stocks: List[str],from_date: str, to_date: str,entry_conditions: List[BackTestCondition],exit_conditions: List[BackTestCondition],type: BacktestEngineType,
+                 executor_mode: BacktestExecutorMode | None = None, max_workers: int | None = None,
+                 engine_options: BacktestEngineOptions | None = None, use_cache: bool = True,
+                 include_trades: bool = True, include_metrics: bool = False) -> BacktestRunResult:
         conditions_orch = create_conditions_orch()
         required_timeframes = {}
         backtest_entry_conditions = []
+        entry_sources = []
+        entry_plans = []
         for entry_condition in entry_conditions:
-            for param in entry_condition.params:
+            plan = conditions_orch.get_condition_plan(entry_condition.symbol)
+            params = {**plan['params'], **entry_condition.params}
+            for param in params:
                 if 'timeframe' in param:
-                    required_timeframes[entry_condition.params[param]] = None
+                    required_timeframes[params[param]] = None
             
-            condition = conditions_orch.get_condition_by_symbol(entry_condition.symbol)
-            condition.params = {**condition.params, **entry_condition.params}
-            compiled_func = conditions_orch.get_compiled_calc_pl(condition)
-            backtest_entry_conditions.append(BacktestEngineUtils.to_backtest_conditions(entry_condition.symbol,compiled_func['calc_pl'],entry_condition.params))
+            backtest_entry_conditions.append(BacktestEngineUtils.to_backtest_conditions(entry_condition.symbol,plan['calc_pl'],params,plan['calc_expr']))
+            entry_sources.append(self._get_condition_source(plan, params))
+            entry_plans.append((plan, params))
             
         backtest_exit_conditions = []
+        exit_sources = []
+        exit_plans = []
         for exit_condition in exit_conditions:
-            for param in exit_condition.params:
+            plan = conditions_orch.get_condition_plan(exit_condition.symbol)
+            params = {**plan['params'], **exit_condition.params}
+            for param in params:
                 if 'timeframe' in param:
-                    required_timeframes[exit_condition.params[param]] = None
+                    required_timeframes[params[param]] = None
 
-            condition = conditions_orch.get_condition_by_symbol(exit_condition.symbol)
-            condition.params = {**condition.params, **exit_condition.params}
-            compiled_func = conditions_orch.get_compiled_calc_pl(condition)
-            backtest_exit_conditions.append(BacktestEngineUtils.to_backtest_conditions(exit_condition.symbol,compiled_func['calc_pl'],exit_condition.params))
-        
-        stocks_orch = create_stocks_orch()
-        positions_by_stock = {}
-        for stock in stocks:
-            stock_doc = stocks_orch.get_stock_by_ticker(stock)
-            df = self.get_timeframes_df(stock_doc.ticker,from_date, to_date,list(required_timeframes.keys()))
-            if type == 'first_daily_trade':
-                positions_by_stock[stock] = BackTestEngineVectorizedFirstDailyTrade().backtest(df,backtest_entry_conditions,backtest_exit_conditions).to_dicts()
-            elif type == 'each_day':
-                positions_by_stock[stock] = BackTestEngineVectorizedEachDay().backtest(df,backtest_entry_conditions,backtest_exit_conditions).to_dicts()
-        
-        return positions_by_stock
+            backtest_exit_conditions.append(BacktestEngineUtils.to_backtest_conditions(exit_condition.symbol,plan['calc_pl'],params,plan['calc_expr']))
+            exit_sources.append(self._get_condition_source(plan, params))
+            exit_plans.append((plan, params))
+
+        # Cached results are looked up for all tickers at once; only the misses load candles and run.
+        # Only closed ranges are cached, but any run can extend the latest stored run of the same backtest
+        cache_keys = {}
+        base_keys = {}
+        cached_backtests = {}
+        if use_cache:
+            base_keys = {stock: self._get_cache_key(stock, from_date, None, type, engine_options, entry_plans, exit_plans) for stock in stocks}
+        if use_cache and self._is_cacheable_range(to_date):
+            cache_keys = {stock: self._get_cache_key(stock, from_date, to_date, type, engine_options, entry_plans, exit_plans) for stock in stocks}
+            cached_backtests = self.bl.get_cached_backtests(list(cache_keys.values()))
+        missing_stocks = [stock for stock in stocks if cache_keys.get(stock) not in cached_backtests]
+
+        positions_by_stock, timings, frames_by_stock = {}, {}, {}
+        if missing_stocks:
+            executor = BacktestsExecutor(executor_mode or BACKTEST_EXECUTOR_MODE, max_workers or BACKTEST_MAX_WORKERS)
+            timeframes = list(required_timeframes.keys())
+
+            # A stored run of the same backtest over a shorter range is extended with the new candles only
+            stored_backtests = self.bl.get_latest_backtests([base_keys[stock] for stock in missing_stocks], to_date) if base_keys else {}
+            extendable_backtests = {
+                stock: stored_backtests[base_keys[stock]] for stock in missing_stocks
+                if base_keys.get(stock) in stored_backtests and stored_backtests[base_keys[stock]].resume_state
+            }
+            if extendable_backtests:
+                positions_by_stock, timings, frames_by_stock = self._extend_backtests(
+                    extendable_backtests, from_date, to_date, timeframes, backtest_entry_conditions, backtest_exit_conditions,
+                    entry_sources, exit_sources, type, engine_options, executor)
+
+            full_stocks = [stock for stock in missing_stocks if stock not in positions_by_stock]
+            if full_stocks:
+                dfs_by_stock = self.get_timeframes_dfs_by_stocks(full_stocks, from_date, to_date, timeframes)
+                result = executor.run({stock: dfs_by_stock[stock] for stock in full_stocks},
+                                      backtest_entry_conditions, backtest_exit_conditions,
+                                      entry_sources, exit_sources, type, engine_options)
+                positions_by_stock.update(result['positions_by_stock'])
+                timings.update(result['timings'])
+                frames_by_stock.update({stock: get_frames_state(dfs_by_stock[stock]) for stock in full_stocks})
+
+            if cache_keys:
+                self.bl.save_backtests([
+                    self._to_backtest_document(stock, from_date, to_date, type, cache_keys[stock], base_keys[stock], entry_plans, exit_plans,
+                                               positions_by_stock[stock], frames_by_stock[stock])
+                    for stock in missing_stocks
+                ])
+            logger.debug("Backtest extensions: %d extended, %d full runs", len(missing_stocks) - len(full_stocks), len(full_stocks))
+
+        logger.debug("Backtest result cache: %d hits, %d misses", len(stocks) - len(missing_stocks), len(missing_stocks))
+        positions_by_stock = {
+            stock: positions_by_stock[stock] if stock in missing_stocks else cached_backtests[cache_keys[stock]].trades
+            for stock in stocks
+        }
+        result = BacktestRunResult(
+            positions_by_stock=positions_by_stock if include_trades else {stock: [] for stock in stocks},
+            timings={stock: timings.get(stock, 0.0) for stock in stocks},
+        )
+        if include_metrics:
+            result['metrics_by_stock'] = compute_metrics(positions_by_stock, from_date, to_date)
+        return result
+
+    def submit_backtest(self,stocks: List[str],from_date: str, to_date: str,entry_conditions: List[BackTestCondition],exit_conditions: List[BackTestCondition],type: BacktestEngineType,
+                        executor_mode: BacktestExecutorMode | None = None, max_workers: int | None = None,
+                        engine_options: BacktestEngineOptions | None = None, use_cache: bool = True,
+                        include_trades: bool = True, include_metrics: bool = False) -> BacktestJob:
+        """
+        Queues the backtest on the jobs pool and returns its job without waiting for it.
+        """
+        return self.jobs_manager.submit(self.backtest, stocks=stocks, from_date=from_date, to_date=to_date,
+                                        entry_conditions=entry_conditions, exit_conditions=exit_conditions,
+                                        type=type, executor_mode=executor_mode, max_workers=max_workers,
+                                        engine_options=engine_options, use_cache=use_cache,
+                                        include_trades=include_trades, include_metrics=include_metrics)
+
+    def walk_forward(self,stocks: List[str],from_date: str, to_date: str,entry_conditions: List[BackTestCondition],exit_conditions: List[BackTestCondition],
+                     type: BacktestEngineType, train_days: int, test_days: int, step_days: int | None = None, anchored: bool = False,
+                     executor_mode: BacktestExecutorMode | None = None, max_workers: int | None = None,
+                     engine_options: BacktestEngineOptions | None = None, use_cache: bool = True) -> BacktestWalkForwardResult:
+        """
+        Evaluates the strategy over rolling train/test windows from a single backtest of the full range.
+        Candles are loaded and indicators computed once over the whole history, so no window pays for its own warmup;
+        each window's trades (by entry time) are a zero-copy slice of the ticker's sorted trades.
+        Anchored windows keep the train range starting at from_date and only move its end.
+        """
+        result = self.backtest(stocks, from_date, to_date, entry_conditions, exit_conditions, type,
+                               executor_mode=executor_mode, max_workers=max_workers, engine_options=engine_options, use_cache=use_cache)
+        trades_by_stock = {
+            stock: pl.DataFrame(positions).filter(pl.col('entry_time').is_not_null()).sort('entry_time') if positions else None
+            for stock, positions in result['positions_by_stock'].items()
+        }
+
+        windows = []
+        for train_from, train_to, test_to in self._get_walk_forward_windows(from_date, to_date, train_days, test_days, step_days or test_days, anchored):
+            train_summaries = {stock: self._summarize_window(trades, train_from, train_to) for stock, trades in trades_by_stock.items()}
+            test_summaries = {stock: self._summarize_window(trades, train_to, test_to) for stock, trades in trades_by_stock.items()}
+            windows.append(BacktestWalkForwardWindow(
+                train_from=train_from.isoformat(), train_to=train_to.isoformat(),
+                test_from=train_to.isoformat(), test_to=test_to.isoformat(),
+                train=merge_trades_summaries(train_summaries.values()),
+                test=merge_trades_summaries(test_summaries.values()),
+                test_profit_by_stock={stock: summary['total_profit'] for stock, summary in test_summaries.items()},
+            ))
+        return BacktestWalkForwardResult(windows=windows, timings=result['timings'])
+
+    def submit_walk_forward(self,stocks: List[str],from_date: str, to_date: str,entry_conditions: List[BackTestCondition],exit_conditions: List[BackTestCondition],
+                            type: BacktestEngineType, train_days: int, test_days: int, step_days: int | None = None, anchored: bool = False,
+                            executor_mode: BacktestExecutorMode | None = None, max_workers: int | None = None,
+                            engine_options: BacktestEngineOptions | None = None, use_cache: bool = True) -> BacktestJob:
+        """
+        Queues the walk-forward evaluation on the jobs pool and returns its job without waiting for it.
+        """
+        return self.jobs_manager.submit(self.walk_forward, stocks=stocks, from_date=from_date, to_date=to_date,
+                                        entry_conditions=entry_conditions, exit_conditions=exit_conditions,
+                                        type=type, train_days=train_days, test_days=test_days, step_days=step_days,
+                                        anchored=anchored, executor_mode=executor_mode, max_workers=max_workers,
+                                        engine_options=engine_options, use_cache=use_cache)
+
+    def sweep(self,stocks: List[str],from_date: str, to_date: str,entry_conditions: List[BackTestSweepCondition],exit_conditions: List[BackTestSweepCondition],
+              type: BacktestEngineType, rank_by: str = 'total_profit', top: int | None = None,
+              executor_mode: BacktestExecutorMode | None = None, max_workers: int | None = None,
+              engine_options: BacktestEngineOptions | None = None) -> BacktestSweepResult:
+        """
+        Backtests every combination of the conditions' grids and returns one ranked summary row per combination.
+        Candles are loaded once for all combinations and each ticker reuses its indicators across them.
+        """
+        conditions_orch = create_conditions_orch()
+        entry_plans = [conditions_orch.get_condition_plan(condition.symbol) for condition in entry_conditions]
+        exit_plans = [conditions_orch.get_condition_plan(condition.symbol) for condition in exit_conditions]
+        points = self._expand_sweep_grid(entry_conditions, entry_plans, exit_conditions, exit_plans)
+
+        required_timeframes = {}
+        for point in points:
+            for params in point['entry_params'] + point['exit_params']:
+                for param in params:
+                    if 'timeframe' in param:
+                        required_timeframes[params[param]] = None
+
+        # Points only differ in params, so the conditions are compiled once with the first point's params
+        first_point = points[0]
+        backtest_entry_conditions = [BacktestEngineUtils.to_backtest_conditions(plan['symbol'], plan['calc_pl'], params, plan['calc_expr'])
+                                     for plan, params in zip(entry_plans, first_point['entry_params'])]
+        backtest_exit_conditions = [BacktestEngineUtils.to_backtest_conditions(plan['symbol'], plan['calc_pl'], params, plan['calc_expr'])
+                                    for plan, params in zip(exit_plans, first_point['exit_params'])]
+        entry_sources = [self._get_condition_source(plan, params) for plan, params in zip(entry_plans, first_point['entry_params'])]
+        exit_sources = [self._get_condition_source(plan, params) for plan, params in zip(exit_plans, first_point['exit_params'])]
+
+        dfs_by_stock = self.get_timeframes_dfs_by_stocks(stocks, from_date, to_date, list(required_timeframes.keys()))
+        executor = BacktestsExecutor(executor_mode or BACKTEST_EXECUTOR_MODE, max_workers or BACKTEST_MAX_WORKERS)
+        summaries_by_stock, timings = executor.run_sweep({stock: dfs_by_stock[stock] for stock in stocks},
+                                                         backtest_entry_conditions, backtest_exit_conditions,
+                                                         entry_sources, exit_sources, points, type, engine_options)
+        rows = self._rank_sweep(points, summaries_by_stock, rank_by)
+        return BacktestSweepResult(rows=rows[:top] if top else rows, timings=timings)
+
+    def submit_sweep(self,stocks: List[str],from_date: str, to_date: str,entry_conditions: List[BackTestSweepCondition],exit_conditions: List[BackTestSweepCondition],
+                     type: BacktestEngineType, rank_by: str = 'total_profit', top: int | None = None,
+                     executor_mode: BacktestExecutorMode | None = None, max_workers: int | None = None,
+                     engine_options: BacktestEngineOptions | None = None) -> BacktestJob:
+        """
+        Queues the sweep on the jobs pool and returns its job without waiting for it.
+        """
+        return self.jobs_manager.submit(self.sweep, stocks=stocks, from_date=from_date, to_date=to_date,
+                                        entry_conditions=entry_conditions, exit_conditions=exit_conditions,
+                                        type=type, rank_by=rank_by, top=top, executor_mode=executor_mode,
+                                        max_workers=max_workers, engine_options=engine_options)
+
+    @staticmethod
+    def count_sweep_points(entry_conditions: List[BackTestSweepCondition], exit_conditions: List[BackTestSweepCondition]) -> int:
+        return math.prod(len(values) for condition in entry_conditions + exit_conditions for values in condition.grid.values())
+
+    def portfolio_backtest(self,stocks: List[str],from_date: str, to_date: str,entry_conditions: List[BackTestCondition],exit_conditions: List[BackTestCondition],
+                           initial_capital: float | None = None, position_size: float | None = None, max_positions: int | None = None,
+                           equity_every: str = '1d') -> BacktestPortfolioResult:
+        """
+        Backtests all stocks as one portfolio sharing initial_capital and returns its trades, equity curve and summary.
+        The equity curve is sampled at the end of every equity_every period (a Polars duration such as '1h' or '1d').
+        """
+        start_time = perf_counter()
+        entry_plans = self._get_condition_plans(entry_conditions)
+        exit_plans = self._get_condition_plans(exit_conditions)
+        required_timeframes = {params[param]: None for _, params in entry_plans + exit_plans for param in params if 'timeframe' in param}
+
+        backtest_entry_conditions = [BacktestEngineUtils.to_backtest_conditions(plan['symbol'], plan['calc_pl'], params, plan['calc_expr'])
+                                     for plan, params in entry_plans]
+        backtest_exit_conditions = [BacktestEngineUtils.to_backtest_conditions(plan['symbol'], plan['calc_pl'], params, plan['calc_expr'])
+                                    for plan, params in exit_plans]
+
+        dfs_by_stock = self.get_timeframes_dfs_by_stocks(stocks, from_date, to_date, list(required_timeframes.keys()))
+        engine = BackTestEnginePortfolio(initial_capital or BACKTEST_PORTFOLIO_INITIAL_CAPITAL,
+                                         position_size or BACKTEST_PORTFOLIO_POSITION_SIZE,
+                                         BACKTEST_PORTFOLIO_MAX_POSITIONS if max_positions is None else max_positions)
+        trades, equity = engine.backtest({stock: dfs_by_stock[stock] for stock in stocks}, backtest_entry_conditions, backtest_exit_conditions)
+
+        return BacktestPortfolioResult(
+            trades=trades.with_columns(pl.col('ticker').cast(pl.Utf8)).to_dicts(),
+            equity_curve=equity.group_by_dynamic('Datetime', every=equity_every, label='right').agg(pl.all().last()).to_dicts(),
+            summary=self._summarize_portfolio(trades, equity, engine.initial_capital),
+            seconds=perf_counter() - start_time,
+        )
+
+    def submit_portfolio_backtest(self,stocks: List[str],from_date: str, to_date: str,entry_conditions: List[BackTestCondition],exit_conditions: List[BackTestCondition],
+                                  initial_capital: float | None = None, position_size: float | None = None, max_positions: int | None = None,
+                                  equity_every: str = '1d') -> BacktestJob:
+        """
+        Queues the portfolio backtest on the jobs pool and returns its job without waiting for it.
+        """
+        return self.jobs_manager.submit(self.portfolio_backtest, stocks=stocks, from_date=from_date, to_date=to_date,
+                                        entry_conditions=entry_conditions, exit_conditions=exit_conditions,
+                                        initial_capital=initial_capital, position_size=position_size,
+                                        max_positions=max_positions, equity_every=equity_every)
+
+    def get_backtest_job(self, job_id: str) -> BacktestJob | None:
+        return self.jobs_manager.get_job(job_id)
+
+    def _get_condition_source(self, plan: ConditionPlan, params: Dict[str, Any]) -> BacktestConditionSource:
+        # Only used by the process executor, which recompiles conditions from source
+        return BacktestConditionSource(symbol=plan['symbol'], calc_pl=plan['calc_pl_source'],
+                                       calculations=plan['calculation_sources'], params=params)
+
+    def _expand_sweep_grid(self, entry_conditions: List[BackTestSweepCondition], entry_plans: List[ConditionPlan],
+                           exit_conditions: List[BackTestSweepCondition], exit_plans: List[ConditionPlan]) -> List[BacktestSweepPoint]:
+        # One axis per (side, condition, param) in the grids; every combination becomes a point
+        base_params = {
+            'entry': [{**plan['params'], **condition.params} for condition, plan in zip(entry_conditions, entry_plans)],
+            'exit': [{**plan['params'], **condition.params} for condition, plan in zip(exit_conditions, exit_plans)],
+        }
+        axes = [('entry', index, param, values) for index, condition in enumerate(entry_conditions) for param, values in condition.grid.items()]
+        axes += [('exit', index, param, values) for index, condition in enumerate(exit_conditions) for param, values in condition.grid.items()]
+
+        points = []
+        for combination in itertools.product(*[values for _, _, _, values in axes]):
+            params = {side: [dict(condition_params) for condition_params in side_params] for side, side_params in base_params.items()}
+            for (side, index, param, _), value in zip(axes, combination):
+                params[side][index][param] = value
+            points.append(BacktestSweepPoint(entry_params=params['entry'], exit_params=params['exit']))
+        return points
+
+    def _rank_sweep(self, points: List[BacktestSweepPoint], summaries_by_stock: Dict[str, List[BacktestTradesSummary]],
+                    rank_by: str) -> List[BacktestSweepRow]:
+        rows = []
+        for point_index, point in enumerate(points):
+            summaries = {stock: summaries[point_index] for stock, summaries in summaries_by_stock.items()}
+            rows.append(BacktestSweepRow(
+                point=point,
+                **merge_trades_summaries(summaries.values()),
+                profit_by_stock={stock: summary['total_profit'] for stock, summary in summaries.items()},
+            ))
+        return sorted(rows, key=lambda row: row[rank_by], reverse=True)
+
+    def _get_condition_plans(self, conditions: List[BackTestCondition]) -> List[Tuple[ConditionPlan, Dict[str, Any]]]:
+        # Each condition's plan with the request params over the plan's defaults
+        conditions_orch = create_conditions_orch()
+        plans = []
+        for condition in conditions:
+            plan = conditions_orch.get_condition_plan(condition.symbol)
+            plans.append((plan, {**plan['params'], **condition.params}))
+        return plans
+
+    def _summarize_portfolio(self, trades: pl.DataFrame, equity: pl.DataFrame, initial_capital: float) -> BacktestPortfolioSummary:
+        final_equity = float(equity['equity'][-1]) if equity.height else initial_capital
+        drawdowns = 1 - equity['equity'] / equity['equity'].cum_max()
+        return BacktestPortfolioSummary(
+            initial_capital=initial_capital,
+            final_equity=final_equity,
+            total_return=final_equity / initial_capital - 1,
+            max_drawdown=float(drawdowns.max()) if equity.height else 0.0,
+            trades=trades.height,
+            win_rate=float((trades['pnl'] > 0).sum()) / trades.height if trades.height else 0.0,
+        )
+
+    def _get_walk_forward_windows(self, from_date: str, to_date: str, train_days: int, test_days: int, step_days: int,
+                                  anchored: bool) -> List[Tuple[date, date, date]]:
+        # (train_from, train_to, test_to) of every window whose test range ends within to_date
+        start_date = datetime.strptime(from_date, "%Y-%m-%d").date()
+        end_date = datetime.strptime(to_date, "%Y-%m-%d").date()
+        windows = []
+        train_to = start_date + timedelta(days=train_days)
+        while train_to + timedelta(days=test_days) <= end_date:
+            train_from = start_date if anchored else train_to - timedelta(days=train_days)
+            windows.append((train_from, train_to, train_to + timedelta(days=test_days)))
+            train_to += timedelta(days=step_days)
+        return windows
+
+    def _summarize_window(self, trades: pl.DataFrame | None, from_date: date, to_date: date) -> BacktestTradesSummary:
+        if trades is None:
+            return summarize_trades(pl.DataFrame({'profit': []}, schema={'profit': pl.Float64}))
+        # Trades are sorted by entry_time, so the window is one contiguous slice
+        entry_times = trades['entry_time']
+        start_index = entry_times.search_sorted(datetime.combine(from_date, time.min), side="left")
+        end_index = entry_times.search_sorted(datetime.combine(to_date, time.min), side="left")
+        return summarize_trades(trades.slice(start_index, end_index - start_index))
+
+    def _extend_backtests(self, stored_backtests: Dict[str, BackTestsModel], from_date: str, to_date: str, timeframes: List[str],
+                          entry_conditions: List[BacktestEngineCondition], exit_conditions: List[BacktestEngineCondition],
+                          entry_sources: List[BacktestConditionSource], exit_sources: List[BacktestConditionSource],
+                          type: BacktestEngineType, engine_options: BacktestEngineOptions | None,
+                          executor: BacktestsExecutor) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, float], Dict[str, Dict[str, BacktestFrameState]]]:
+        """
+        Extends stored runs with the candles after them and returns the merged positions, timings and frame states
+        of the stocks that could be extended. Stocks whose stored frames no longer line up are left out for a full run.
+        """
+        warmup_bars = get_warmup_bars([condition.params for condition in entry_conditions + exit_conditions])
+        primary_timeframe = entry_conditions[0].params["condition_timeframe"]
+        load_start = min(get_load_start(from_date, stored.resume_state, timeframes, warmup_bars) for stored in stored_backtests.values())
+        dfs_by_stock = self.get_timeframes_dfs_by_stocks(list(stored_backtests), load_start, to_date, timeframes)
+
+        positions_by_stock, timings, frames_by_stock = {}, {}, {}
+        for stock, stored in stored_backtests.items():
+            resume_state = stored.resume_state
+            dfs = align_frames(dfs_by_stock[stock], resume_state)
+            if dfs is None:
+                logger.warning("Stored backtest of %s up to %s does not line up with its candles, running it in full", stock, stored.to_datetime)
+                continue
+            # Each stock resumes at its own point, so it runs with its own masking entry condition
+            resume_source = get_resume_condition_source(primary_timeframe, resume_state)
+            result = executor.run({stock: dfs}, entry_conditions + [compile_condition_source(resume_source)], exit_conditions,
+                                  entry_sources + [resume_source], exit_sources, type, engine_options)
+            positions_by_stock[stock] = merge_positions(stored.trades, result['positions_by_stock'][stock], resume_state)
+            timings[stock] = result['timings'][stock]
+            frames_by_stock[stock] = get_frames_state(dfs)
+        return positions_by_stock, timings, frames_by_stock
+
+    def _is_cacheable_range(self, to_date: str) -> bool:
+        # Ranges reaching today still receive candles, so only closed ranges are cached
+        return BACKTEST_RESULT_CACHE_ENABLED and datetime.strptime(to_date, "%Y-%m-%d").date() < date.today()
+
+    def _get_cache_key(self, stock: str, from_date: str, to_date: str | None, type: BacktestEngineType, engine_options: BacktestEngineOptions | None,
+                       entry_plans: List[Tuple[ConditionPlan, Dict[str, Any]]], exit_plans: List[Tuple[ConditionPlan, Dict[str, Any]]]) -> str:
+        # Plan versions hash the condition code and its calculations, so editing either changes the key.
+        # Without to_date it is the base key shared by every end date of the same backtest
+        key = {
+            "ticker": stock, "from": from_date, "to": to_date, "type": type,
+            "engine_options": {name: value for name, value in (engine_options or {}).items() if value is not None},
+            "entry": [[plan['symbol'], plan['version'], params] for plan, params in entry_plans],
+            "exit": [[plan['symbol'], plan['version'], params] for plan, params in exit_plans],
+        }
+        return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _to_backtest_document(self, stock: str, from_date: str, to_date: str, type: BacktestEngineType, cache_key: str, base_key: str,
+                              entry_plans: List[Tuple[ConditionPlan, Dict[str, Any]]], exit_plans: List[Tuple[ConditionPlan, Dict[str, Any]]],
+                              positions: List[Dict[str, Any]], frames: Dict[str, BacktestFrameState]) -> Dict[str, Any]:
+        entry_symbols = [plan['symbol'] for plan, _ in entry_plans]
+        exit_symbols = [plan['symbol'] for plan, _ in exit_plans]
+        return {
+            "ticker": stock,
+            "from_datetime": from_date,
+            "to_datetime": to_date,
+            "entry_conditions": entry_symbols,
+            "entry_conditions_id": "-".join(sorted(entry_symbols)),
+            "exit_conditions": exit_symbols,
+            "exit_conditions_id": "-".join(sorted(exit_symbols)),
+            "trades": positions,
+            "profit": sum(position['profit'] or 0.0 for position in positions),
+            "cache_key": cache_key,
+            "engine_type": type,
+            "base_key": base_key,
+            "resume_state": get_resume_state(positions, type, frames),
+        }
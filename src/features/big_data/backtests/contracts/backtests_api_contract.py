@@ -1,5 +1,5 @@
 import datetime
-from typing import Any, Dict, List, Literal
+from typing import Annotated, Any, Dict, List, Literal, Optional
 from typing_extensions import TypedDict
 from pydantic import BaseModel, Field
 
@@ -15,7 +15,53 @@ class BackTestRequest(RequestResponseBaseModel):
     to_datetime: str
     entry_conditions: List[BackTestCondition]
     exit_conditions: List[BackTestCondition]
-    type: Literal['first_daily_trade', 'each_day']
+    type: Literal['first_daily_trade', 'each_day', 'lazy', 'numba']
+    executor: Optional[Literal['sequential', 'thread', 'process']] = None  # Defaults to BACKTEST_EXECUTOR_MODE
+    max_workers: Optional[int] = Field(None, ge=1)  # Defaults to BACKTEST_MAX_WORKERS
+    stop_loss: Optional[float] = Field(None, gt=0)  # Fraction of the entry price, numba engine only
+    take_profit: Optional[float] = Field(None, gt=0)  # Fraction of the entry price, numba engine only
+    position_mode: Optional[Literal['segment', 'overlapping', 'non_overlapping']] = None  # each_day only, None keeps the group_by trade compilation
+    use_cache: bool = True  # Serve and store results in the backtests collection
+    include_trades: bool = True  # Return every position; turn off with include_metrics to keep responses small
+    include_metrics: bool = False  # Return performance metrics per ticker
+
+class BackTestWalkForwardRequest(BackTestRequest):
+    train_days: int = Field(gt=0)
+    test_days: int = Field(gt=0)
+    step_days: Optional[int] = Field(None, gt=0)  # Defaults to test_days
+    anchored: bool = False  # Keep every train range starting at from_datetime
+
+
+class BackTestPortfolioRequest(RequestResponseBaseModel):
+    tickers: List[str]
+    from_datetime: str
+    to_datetime: str
+    entry_conditions: List[BackTestCondition]
+    exit_conditions: List[BackTestCondition]
+    initial_capital: Optional[float] = Field(None, gt=0)  # Defaults to BACKTEST_PORTFOLIO_INITIAL_CAPITAL
+    position_size: Optional[float] = Field(None, gt=0, le=1)  # Fraction of equity per position, defaults to BACKTEST_PORTFOLIO_POSITION_SIZE
+    max_positions: Optional[int] = Field(None, ge=0)  # 0 for no limit, defaults to BACKTEST_PORTFOLIO_MAX_POSITIONS
+    equity_every: str = '1d'  # Sampling period of the equity curve, as a Polars duration
+
+
+class BackTestSweepCondition(BackTestCondition):
+    grid: Dict[str, Annotated[List[Any], Field(min_length=1)]] = {}  # param -> values to sweep (at least one), combined with every other grid param
+
+
+class BackTestSweepRequest(RequestResponseBaseModel):
+    tickers: List[str]
+    from_datetime: str
+    to_datetime: str
+    entry_conditions: List[BackTestSweepCondition]
+    exit_conditions: List[BackTestSweepCondition]
+    type: Literal['first_daily_trade', 'each_day', 'lazy', 'numba']
+    rank_by: Literal['total_profit', 'avg_profit', 'win_rate', 'trades'] = 'total_profit'
+    top: Optional[int] = Field(None, ge=1)  # Rows to return, all when omitted
+    executor: Optional[Literal['sequential', 'thread', 'process']] = None  # Defaults to BACKTEST_EXECUTOR_MODE
+    max_workers: Optional[int] = Field(None, ge=1)  # Defaults to BACKTEST_MAX_WORKERS
+    stop_loss: Optional[float] = Field(None, gt=0)
+    take_profit: Optional[float] = Field(None, gt=0)
+    position_mode: Optional[Literal['segment', 'overlapping', 'non_overlapping']] = None
 
 class BackTestPosition(BaseModel):
     position_id: int
@@ -33,5 +79,113 @@ class BackTestPosition(BaseModel):
         populate_by_name = True
     
 
+class BackTestDailyStats(RequestResponseBaseModel):
+    date: datetime.date
+    trades: int
+    profit: float
+    win_rate: float
+    equity: float  # Cumulative profit at the end of the day
+
+
+class BackTestMetrics(RequestResponseBaseModel):
+    trades: int
+    total_profit: float
+    win_rate: float
+    profit_factor: Optional[float] = None
+    avg_win: Optional[float] = None
+    avg_loss: Optional[float] = None
+    max_drawdown: float
+    sharpe: Optional[float] = None
+    sortino: Optional[float] = None
+    exposure: float  # Fraction of the backtest range with an open position
+    daily: List[BackTestDailyStats]
+
+
 class BackTestResponse(RequestResponseBaseModel):
     positions: Dict[str, List[BackTestPosition]]
+    timings: Dict[str, float] = {}  # Seconds spent backtesting each ticker
+    metrics: Dict[str, BackTestMetrics] = {}  # Only with include_metrics
+
+
+class BackTestJobResponse(RequestResponseBaseModel):
+    job_id: str
+    status: Literal['queued', 'running', 'completed', 'failed']
+    submitted_at: datetime.datetime
+    started_at: Optional[datetime.datetime] = None
+    finished_at: Optional[datetime.datetime] = None
+    error: Optional[str] = None
+
+
+class BackTestSweepRow(RequestResponseBaseModel):
+    entry_params: List[Dict[str, Any]]
+    exit_params: List[Dict[str, Any]]
+    trades: int
+    total_profit: float
+    avg_profit: float
+    win_rate: float
+    profit_by_stock: Dict[str, float]
+
+
+class BackTestSweepResponse(RequestResponseBaseModel):
+    rows: List[BackTestSweepRow]  # Ranked best first
+    timings: Dict[str, float] = {}  # Seconds spent sweeping each ticker
+
+
+class BackTestTradesSummary(RequestResponseBaseModel):
+    trades: int
+    total_profit: float
+    avg_profit: float
+    win_rate: float
+
+
+class BackTestWalkForwardWindow(RequestResponseBaseModel):
+    train_from: str
+    train_to: str
+    test_from: str
+    test_to: str
+    train: BackTestTradesSummary
+    test: BackTestTradesSummary
+    test_profit_by_stock: Dict[str, float]
+
+
+class BackTestWalkForwardResponse(RequestResponseBaseModel):
+    windows: List[BackTestWalkForwardWindow]
+    timings: Dict[str, float] = {}  # Seconds spent backtesting each ticker's full range
+
+
+class BackTestPortfolioTrade(RequestResponseBaseModel):
+    position_id: int
+    ticker: str
+    entry_index: int
+    exit_index: int
+    entry_time: datetime.datetime
+    exit_time: datetime.datetime
+    entry_price: float
+    exit_price: float
+    quantity: float
+    allocation: float
+    profit: float  # Per share, like BackTestPosition.profit
+    pnl: float  # profit x quantity
+
+
+class BackTestEquityPoint(RequestResponseBaseModel):
+    Datetime: datetime.datetime = Field(alias="datetime")
+    cash: float
+    market_value: float
+    equity: float
+
+
+class BackTestPortfolioSummary(RequestResponseBaseModel):
+    initial_capital: float
+    final_equity: float
+    total_return: float
+    max_drawdown: float
+    trades: int
+    win_rate: float
+
+
+class BackTestPortfolioResponse(RequestResponseBaseModel):
+    trades: List[BackTestPortfolioTrade]
+    equity_curve: List[BackTestEquityPoint]
+    summary: BackTestPortfolioSummary
+    seconds: float
@@ -1,13 +1,35 @@
 from typing import Callable, Dict
 import typing
 
+import polars as pl
+
+from server.src.features.big_data.calculations.indicator_cache import IndicatorCache
+from server.src.features.big_data.calculations.timeframe_alignment import TimeframeAlignment
+
 
 class BacktestEngineCondition:
     name: str
     params: Dict[str, typing.Any]
     calc: Callable
+    expr: typing.Optional[Callable]  # calc_expr form of the condition, used by the lazy engine when available
 
-    def __init__(self, name: str, params: Dict[str, object], calc: Callable):
+    def __init__(self, name: str, params: Dict[str, object], calc: Callable, expr: typing.Optional[Callable] = None):
         self.name = name
         self.params = params
-        self.calc = calc
\ No newline at end of file
+        self.calc = calc
+        self.expr = expr
+
+
+class BacktestFrames(Dict[str, pl.DataFrame]):
+    """
+    One ticker's DataFrames keyed by timeframe, carrying the indicator cache and the timeframe alignment
+    its conditions share for the run.
+    """
+    indicator_cache: IndicatorCache
+    timeframe_alignment: TimeframeAlignment
+
+    def __init__(self, frames: Dict[str, pl.DataFrame], indicator_cache: IndicatorCache | None = None,
+                 timeframe_alignment: TimeframeAlignment | None = None):
+        super().__init__(frames)
+        self.indicator_cache = indicator_cache if indicator_cache is not None else IndicatorCache()
+        self.timeframe_alignment = timeframe_alignment if timeframe_alignment is not None else TimeframeAlignment()
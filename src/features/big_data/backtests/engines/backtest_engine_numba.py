@@ -0,0 +1,140 @@
+from typing import Dict, List, Tuple
+import numpy as np
+import polars as pl
+from numba import njit
+from common.utils.timer import Timer
+from features.big_data.backtests.engines.backtest_engine_models import BacktestEngineCondition
+from features.big_data.backtests.engines.backtest_engine_utils import BacktestEngineUtils
+
+EXIT_REASONS = ["signal", "stop_loss", "take_profit"]
+_EXIT_SIGNAL, _EXIT_STOP_LOSS, _EXIT_TAKE_PROFIT = 0, 1, 2
+
+
+class BackTestEngineNumba:
+    """
+    Sequential one-position-at-a-time backtest at linear cost.
+    Entry and exit signal columns are computed vectorized once; a jitted kernel then walks the bars,
+    opening on an entry signal while flat and closing on the first later bar with an exit signal,
+    a stop-loss or a take-profit hit. Stop-loss and take-profit are fractions of the entry price (0.02 = 2%).
+    """
+    def __init__(self, stop_loss: float | None = None, take_profit: float | None = None):
+        self.stop_loss = stop_loss or 0.0
+        self.take_profit = take_profit or 0.0
+
+    def backtest(self, dfs: Dict[str, pl.DataFrame], entry_conditions: List[BacktestEngineCondition],
+                 exit_conditions: List[BacktestEngineCondition]) -> pl.DataFrame:
+        """
+        Backtests a trading strategy on historical data.
+
+        Args:
+            dfs: A dictionary of Polars DataFrames, keyed by timeframe.
+            entry_conditions: A list of BacktestCondition, each defining an entry condition.
+            exit_conditions: A list of BacktestCondition, each defining an exit condition.
+
+        Returns:
+            A Polars DataFrame with one row per closed position.
+        """
+        with Timer("--------Numba total --------") as t:
+            primary_timeframe = entry_conditions[0].params["condition_timeframe"]
+            is_long = bool(entry_conditions[0].params.get("is_long", True))
+            df = dfs[primary_timeframe]
+
+            with Timer("--------signals --------") as t:
+                entry_signal = self._to_bool_array(BacktestEngineUtils.compute_entry_signals(dfs, entry_conditions))
+                exit_signal = self._to_bool_array(BacktestEngineUtils.compute_exit_signals(dfs, exit_conditions))
+
+            with Timer("--------walk positions --------") as t:
+                entry_rows, exit_rows, exit_prices, exit_reasons = _walk_positions(
+                    entry_signal, exit_signal,
+                    df["Open"].to_numpy().astype(np.float64), df["High"].to_numpy().astype(np.float64),
+                    df["Low"].to_numpy().astype(np.float64), df["Close"].to_numpy().astype(np.float64),
+                    self.stop_loss, self.take_profit, is_long,
+                )
+
+        return self._compile_trades(df, entry_rows, exit_rows, exit_prices, exit_reasons, is_long)
+
+    def _to_bool_array(self, signal: pl.Series) -> np.ndarray:
+        return signal.fill_null(False).cast(pl.Boolean).to_numpy()
+
+    def _compile_trades(self, df: pl.DataFrame, entry_rows: np.ndarray, exit_rows: np.ndarray,
+                        exit_prices: np.ndarray, exit_reasons: np.ndarray, is_long: bool) -> pl.DataFrame:
+        entries = df.select(["index", "Datetime", "Close"])[entry_rows]
+        exits = df.select(["index", "Datetime"])[exit_rows]
+        direction = 1.0 if is_long else -1.0
+        return pl.DataFrame({
+            "position_id": np.arange(1, len(entry_rows) + 1, dtype=np.int64),
+            "Date": entries["Datetime"].dt.truncate("1d"),
+            "entry_index": entries["index"],
+            "exit_index": exits["index"],
+            "entry_time": entries["Datetime"],
+            "exit_time": exits["Datetime"],
+            "entry_price": entries["Close"],
+            "exit_price": exit_prices,
+            "exit_reason": pl.Series(EXIT_REASONS, dtype=pl.Utf8)[exit_reasons.astype(np.int64)],
+        }).with_columns(
+            ((pl.col("exit_price") - pl.col("entry_price")) * direction).alias("profit")
+        )
+
+
+@njit(cache=True)
+def _walk_positions(entry_signal: np.ndarray, exit_signal: np.ndarray, open_: np.ndarray, high: np.ndarray,
+                    low: np.ndarray, close: np.ndarray, stop_loss: float, take_profit: float,
+                    is_long: bool) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Returns the entry rows, exit rows, exit prices and exit reasons of every closed position.
+    Entries fill at the bar's close. Stops and targets fill at their price, or at the open when the bar gaps
+    through them; when both are hit within one bar the stop is assumed to come first.
+    """
+    n = close.shape[0]
+    entry_rows = np.empty(n, np.int64)
+    exit_rows = np.empty(n, np.int64)
+    exit_prices = np.empty(n, np.float64)
+    exit_reasons = np.empty(n, np.int8)
+
+    count = 0
+    in_position = False
+    entry_row = 0
+    stop_price = 0.0
+    target_price = 0.0
+    for i in range(n):
+        if not in_position:
+            if entry_signal[i]:
+                in_position = True
+                entry_row = i
+                if is_long:
+                    stop_price = close[i] * (1.0 - stop_loss)
+                    target_price = close[i] * (1.0 + take_profit)
+                else:
+                    stop_price = close[i] * (1.0 + stop_loss)
+                    target_price = close[i] * (1.0 - take_profit)
+            continue
+
+        reason = -1
+        price = 0.0
+        if is_long:
+            if stop_loss > 0.0 and low[i] <= stop_price:
+                reason = _EXIT_STOP_LOSS
+                price = min(open_[i], stop_price)
+            elif take_profit > 0.0 and high[i] >= target_price:
+                reason = _EXIT_TAKE_PROFIT
+                price = max(open_[i], target_price)
+        else:
+            if stop_loss > 0.0 and high[i] >= stop_price:
+                reason = _EXIT_STOP_LOSS
+                price = max(open_[i], stop_price)
+            elif take_profit > 0.0 and low[i] <= target_price:
+                reason = _EXIT_TAKE_PROFIT
+                price = min(open_[i], target_price)
+        if reason == -1 and exit_signal[i]:
+            reason = _EXIT_SIGNAL
+            price = close[i]
+
+        if reason != -1:
+            entry_rows[count] = entry_row
+            exit_rows[count] = i
+            exit_prices[count] = price
+            exit_reasons[count] = reason
+            count += 1
+            in_position = False
+
+    return entry_rows[:count], exit_rows[:count], exit_prices[:count], exit_reasons[:count]
@@ -12,8 +12,8 @@ class BacktestEngineUtils:
         pass
     
     @staticmethod
-    def to_backtest_conditions(symbol: str,calc: Callable,params: Dict[str, Any]):
-        return BacktestEngineCondition(name=symbol,calc=calc,params=params)
+    def to_backtest_conditions(symbol: str,calc: Callable,params: Dict[str, Any],expr: Callable | None = None):
+        return BacktestEngineCondition(name=symbol,calc=calc,params=params,expr=expr)
     
     @staticmethod
     def compute_entry_signals(dfs: Dict[str, pl.DataFrame], entry_conditions: List[BacktestEngineCondition]) -> pl.Series:
@@ -3,8 +3,14 @@ import polars as pl
 from common.utils.timer import Timer
 from features.big_data.backtests.engines.backtest_engine_models import BacktestEngineCondition
 from features.big_data.backtests.engines.backtest_engine_utils import BacktestEngineUtils
+from features.big_data.backtests.engines.backtest_trade_matcher import BacktestTradeMatcher
+from features.big_data.backtests.types import BacktestPositionMode
 
 class BackTestEngineVectorizedEachDay:
+    def __init__(self, position_mode: BacktestPositionMode | None = None):
+        # None keeps the group_by trade compilation, a position mode switches to BacktestTradeMatcher
+        self.position_mode = position_mode
+
     def backtest(self, dfs: Dict[str, pl.DataFrame], entry_conditions: List[BacktestEngineCondition],
                  exit_conditions: List[BacktestEngineCondition], max_trades_per_day: int = 1) -> pl.DataFrame:
         """
@@ -38,7 +44,10 @@ class BackTestEngineVectorizedEachDay:
 
             # Phase 4: Compile Trades and Calculate Profit
             with Timer("--------Phase 4 total --------") as t:
-                trades = self._compile_trades(df, max_trades_per_day)
+                if self.position_mode is None:
+                    trades = self._compile_trades(df, max_trades_per_day)
+                else:
+                    trades = BacktestTradeMatcher(self.position_mode).compile_trades(df, max_trades_per_day)
 
         return trades
     
@@ -138,6 +147,10 @@ class BackTestEngineVectorizedEachDay:
                 combined_exit_signal.alias('exit_condition'),
             ])
 
+        # The trade matcher pairs exits with entries itself
+        if self.position_mode is not None:
+            return df
+
         # Ensure exit happens after entry
         with Timer("--------Phase 3 with_columns 2 --------") as t:
             df = df.with_columns([
@@ -179,13 +192,14 @@ class BackTestEngineVectorizedEachDay:
                     pl.col('Close').filter(pl.col('entry_signal')).first().alias('entry_price'),
                     pl.col('Close').filter(pl.col('exit_signal')).first().alias('exit_price'),
                     (pl.col('Close').filter(pl.col('exit_signal')).first() - pl.col('entry_price').first()).alias('profit')
-                ]).filter(pl.col('exit_time').is_not_null())
+                ]).filter(pl.col('entry_time').is_not_null() & pl.col('exit_time').is_not_null())  # Exits before the first entry are no trade
                 .sort('entry_time')
             )
             
             # Step 2: Add cumulative count per day to limit trades per day
             trades = trades.with_columns([
                 pl.col('entry_time').dt.date().alias('entry_date'),  # Add entry_date column
+                pl.col('entry_time').dt.truncate('1d').alias('Date'),  # Day of the position, like the other engines
             ])
             
             trades = trades.with_columns([
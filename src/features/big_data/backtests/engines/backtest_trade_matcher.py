@@ -0,0 +1,85 @@
+from typing import Tuple
+import numpy as np
+import polars as pl
+from features.big_data.backtests.types import BacktestPositionMode
+
+
+class BacktestTradeMatcher:
+    """
+    Trade compilation on sorted row positions instead of group_by filters.
+    Entry rows and exit rows are taken from the entry_signal and exit_condition columns, and each entry is
+    paired with the first exit on a later row by a binary search over the exit rows.
+
+    Position modes:
+        segment: an entry closes on the first exit before the next entry, otherwise it is dropped
+                 (the trade semantics of BackTestEngineVectorizedEachDay).
+        overlapping: every entry closes on its first later exit, positions may overlap.
+        non_overlapping: after a position opens, entries are ignored until it closes.
+    """
+    def __init__(self, position_mode: BacktestPositionMode = 'segment'):
+        self.position_mode = position_mode
+
+    def compile_trades(self, df: pl.DataFrame, max_trades_per_day: int = 1) -> pl.DataFrame:
+        """Compile trades from the entry_signal and exit_condition columns of the primary DataFrame."""
+        entry_rows = np.flatnonzero(df['entry_signal'].fill_null(False).to_numpy())
+        exit_rows = np.flatnonzero(df['exit_condition'].fill_null(False).cast(pl.Boolean).to_numpy())
+        positions, matched_exit_rows = self.match(entry_rows, exit_rows)
+        matched_entry_rows = entry_rows[positions]
+
+        entry_close = df['Close'].gather(matched_entry_rows)
+        exit_close = df['Close'].gather(matched_exit_rows)
+        trades = pl.DataFrame({
+            'position_id': pl.Series(positions + 1, dtype=pl.Int32),
+            'entry_index': df['index'].gather(matched_entry_rows),
+            'exit_index': df['index'].gather(matched_exit_rows),
+            'entry_time': df['Datetime'].gather(matched_entry_rows),
+            'exit_time': df['Datetime'].gather(matched_exit_rows),
+            'entry_price': entry_close,
+            'exit_price': exit_close,
+            'profit': exit_close - entry_close,
+        })
+
+        # Same daily limit as the group_by path
+        return (
+            trades.sort('entry_time')
+            .with_columns(pl.col('entry_time').dt.date().alias('entry_date'), pl.col('entry_time').dt.truncate('1d').alias('Date'))
+            .with_columns(pl.col('entry_time').cum_count().over('entry_date').alias('daily_trade_count'))
+            .sort(['entry_date', 'entry_time'])
+            .filter(pl.col('daily_trade_count') <= max_trades_per_day)
+        )
+
+    def match(self, entry_rows: np.ndarray, exit_rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Pairs sorted entry rows with sorted exit rows.
+        Returns the positions (into entry_rows) of the entries that closed and the row each one closed on.
+        """
+        empty = np.empty(0, np.int64)
+        if len(entry_rows) == 0 or len(exit_rows) == 0:
+            return empty, empty
+
+        # Index into exit_rows of the first exit strictly after each entry
+        next_exit = np.searchsorted(exit_rows, entry_rows, side='right')
+        has_exit = next_exit < len(exit_rows)
+        first_exit_rows = exit_rows[np.minimum(next_exit, len(exit_rows) - 1)]
+
+        if self.position_mode == 'overlapping':
+            positions = np.flatnonzero(has_exit)
+        elif self.position_mode == 'segment':
+            next_entry_rows = np.append(entry_rows[1:], np.iinfo(np.int64).max)
+            positions = np.flatnonzero(has_exit & (first_exit_rows < next_entry_rows))
+        elif self.position_mode == 'non_overlapping':
+            positions = self._chain_positions(entry_rows, next_exit, first_exit_rows, len(exit_rows))
+        else:
+            raise ValueError(f"Unknown position mode: {self.position_mode}")
+
+        return positions, first_exit_rows[positions]
+
+    def _chain_positions(self, entry_rows: np.ndarray, next_exit: np.ndarray, first_exit_rows: np.ndarray,
+                         exit_count: int) -> np.ndarray:
+        # One binary search per closed trade: the next position opens on the first entry after the last exit
+        positions = []
+        position = 0
+        while position < len(entry_rows) and next_exit[position] < exit_count:
+            positions.append(position)
+            position = int(np.searchsorted(entry_rows, first_exit_rows[position], side='right'))
+        return np.asarray(positions, dtype=np.int64)
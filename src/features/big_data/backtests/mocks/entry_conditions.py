@@ -2,6 +2,7 @@
 import polars as pl
 from typing import Dict
 from datetime import datetime
+from features.big_data.calculations.timeframe_alignment import align_timeframe
 def entry_logic_func(dfs: Dict[str, pl.DataFrame], params):
     # Extract necessary parameters
     condition_timeframe = params['condition_timeframe']
@@ -56,11 +57,9 @@ def entry_logic_func(dfs: Dict[str, pl.DataFrame], params):
         df_trend['Close'].rolling_mean(window_size=sma_period).alias('sma_trend')
     ])
 
-    # Perform an as-of join to match condition timeframe with trend SMA
-    df_condition = df_condition.join_asof(
-        df_trend.select(['Datetime', 'sma_trend']),
-        on='Datetime',
-        strategy='backward'
+    # Align the trend SMA to the condition timeframe rows
+    df_condition = df_condition.with_columns(
+        align_timeframe(dfs, df_trend.select(['Datetime', 'sma_trend']), trend_timeframe, condition_timeframe)
     )
 
     # Define entry logic based on RSI and SMA
@@ -2,6 +2,7 @@
 from typing import Dict
 from matplotlib.pyplot import plot
 import polars as pl
+from features.big_data.calculations.timeframe_alignment import align_timeframe
 def exit_logic_func(dfs: Dict[str, pl.DataFrame], params):
     # Extract necessary parameters
     df = dfs[params['condition_timeframe']]
@@ -19,11 +20,9 @@ def exit_logic_func(dfs: Dict[str, pl.DataFrame], params):
     atr = tr.rolling_mean(window_size=atr_period).alias('atr_value')
     df_atr = df_atr.with_columns([atr])
 
-    # Perform an as-of join to match condition timeframe with ATR
-    df = df.join_asof(
-        df_atr.select(['Datetime', 'atr_value']),
-        on='Datetime',
-        strategy='backward'
+    # Align the ATR to the condition timeframe rows
+    df = df.with_columns(
+        align_timeframe(dfs, df_atr.select(['Datetime', 'atr_value']), atr_timeframe, params['condition_timeframe'])
     )
 
     # Calculate the target exit price based on the entry price and ATR multiplier
@@ -0,0 +1,106 @@
+import datetime
+import importlib.util
+import os
+
+import numpy as np
+import polars as pl
+
+from common.utils.timer import Timer
+from features.big_data.backtests.backtests_executor import BacktestsExecutor, compile_condition_source
+from features.big_data.backtests.backtests_extension import (align_frames, get_frames_state, get_load_start, get_resume_condition_source,
+                                                             get_resume_state, get_warmup_bars, merge_positions)
+
+BIG_DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "..")
+FROM_DATE = "2024-01-01"
+
+
+def _load_calc_pl(*path: str) -> str:
+    spec = importlib.util.spec_from_file_location("module.name", os.path.join(BIG_DATA_DIR, *path))  # type:ignore
+    module = importlib.util.module_from_spec(spec)  # type:ignore
+    spec.loader.exec_module(module)
+    return module.data_dict["calc_pl"]
+
+
+def _make_candles(days: int, seed: int) -> pl.DataFrame:
+    # Regular weekday sessions (14:30-21:00 UTC), so the extension resumes across nights and weekends like real candles
+    start = datetime.datetime(2024, 1, 1)
+    minutes = pl.datetime_range(start, start + datetime.timedelta(days=days), "1m", eager=True, closed="left")
+    minutes = minutes.filter((minutes.dt.weekday() <= 5) & minutes.dt.time().is_between(datetime.time(14, 30), datetime.time(20, 59)))
+    rng = np.random.default_rng(seed)
+    close = 100 + rng.standard_normal(len(minutes)).cumsum()
+    return pl.DataFrame({
+        "Datetime": minutes,
+        "Open": close, "High": close + rng.random(len(minutes)), "Low": close - rng.random(len(minutes)), "Close": close,
+        "Volume": np.ones(len(minutes)),
+    })
+
+
+def _load(candles: pl.DataFrame, from_date: str, to_datetime: datetime.datetime) -> pl.DataFrame:
+    # Frames as the orch loads them: the candles of the range, indexed from its start
+    start = datetime.datetime.strptime(from_date, "%Y-%m-%d")
+    return candles.filter(pl.col("Datetime").is_between(start, to_datetime, closed="left")).with_row_index()
+
+
+def _extend(candles, stored_positions, stored_dfs, end, entry_condition, exit_condition, entry_source, exit_source, engine_type, engine_options, executor):
+    # The same steps as BackTestsOrch._extend_backtests, for a single stock
+    resume_state = get_resume_state(stored_positions, engine_type, get_frames_state(stored_dfs))
+    assert resume_state is not None, "The stored run has no closed trade to resume after"
+    warmup_bars = get_warmup_bars([entry_condition.params, exit_condition.params])
+    load_start = get_load_start(FROM_DATE, resume_state, ["1m"], warmup_bars)
+    dfs = align_frames({"1m": _load(candles, load_start, end)}, resume_state)
+    assert dfs is not None, "Reloaded frames do not line up with the stored run"
+    resume_source = get_resume_condition_source("1m", resume_state)
+    result = executor.run({"T": dfs}, [entry_condition, compile_condition_source(resume_source)], [exit_condition],
+                          [entry_source, resume_source], [exit_source], engine_type, engine_options)
+    return merge_positions(stored_positions, result["positions_by_stock"]["T"], resume_state), resume_state
+
+
+def _comparable(positions: list, compare_ids: bool) -> list:
+    return [{name: value for name, value in position.items() if compare_ids or name != "position_id"}
+            for position in positions if position["entry_time"] is not None]
+
+
+def test_extension_vs_full_run(days: int = 60, seeds: tuple = (0, 1, 2)):
+    """
+    Parity check of extending a stored backtest against rerunning it in full, for the numba and each_day engines,
+    using the bundled smaAboveEma condition (SMA over EMA to enter, SMA under EMA to exit).
+    Stored runs end both at a day boundary and in the middle of a session, so each_day also resumes inside
+    a trading day whose first part the stored run already saw.
+    each_day position ids may leave gaps after an extension (see merge_positions), so only numba compares them.
+    """
+    calc_pl = _load_calc_pl("conditions", "dicts", "sma_above_ema.py")
+    calculations = {symbol: _load_calc_pl("calculations", "jsons", f"{symbol}.py") for symbol in ["sma", "ema"]}
+    entry_params = {"condition_timeframe": "1m", "is_long": True, "sma_window": 50, "ema_window": 20}
+    exit_params = {**entry_params, "is_long": False}
+    entry_source = {"symbol": "smaAboveEma", "calc_pl": calc_pl, "calculations": calculations, "params": entry_params}
+    exit_source = {"symbol": "smaAboveEma", "calc_pl": calc_pl, "calculations": calculations, "params": exit_params}
+    entry_condition = compile_condition_source(entry_source)
+    exit_condition = compile_condition_source(exit_source)
+    executor = BacktestsExecutor("sequential", 1)
+
+    start = datetime.datetime.strptime(FROM_DATE, "%Y-%m-%d")
+    end = start + datetime.timedelta(days=days)
+    stored_ends = {
+        "day boundary": start + datetime.timedelta(days=days // 2),
+        "mid-session": start + datetime.timedelta(days=days // 2 + 1, hours=17, minutes=3),
+    }
+    for engine_type, engine_options in [("numba", {"stop_loss": 0.01, "take_profit": 0.02}), ("each_day", None)]:
+        for seed in seeds:
+            candles = _make_candles(days, seed)
+            with Timer(f"--------{engine_type} full run --------"):
+                full_dfs = {"1m": _load(candles, FROM_DATE, end)}
+                expected = executor.run({"T": full_dfs}, [entry_condition], [exit_condition], [entry_source], [exit_source],
+                                        engine_type, engine_options)["positions_by_stock"]["T"]
+            for name, stored_end in stored_ends.items():
+                stored_dfs = {"1m": _load(candles, FROM_DATE, stored_end)}
+                stored = executor.run({"T": stored_dfs}, [entry_condition], [exit_condition], [entry_source], [exit_source],
+                                      engine_type, engine_options)["positions_by_stock"]["T"]
+                with Timer(f"--------{engine_type} extension ({name}) --------"):
+                    extended, resume_state = _extend(candles, stored, stored_dfs, end, entry_condition, exit_condition,
+                                                     entry_source, exit_source, engine_type, engine_options, executor)
+
+                compare_ids = engine_type == "numba"
+                assert _comparable(extended, compare_ids) == _comparable(expected, compare_ids), \
+                    f"{engine_type} extension from {name} differs from a full run for seed {seed}"
+                print(f"{engine_type} seed {seed} {name}: resumed from {resume_state['resume_from']}, "
+                      f"{len(_comparable(expected, compare_ids))} trades match")
@@ -0,0 +1,42 @@
+import datetime
+
+import numpy as np
+import polars as pl
+
+from common.utils.timer import Timer
+from features.big_data.backtests.engines.backtest_engine_models import BacktestFrames
+from features.big_data.calculations.timeframe_alignment import align_timeframe
+
+
+def test_join_asof_vs_aligned_timeframes(n: int = 1_000_000, evaluations: int = 50):
+    """
+    Compares bringing a 1h SMA onto n 1m candles with a backward join_asof on every condition evaluation
+    (as a parameter sweep would) against align_timeframe, which computes the row mapping once and then gathers.
+    """
+    np.random.seed(0)
+    start = datetime.datetime(2020, 1, 1)
+    df_1m = pl.DataFrame({
+        "Datetime": pl.datetime_range(start, start + datetime.timedelta(minutes=n - 1), "1m", eager=True),
+        "Close": 100 + np.random.standard_normal(n).cumsum(),
+    })
+    df_1h = df_1m.group_by_dynamic("Datetime", every="1h").agg(pl.col("Close").last())
+    dfs = BacktestFrames({"1m": df_1m, "1h": df_1h})
+    windows = [10 + i for i in range(evaluations)]
+
+    with Timer("--------join_asof per evaluation --------") as t:
+        joined = [
+            df_1m.join_asof(df_1h.select("Datetime", pl.col("Close").rolling_mean(window).alias("sma_trend")), on="Datetime", strategy="backward")
+            for window in windows
+        ]
+    join_time = t.execution_time
+
+    with Timer("--------align_timeframe --------") as t:
+        aligned = [
+            df_1m.with_columns(align_timeframe(dfs, df_1h.select("Datetime", pl.col("Close").rolling_mean(window).alias("sma_trend")), "1h", "1m"))
+            for window in windows
+        ]
+    aligned_time = t.execution_time
+
+    for joined_df, aligned_df in zip(joined, aligned):
+        assert joined_df.equals(aligned_df)
+    print(f"Rows: {n}, evaluations: {evaluations}, alignment: {dfs.timeframe_alignment.get_stats()}, speedup: {join_time / aligned_time:.1f}x")
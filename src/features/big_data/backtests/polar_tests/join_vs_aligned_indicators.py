@@ -0,0 +1,38 @@
+import datetime
+
+import numpy as np
+import polars as pl
+
+from common.utils.timer import Timer
+from features.big_data.calculations.indicator_cache import attach_indicator
+
+
+def test_join_vs_aligned_indicators(n: int = 1_000_000, windows: tuple = (20, 50, 200)):
+    """
+    Compares attaching indicator columns with a Datetime left join (the old condition code)
+    against positional attachment with attach_indicator, on n 1m candles.
+    """
+    np.random.seed(0)
+    df = pl.DataFrame({
+        "Datetime": pl.datetime_range(datetime.datetime(2020, 1, 1), datetime.datetime(2020, 1, 1) + datetime.timedelta(minutes=n - 1), "1m", eager=True),
+        "Close": 100 + np.random.standard_normal(n).cumsum(),
+    })
+    indicators = [
+        df.with_columns(pl.col("Close").rolling_mean(window).alias(f"SMA_1m_{window}")).select(["Datetime", f"SMA_1m_{window}"])
+        for window in windows
+    ]
+
+    with Timer("--------join on Datetime --------") as t:
+        joined_df = df
+        for indicator in indicators:
+            joined_df = joined_df.join(indicator, on="Datetime", how="left")
+    join_time = t.execution_time
+
+    with Timer("--------attach_indicator --------") as t:
+        aligned_df = df
+        for indicator in indicators:
+            aligned_df = attach_indicator(aligned_df, indicator)
+    aligned_time = t.execution_time
+
+    assert joined_df.equals(aligned_df)
+    print(f"Rows: {n}, indicators: {len(indicators)}, speedup: {join_time / aligned_time:.1f}x")
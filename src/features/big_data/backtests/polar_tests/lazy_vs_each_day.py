@@ -0,0 +1,64 @@
+import datetime
+import importlib.util
+import os
+
+import numpy as np
+import polars as pl
+
+from common.utils.timer import Timer
+from features.big_data.backtests.contracts.backtests_api_contract import BackTestPosition
+from features.big_data.backtests.backtests_executor import compile_condition_source
+from features.big_data.backtests.engines.backtest_engine_lazy import BackTestEngineLazy
+from features.big_data.backtests.engines.backtest_engine_models import BacktestEngineCondition
+from features.big_data.backtests.engines.backtest_engine_vectorized_each_day import BackTestEngineVectorizedEachDay
+
+BIG_DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "..")
+
+
+def _load_calc_pl(*path: str) -> str:
+    spec = importlib.util.spec_from_file_location("module.name", os.path.join(BIG_DATA_DIR, *path))  # type:ignore
+    module = importlib.util.module_from_spec(spec)  # type:ignore
+    spec.loader.exec_module(module)
+    return module.data_dict["calc_pl"]
+
+
+def _make_candles(n: int, seed: int) -> pl.DataFrame:
+    close = 100 + np.random.default_rng(seed).standard_normal(n).cumsum()
+    start = datetime.datetime(2024, 1, 1)
+    return pl.DataFrame({
+        "Datetime": pl.datetime_range(start, start + datetime.timedelta(minutes=n - 1), "1m", eager=True),
+        "Open": close, "High": close + 0.5, "Low": close - 0.5, "Close": close, "Volume": np.ones(n),
+    }).with_row_index()
+
+
+def test_lazy_vs_each_day(n: int = 500_000, seeds: tuple = (0, 1, 2)):
+    """
+    Parity check of BackTestEngineLazy against BackTestEngineVectorizedEachDay using the bundled
+    smaAboveEma condition (SMA over EMA to enter, SMA under EMA to exit), fused, streamed and eager.
+    """
+    calc_pl = _load_calc_pl("conditions", "dicts", "sma_above_ema.py")
+    calculations = {symbol: _load_calc_pl("calculations", "jsons", f"{symbol}.py") for symbol in ["sma", "ema"]}
+    entry_params = {"condition_timeframe": "1m", "is_long": True, "sma_window": 50, "ema_window": 20}
+    exit_params = {**entry_params, "is_long": False}
+    entry_condition = compile_condition_source({"symbol": "smaAboveEma", "calc_pl": calc_pl, "calculations": calculations, "params": entry_params})
+    exit_condition = compile_condition_source({"symbol": "smaAboveEma", "calc_pl": calc_pl, "calculations": calculations, "params": exit_params})
+    eager_entry_condition = BacktestEngineCondition(entry_condition.name, entry_condition.params, entry_condition.calc)  # No expr, so calc_pl runs eagerly
+    eager_exit_condition = BacktestEngineCondition(exit_condition.name, exit_condition.params, exit_condition.calc)
+
+    for seed in seeds:
+        candles = _make_candles(n, seed)
+        with Timer("--------each_day --------"):
+            expected = BackTestEngineVectorizedEachDay().backtest({"1m": candles}, [entry_condition], [exit_condition])
+        with Timer("--------lazy (fused) --------"):
+            fused = BackTestEngineLazy().backtest({"1m": candles}, [entry_condition], [exit_condition])
+        with Timer("--------lazy (fused, streaming) --------"):
+            streamed = BackTestEngineLazy(streaming=True).backtest({"1m": candles}, [entry_condition], [exit_condition])
+        with Timer("--------lazy (eager conditions) --------"):
+            eager = BackTestEngineLazy().backtest({"1m": candles}, [eager_entry_condition], [eager_exit_condition])
+
+        assert fused.equals(expected), f"Fused lazy trades differ from each_day for seed {seed}"
+        assert streamed.equals(expected), f"Streaming lazy trades differ from each_day for seed {seed}"
+        assert eager.equals(expected), f"Eager lazy trades differ from each_day for seed {seed}"
+        for row in fused.to_dicts():
+            BackTestPosition(**row)  # Rows the API returns as they are
+        print(f"seed {seed}: {len(expected)} trades match")
@@ -0,0 +1,82 @@
+import datetime
+import importlib.util
+import os
+
+import numpy as np
+import polars as pl
+
+from common.utils.timer import Timer
+from features.big_data.backtests.backtests_executor import compile_condition_source
+from features.big_data.backtests.engines.backtest_engine_numba import BackTestEngineNumba
+from features.big_data.backtests.engines.backtest_engine_utils import BacktestEngineUtils
+
+BIG_DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "..")
+
+
+def _load_calc_pl(*path: str) -> str:
+    spec = importlib.util.spec_from_file_location("module.name", os.path.join(BIG_DATA_DIR, *path))  # type:ignore
+    module = importlib.util.module_from_spec(spec)  # type:ignore
+    spec.loader.exec_module(module)
+    return module.data_dict["calc_pl"]
+
+
+def _make_candles(n: int, seed: int) -> pl.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 + rng.standard_normal(n).cumsum()
+    start = datetime.datetime(2024, 1, 1)
+    return pl.DataFrame({
+        "Datetime": pl.datetime_range(start, start + datetime.timedelta(minutes=n - 1), "1m", eager=True),
+        "Open": close, "High": close + rng.random(n), "Low": close - rng.random(n), "Close": close, "Volume": np.ones(n),
+    }).with_row_index()
+
+
+def _python_loop(df: pl.DataFrame, entry_signal: list, exit_signal: list, stop_loss: float, take_profit: float) -> list:
+    # Plain row loop with the same fill rules as the jitted kernel, long side only
+    open_, high, low, close = (df[column].to_list() for column in ["Open", "High", "Low", "Close"])
+    trades, entry_row = [], None
+    for i in range(len(close)):
+        if entry_row is None:
+            if entry_signal[i]:
+                entry_row = i
+            continue
+        stop_price, target_price = close[entry_row] * (1 - stop_loss), close[entry_row] * (1 + take_profit)
+        if stop_loss and low[i] <= stop_price:
+            trades.append((entry_row, i, min(open_[i], stop_price), "stop_loss"))
+        elif take_profit and high[i] >= target_price:
+            trades.append((entry_row, i, max(open_[i], target_price), "take_profit"))
+        elif exit_signal[i]:
+            trades.append((entry_row, i, close[i], "signal"))
+        else:
+            continue
+        entry_row = None
+    return trades
+
+
+def test_numba_vs_python_loop(n: int = 1_000_000, seeds: tuple = (0, 1), stop_loss: float = 0.01, take_profit: float = 0.02):
+    """
+    Parity and timing of BackTestEngineNumba against a plain Python row loop using the bundled
+    smaAboveEma condition (SMA over EMA to enter, SMA under EMA to exit) with a stop-loss and a take-profit.
+    """
+    calc_pl = _load_calc_pl("conditions", "dicts", "sma_above_ema.py")
+    calculations = {symbol: _load_calc_pl("calculations", "jsons", f"{symbol}.py") for symbol in ["sma", "ema"]}
+    entry_params = {"condition_timeframe": "1m", "is_long": True, "sma_window": 50, "ema_window": 20}
+    exit_params = {**entry_params, "is_long": False}
+    entry_condition = compile_condition_source({"symbol": "smaAboveEma", "calc_pl": calc_pl, "calculations": calculations, "params": entry_params})
+    exit_condition = compile_condition_source({"symbol": "smaAboveEma", "calc_pl": calc_pl, "calculations": calculations, "params": exit_params})
+
+    for seed in seeds:
+        dfs = {"1m": _make_candles(n, seed)}
+        with Timer("--------numba engine --------"):
+            trades = BackTestEngineNumba(stop_loss, take_profit).backtest(dfs, [entry_condition], [exit_condition])
+
+        entry_signal = BacktestEngineUtils.compute_entry_signals(dfs, [entry_condition]).fill_null(False).to_list()
+        exit_signal = BacktestEngineUtils.compute_exit_signals(dfs, [exit_condition]).fill_null(False).to_list()
+        with Timer("--------python loop --------"):
+            expected = _python_loop(dfs["1m"], entry_signal, exit_signal, stop_loss, take_profit)
+
+        actual = list(zip(trades["entry_index"], trades["exit_index"], trades["exit_price"], trades["exit_reason"]))
+        assert len(actual) == len(expected), f"Trade count differs for seed {seed}"
+        for (entry, exit, price, reason), (expected_entry, expected_exit, expected_price, expected_reason) in zip(actual, expected):
+            assert (entry, exit, reason) == (expected_entry, expected_exit, expected_reason) and np.isclose(price, expected_price), \
+                f"Trade at row {expected_entry} differs for seed {seed}"
+        print(f"seed {seed}: {len(expected)} trades match")
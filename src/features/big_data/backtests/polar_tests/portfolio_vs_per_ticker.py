@@ -0,0 +1,61 @@
+import datetime
+import importlib.util
+import os
+
+import numpy as np
+import polars as pl
+
+from common.utils.timer import Timer
+from features.big_data.backtests.backtests_executor import compile_condition_source
+from features.big_data.backtests.engines.backtest_engine_models import BacktestFrames
+from features.big_data.backtests.engines.backtest_engine_numba import BackTestEngineNumba
+from features.big_data.backtests.engines.backtest_engine_portfolio import BackTestEnginePortfolio
+
+BIG_DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "..")
+
+
+def _load_calc_pl(*path: str) -> str:
+    spec = importlib.util.spec_from_file_location("module.name", os.path.join(BIG_DATA_DIR, *path))  # type:ignore
+    module = importlib.util.module_from_spec(spec)  # type:ignore
+    spec.loader.exec_module(module)
+    return module.data_dict["calc_pl"]
+
+
+def _make_candles(n: int, seed: int) -> pl.DataFrame:
+    close = 100 * np.exp(np.random.default_rng(seed).normal(0, 0.001, n).cumsum())
+    start = datetime.datetime(2024, 1, 1)
+    return pl.DataFrame({
+        "Datetime": pl.datetime_range(start, start + datetime.timedelta(minutes=n - 1), "1m", eager=True),
+        "Open": close, "High": close, "Low": close, "Close": close, "Volume": np.ones(n),
+    }).with_row_index()
+
+
+def test_portfolio_vs_per_ticker(n: int = 200_000, tickers: int = 20):
+    """
+    Compares one stacked BackTestEnginePortfolio pass over all tickers with a per-ticker loop of BackTestEngineNumba,
+    using the bundled smaAboveEma condition. With a negligible position size capital never binds,
+    so every ticker must get exactly the numba engine's trades; a second run shows the capped allocation.
+    """
+    calc_pl = _load_calc_pl("conditions", "dicts", "sma_above_ema.py")
+    calculations = {symbol: _load_calc_pl("calculations", "jsons", f"{symbol}.py") for symbol in ["sma", "ema"]}
+    entry_params = {"condition_timeframe": "1m", "is_long": True, "sma_window": 50, "ema_window": 20}
+    exit_params = {**entry_params, "is_long": False}
+    entry_condition = compile_condition_source({"symbol": "smaAboveEma", "calc_pl": calc_pl, "calculations": calculations, "params": entry_params})
+    exit_condition = compile_condition_source({"symbol": "smaAboveEma", "calc_pl": calc_pl, "calculations": calculations, "params": exit_params})
+    dfs_by_stock = {f"T{seed}": {"1m": _make_candles(n, seed)} for seed in range(tickers)}
+
+    with Timer("--------per ticker numba loop --------"):
+        expected = {stock: BackTestEngineNumba().backtest(BacktestFrames(dfs), [entry_condition], [exit_condition])
+                    for stock, dfs in dfs_by_stock.items()}
+    with Timer("--------stacked portfolio --------"):
+        trades, _ = BackTestEnginePortfolio(1_000_000, 1e-9).backtest(dfs_by_stock, [entry_condition], [exit_condition])
+
+    for stock, stock_trades in expected.items():
+        actual = trades.filter(pl.col("ticker") == stock)
+        assert actual["entry_index"].to_list() == stock_trades["entry_index"].to_list(), f"Entries differ for {stock}"
+        assert actual["exit_index"].to_list() == stock_trades["exit_index"].to_list(), f"Exits differ for {stock}"
+    print(f"{trades.height} trades match over {tickers} tickers")
+
+    trades, equity = BackTestEnginePortfolio(100_000, 0.1, max_positions=5).backtest(dfs_by_stock, [entry_condition], [exit_condition])
+    assert abs(equity["equity"][-1] - (100_000 + trades["pnl"].sum())) < 1e-6, "Final equity differs from the realized pnl"
+    print(f"Capped portfolio: {trades.height} trades, final equity {equity['equity'][-1]:.2f}")
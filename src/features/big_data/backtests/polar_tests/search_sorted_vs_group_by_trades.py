@@ -0,0 +1,76 @@
+import datetime
+
+import numpy as np
+import polars as pl
+
+from common.utils.timer import Timer
+from features.big_data.backtests.contracts.backtests_api_contract import BackTestPosition
+from features.big_data.backtests.engines.backtest_engine_vectorized_each_day import BackTestEngineVectorizedEachDay
+from features.big_data.backtests.engines.backtest_trade_matcher import BacktestTradeMatcher
+
+
+def _make_signals(n: int, seed: int, entry_rate: float, exit_rate: float) -> pl.DataFrame:
+    # Candles with random entry/exit conditions, taken through EachDay's entry and exit phases
+    rng = np.random.default_rng(seed)
+    close = 100 + rng.standard_normal(n).cumsum()
+    start = datetime.datetime(2024, 1, 1)
+    df = pl.DataFrame({
+        "Datetime": pl.datetime_range(start, start + datetime.timedelta(minutes=n - 1), "1m", eager=True),
+        "Close": close,
+        "entry_signal": rng.random(n) < entry_rate,
+        "exit_condition": rng.random(n) < exit_rate,
+    }).with_row_index()
+
+    engine = BackTestEngineVectorizedEachDay()
+    df = engine._add_position_id_and_entry_price(df)
+    # Exits strictly after the entry of their own position, which is what BacktestTradeMatcher pairs
+    return df.with_columns(
+        (pl.col('exit_condition') & (pl.col('Datetime') > pl.col('Datetime').first().over('position_id'))).alias('exit_signal')
+    )
+
+
+def _python_loop(entry_rows: list, exit_rows: list, overlapping: bool) -> list:
+    exits = set(exit_rows)
+    last_row = max(exit_rows, default=-1)
+    trades, busy_until = [], -1
+    for position, entry_row in enumerate(entry_rows):
+        if not overlapping and entry_row <= busy_until:
+            continue
+        exit_row = next((row for row in range(entry_row + 1, last_row + 1) if row in exits), None)
+        if exit_row is None:
+            break
+        trades.append((position, exit_row))
+        busy_until = exit_row
+    return trades
+
+
+def test_search_sorted_vs_group_by(n: int = 2_000_000, seeds: tuple = (0, 1), entry_rate: float = 0.01, exit_rate: float = 0.005):
+    """
+    Timing and parity of BacktestTradeMatcher ('segment' mode) against the group_by trade compilation of
+    BackTestEngineVectorizedEachDay, using the same entry and exit signals.
+    """
+    for seed in seeds:
+        df = _make_signals(n, seed, entry_rate, exit_rate)
+        for max_trades_per_day in (1, 1_000_000):
+            with Timer(f"--------group_by (max {max_trades_per_day}/day) --------"):
+                expected = BackTestEngineVectorizedEachDay()._compile_trades(df, max_trades_per_day)
+            with Timer(f"--------search_sorted (max {max_trades_per_day}/day) --------"):
+                actual = BacktestTradeMatcher('segment').compile_trades(df, max_trades_per_day)
+
+            assert actual.equals(expected), f"Trades differ for seed {seed}"
+            for row in actual.to_dicts():
+                BackTestPosition(**row)  # Rows the API returns as they are
+            print(f"seed {seed}: {len(actual)} trades match with max {max_trades_per_day}/day")
+
+
+def test_position_modes(n: int = 20_000, seeds: tuple = (0, 1, 2), entry_rate: float = 0.05, exit_rate: float = 0.02):
+    """Checks the overlapping and non_overlapping modes against a plain Python loop."""
+    for seed in seeds:
+        df = _make_signals(n, seed, entry_rate, exit_rate)
+        entry_rows = np.flatnonzero(df['entry_signal'].to_numpy())
+        exit_rows = np.flatnonzero(df['exit_condition'].to_numpy())
+        for mode, overlapping in (('overlapping', True), ('non_overlapping', False)):
+            positions, matched_exit_rows = BacktestTradeMatcher(mode).match(entry_rows, exit_rows)
+            assert list(zip(positions.tolist(), matched_exit_rows.tolist())) == _python_loop(entry_rows.tolist(), exit_rows.tolist(), overlapping), \
+                f"{mode} trades differ for seed {seed}"
+            print(f"seed {seed}: {len(positions)} {mode} trades match")
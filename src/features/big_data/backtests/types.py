@@ -0,0 +1,120 @@
+from datetime import date, datetime
+from typing import Any, Dict, List, Literal, Optional
+
+from typing_extensions import NotRequired, TypedDict
+
+BacktestEngineType = Literal['first_daily_trade', 'each_day', 'lazy', 'numba']
+BacktestExecutorMode = Literal['sequential', 'thread', 'process']
+BacktestPositionMode = Literal['segment', 'overlapping', 'non_overlapping']
+
+
+class BacktestEngineOptions(TypedDict, total=False):
+    stop_loss: Optional[float]  # Fraction of the entry price, used by the numba engine
+    take_profit: Optional[float]  # Fraction of the entry price, used by the numba engine
+    position_mode: Optional[BacktestPositionMode]  # Search-sorted trade matching for the each_day engine
+
+
+class BacktestConditionSource(TypedDict):
+    """A condition as plain source code, so it can be recompiled inside a worker process."""
+    symbol: str
+    calc_pl: str
+    calculations: Dict[str, str]  # required calculation symbol -> calc_pl, dependencies first
+    params: Dict[str, Any]
+
+
+class BacktestDailyStats(TypedDict):
+    date: date  # Day the trades closed on
+    trades: int
+    profit: float
+    win_rate: float
+    equity: float  # Cumulative profit at the end of the day
+
+
+class BacktestMetrics(TypedDict):
+    trades: int
+    total_profit: float
+    win_rate: float
+    profit_factor: Optional[float]  # Gross profit / gross loss, None without losing trades
+    avg_win: Optional[float]
+    avg_loss: Optional[float]
+    max_drawdown: float  # Largest fall of cumulative profit from its peak, in price units
+    sharpe: Optional[float]  # Annualized, from daily returns
+    sortino: Optional[float]
+    exposure: float  # Fraction of the backtest range with an open position
+    daily: List[BacktestDailyStats]
+
+
+class BacktestRunResult(TypedDict):
+    positions_by_stock: Dict[str, List[Dict[str, Any]]]  # Empty lists when the trades were not requested
+    timings: Dict[str, float]  # ticker -> seconds spent backtesting it
+    metrics_by_stock: NotRequired[Dict[str, BacktestMetrics]]
+
+
+class BacktestFrameState(TypedDict):
+    rows: int  # Rows of the frame, counted from the start of the backtest range
+    last_datetime: Optional[datetime]
+
+
+class BacktestResumeState(TypedDict):
+    """Where an extension of a stored backtest restarts its entries, and the frames of the run it continues."""
+    resume_from: datetime
+    resume_inclusive: bool
+    frames: Dict[str, BacktestFrameState]  # timeframe -> frame state
+
+
+class BacktestSweepPoint(TypedDict):
+    """One combination of a parameter sweep: the full params of every entry and exit condition, in request order."""
+    entry_params: List[Dict[str, Any]]
+    exit_params: List[Dict[str, Any]]
+
+
+class BacktestTradesSummary(TypedDict):
+    trades: int
+    total_profit: float
+    avg_profit: float
+    win_rate: float
+
+
+class BacktestSweepRow(BacktestTradesSummary):
+    point: BacktestSweepPoint
+    profit_by_stock: Dict[str, float]
+
+
+class BacktestWalkForwardWindow(TypedDict):
+    """One rolling window; dates are YYYY-MM-DD, each range includes its start and excludes its end."""
+    train_from: str
+    train_to: str
+    test_from: str
+    test_to: str
+    train: BacktestTradesSummary
+    test: BacktestTradesSummary
+    test_profit_by_stock: Dict[str, float]
+
+
+class BacktestWalkForwardResult(TypedDict):
+    windows: List[BacktestWalkForwardWindow]
+    timings: Dict[str, float]  # ticker -> seconds spent backtesting its full range
+
+
+class BacktestPortfolioSummary(TypedDict):
+    initial_capital: float
+    final_equity: float
+    total_return: float  # Fraction of the initial capital
+    max_drawdown: float  # Largest fall from an equity peak, as a fraction of that peak
+    trades: int
+    win_rate: float
+
+
+class BacktestPortfolioResult(TypedDict):
+    trades: List[Dict[str, Any]]  # Taken trades in entry order, across all tickers
+    equity_curve: List[Dict[str, Any]]  # Datetime, cash, market_value and equity at the end of every equity_every period
+    summary: BacktestPortfolioSummary
+    seconds: float
+
+
+class BacktestSweepResult(TypedDict):
+    rows: List[BacktestSweepRow]  # Ranked best first
+    timings: Dict[str, float]  # ticker -> seconds spent sweeping it
+
+
+BacktestJobStatus = Literal['queued', 'running', 'completed', 'failed']
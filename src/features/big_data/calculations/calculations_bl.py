@@ -2,7 +2,7 @@ import importlib
 import json
 import logging
 import os
-from typing import Any
+from typing import Any, Callable
 import polars as pl
 import polars_talib as plta
 
@@ -12,6 +12,7 @@ from common.base.base_mongo_bl import BaseMongoBl
 from common.services.models.calculations_model import CalculationsModel
 from features.big_data.calculations.calculations_dal import CalculationsDal
 from features.big_data.calculations.calculations_documenter import CalculationsDocumenter
+from features.big_data.calculations.compile_utils import calc_pl_from_expr, exec_definitions
 from server.src.common.third_party_api.openai_api import OpenAIAssistant
 from server.src.common.utils.singleton import singleton
 from server.src.prompts import prompts1
@@ -30,6 +31,7 @@ class CalculationsBl(BaseMongoBl[CalculationsDal, CalculationsModel]):
             'plta': plta,
             # Include necessary libraries in the execution environment
         }
+        self.change_listeners: list[Callable[[str], None]] = []  # Called with the symbol of an updated or deleted calculation
         
     
     def document_calculations(self):
@@ -70,24 +72,51 @@ class CalculationsBl(BaseMongoBl[CalculationsDal, CalculationsModel]):
             required_calc_doc = self.dal.get_calculation_by_symbol(required_symbol.lower())
             self.get_calculation_as_compiled_class(required_calc_doc)  # Recursive compilation of dependencies
 
-        # Create temporary namespace for compilation
-        temp_namespace = {}
-        
         # Compile and execute the calculation code
-        code_obj = compile(calc_pl, f"<calculation {symbol}>", 'exec')
-        exec(code_obj, {**self.execution_namespace}, temp_namespace)
+        temp_namespace = exec_definitions(calc_pl, f"<calculation {symbol}>", self.execution_namespace)
+        if 'calc_pl' not in temp_namespace and 'calc_expr' in temp_namespace:
+            temp_namespace['calc_pl'] = calc_pl_from_expr(temp_namespace['calc_expr'])
                 
         self.compiled_calculations[symbol] = temp_namespace
         self.execution_namespace[symbol] = temp_namespace
 
         return self.execution_namespace[symbol]
 
+    def get_calculation_sources(self, required_calculations: list[str], sources: dict[str, str] | None = None) -> dict[str, str]:
+        """
+        Returns {symbol: calc_pl} for the required calculations and everything they depend on,
+        ordered so that every calculation comes after its dependencies.
+        """
+        sources = {} if sources is None else sources
+        for required_symbol in required_calculations:
+            if required_symbol in sources:
+                continue
+            calc_doc = self.dal.get_calculation_by_symbol(required_symbol.lower())
+            self.get_calculation_sources(calc_doc.required_calculations or [], sources)
+            sources[required_symbol] = calc_doc.calc_pl
+        return sources
+
+    def add_change_listener(self, listener: Callable[[str], None]):
+        self.change_listeners.append(listener)
+
+    def invalidate_calculation(self, symbol: str):
+        """
+        Drops every compiled calculation and notifies listeners that `symbol` changed.
+        Compiled calculations capture their dependencies at compile time, so all of them are dropped, not just `symbol`.
+        """
+        for compiled_symbol in list(self.compiled_calculations):
+            self.compiled_calculations.pop(compiled_symbol, None)
+            self.execution_namespace.pop(compiled_symbol, None)
+        for listener in self.change_listeners:
+            listener(symbol)
+
     def update_calculation(self, symbol: str, update_data: dict[str, Any]):
         """
         Updates an existing calculation by its symbol.
         """
         try:
             self.dal.update_calculation(symbol, update_data)
+            self.invalidate_calculation(symbol)
             return {"status": "success", "message": "Calculation updated."}
         except Exception as e:
             return {"status": "error", "message": str(e)}
@@ -98,6 +127,7 @@ class CalculationsBl(BaseMongoBl[CalculationsDal, CalculationsModel]):
         """
         try:
             self.dal.delete_calculation(symbol)
+            self.invalidate_calculation(symbol)
             return {"status": "success", "message": "Calculation deleted."}
         except Exception as e:
             return {"status": "error", "message": str(e)}
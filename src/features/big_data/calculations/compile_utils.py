@@ -0,0 +1,24 @@
+from typing import Any, Callable, Dict, List, Union
+
+import polars as pl
+
+CalcExpr = Callable[[Dict[str, Any]], Union[pl.Expr, List[pl.Expr]]]
+
+
+def exec_definitions(source: str, filename: str, namespace: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Executes calculation or condition source against a copy of `namespace` and returns only the names it defined.
+    Functions share one globals dict, so a source's calc_pl can call the calc_expr defined next to it.
+    """
+    exec_globals = {**namespace}
+    exec(compile(source, filename, 'exec'), exec_globals)
+    return {name: value for name, value in exec_globals.items() if name not in namespace or exec_globals[name] is not namespace[name]}
+
+
+def calc_pl_from_expr(calc_expr: CalcExpr) -> Callable[[pl.DataFrame, Dict[str, Any]], pl.DataFrame]:
+    """Derives the DataFrame form of a calculation from its expression form."""
+    def calc_pl(df: pl.DataFrame, params: Dict[str, Any]) -> pl.DataFrame:
+        exprs = calc_expr(params)
+        return df.select(['Datetime', *(exprs if isinstance(exprs, list) else [exprs])])
+
+    return calc_pl
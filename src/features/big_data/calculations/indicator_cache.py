@@ -0,0 +1,99 @@
+import threading
+from typing import Any, Callable, Dict, List, Mapping, Tuple, Union
+
+import polars as pl
+
+IndicatorResult = Union[pl.DataFrame, pl.Series, pl.Expr, List[pl.Series], List[pl.Expr]]
+IndicatorKey = Tuple[str, str, int, Tuple[Tuple[str, Any], ...]]  # (symbol, timeframe, rows, normalized params)
+
+
+class IndicatorCache:
+    """
+    Memoizes calculation results for one ticker during one backtest run,
+    so an indicator shared by several entry and exit conditions is computed once.
+    """
+    def __init__(self):
+        self._results: Dict[IndicatorKey, pl.DataFrame] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, symbol: str, df: pl.DataFrame, params: Mapping[str, Any], compute: Callable[[], pl.DataFrame]) -> pl.DataFrame:
+        key = (symbol.lower(), str(params.get('timeframe')), df.height, self.normalize_params(params))
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self.hits += 1
+                return result
+            self.misses += 1
+
+        result = compute()
+        with self._lock:
+            return self._results.setdefault(key, result)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"entries": len(self._results), "hits": self.hits, "misses": self.misses}
+
+    @staticmethod
+    def normalize_params(params: Mapping[str, Any]) -> Tuple[Tuple[str, Any], ...]:
+        """Orders params by name and folds integral floats into ints, so {'window': 20.0} and {'window': 20} share a key."""
+        normalized = []
+        for name, value in sorted(params.items()):
+            if isinstance(value, float) and value.is_integer():
+                value = int(value)
+            elif isinstance(value, (list, dict)):
+                value = repr(value)
+            normalized.append((name, value))
+        return tuple(normalized)
+
+
+def make_calc_indicator(calculations: Mapping[str, Dict[str, Any]]) -> Callable[[Dict[str, pl.DataFrame], str, Dict[str, Any]], pl.DataFrame]:
+    """
+    Returns the `calc_indicator(dfs, symbol, params)` helper exposed to condition code.
+    It runs the compiled calculation on dfs[params['timeframe']], through the frames' indicator cache when they carry one.
+    """
+    def calc_indicator(dfs: Dict[str, pl.DataFrame], symbol: str, params: Dict[str, Any]) -> pl.DataFrame:
+        calc_pl = calculations[symbol]['calc_pl']
+        df = dfs[params['timeframe']]
+        indicator_cache = getattr(dfs, 'indicator_cache', None)
+        if indicator_cache is None:
+            return calc_pl(df, params)
+        return indicator_cache.get_or_compute(symbol, df, params, lambda: calc_pl(df, params))
+
+    return calc_indicator
+
+
+def make_indicator_expr(calculations: Mapping[str, Dict[str, Any]]) -> Callable[[str, Dict[str, Any]], Union[pl.Expr, List[pl.Expr]]]:
+    """
+    Returns the `indicator_expr(symbol, params)` helper exposed to condition code.
+    It returns the calculation's calc_expr output, so a condition can build one fused expression instead of frames.
+    """
+    def indicator_expr(symbol: str, params: Dict[str, Any]) -> Union[pl.Expr, List[pl.Expr]]:
+        calc_expr = calculations[symbol].get('calc_expr')
+        if calc_expr is None:
+            raise ValueError(f"Calculation {symbol} has no calc_expr form")
+        return calc_expr(params)
+
+    return indicator_expr
+
+
+def attach_indicator(df: pl.DataFrame, indicator: IndicatorResult) -> pl.DataFrame:
+    """
+    Adds indicator columns to df with with_columns instead of a Datetime join.
+    Calculations return a frame row-aligned with their input, so columns are attached by position;
+    a frame that is not aligned (other height or edges) falls back to a left join on Datetime.
+    """
+    if not isinstance(indicator, pl.DataFrame):
+        return df.with_columns(indicator)
+
+    value_columns = [column for column in indicator.columns if column != 'Datetime']
+    if indicator.height == df.height and _has_same_edges(df, indicator):
+        return df.with_columns(indicator.select(value_columns).get_columns())
+    return df.join(indicator.select(['Datetime', *value_columns]), on='Datetime', how='left')
+
+
+def _has_same_edges(df: pl.DataFrame, indicator: pl.DataFrame) -> bool:
+    # Both frames come from the same sorted candles, so equal height and equal first/last Datetime means aligned
+    if 'Datetime' not in indicator.columns or df.height == 0:
+        return True
+    return df['Datetime'][0] == indicator['Datetime'][0] and df['Datetime'][-1] == indicator['Datetime'][-1]
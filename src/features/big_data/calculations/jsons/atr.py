@@ -47,22 +47,21 @@ data_dict = {
         "value_field": ["ATR_<timeframe>_<window>"]
     },
     "calc_pl": """
-def calc_pl(df, params):
-    import polars as pl
+import polars as pl
+
+def calc_expr(params):
     timeframe = params.get('timeframe')
     window = params.get('window')
 
-    tr_df = df.with_columns([
-        (pl.col("High") - pl.col("Low")).abs().alias("high_low"),
-        (pl.col("High") - pl.col("Close").shift(1)).abs().alias("high_prev_close"),
-        (pl.col("Low") - pl.col("Close").shift(1)).abs().alias("low_prev_close")
-    ]).with_columns(
-        pl.max_horizontal(["high_low", "high_prev_close", "low_prev_close"]).alias("True_Range")
-    ).with_columns(
-        pl.col("True_Range").rolling_mean(window).alias(f"ATR_{timeframe}_{window}")
-    )
+    true_range = pl.max_horizontal([
+        (pl.col("High") - pl.col("Low")).abs(),
+        (pl.col("High") - pl.col("Close").shift(1)).abs(),
+        (pl.col("Low") - pl.col("Close").shift(1)).abs()
+    ])
+    return true_range.rolling_mean(window).alias(f"ATR_{timeframe}_{window}")
 
-    return tr_df.select(["Datetime", f"ATR_{timeframe}_{window}"])
+def calc_pl(df, params):
+    return df.select(["Datetime", calc_expr(params)])
 """
 }
 
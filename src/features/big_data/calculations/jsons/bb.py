@@ -66,21 +66,22 @@ data_dict = {
         ]
     },
     "calc_pl": """
-def calc_pl(df, params):
-    import polars as pl
+import polars as pl
+
+def calc_expr(params):
     timeframe = params.get('timeframe')
     window = params.get('window')
     std_dev = params.get('std_dev')
 
-    bb_df = df.with_columns(
-        pl.col("Close").rolling_mean(window).alias(f"BB_Middle_{timeframe}_{window}")
-    ).with_columns(
-        pl.col("Close").rolling_std(window).alias("rolling_std")
-    ).with_columns([
-        (pl.col(f"BB_Middle_{timeframe}_{window}") + pl.col("rolling_std") * std_dev).alias(f"BB_Upper_{timeframe}_{window}_{std_dev}"),
-        (pl.col(f"BB_Middle_{timeframe}_{window}") - pl.col("rolling_std") * std_dev).alias(f"BB_Lower_{timeframe}_{window}_{std_dev}")
-    ])
+    middle = pl.col("Close").rolling_mean(window)
+    rolling_std = pl.col("Close").rolling_std(window)
+    return [
+        middle.alias(f"BB_Middle_{timeframe}_{window}"),
+        (middle + rolling_std * std_dev).alias(f"BB_Upper_{timeframe}_{window}_{std_dev}"),
+        (middle - rolling_std * std_dev).alias(f"BB_Lower_{timeframe}_{window}_{std_dev}")
+    ]
 
-    return bb_df.select(["Datetime", f"BB_Middle_{timeframe}_{window}", f"BB_Upper_{timeframe}_{window}_{std_dev}", f"BB_Lower_{timeframe}_{window}_{std_dev}"])
+def calc_pl(df, params):
+    return df.select(["Datetime", *calc_expr(params)])
 """
 }
@@ -43,21 +43,20 @@ data_dict = {
     "calc_pl": """
 import polars as pl
 
-def calc_pl(df, params):
+def calc_expr(params):
     window = params['window']
     timeframe = params['timeframe']
     alpha = 2 / (window + 1)
     
     ema_column_name = f"EMA_{timeframe}_{window}"
     
-    df = df.sort("Datetime").with_columns(
-        (
-            pl.col("Close")
-            .ewm_mean(alpha=alpha, adjust=False, min_periods=window)
-            .alias(ema_column_name)
-        )
+    return (
+        pl.col("Close")
+        .ewm_mean(alpha=alpha, adjust=False, min_periods=window)
+        .alias(ema_column_name)
     )
-    
-    return df.select(["Datetime", ema_column_name])
+
+def calc_pl(df, params):
+    return df.sort("Datetime").select(["Datetime", calc_expr(params)])
 """
 }
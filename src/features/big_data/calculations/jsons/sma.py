@@ -47,15 +47,14 @@ data_dict = {
         "value_field": ["SMA_<timeframe>_<window>"]
     },
     "calc_pl": """
-def calc_pl(df, params):
-    import polars as pl
+import polars as pl
+
+def calc_expr(params):
     timeframe = params.get('timeframe')
     window = params.get('window')
+    return pl.col('Close').rolling_mean(window).alias(f'SMA_{timeframe}_{window}')
 
-    sma_df = df.with_columns(
-        pl.col('Close').rolling_mean(window).alias(f'SMA_{timeframe}_{window}')
-    )
-
-    return sma_df.select(['Datetime', f'SMA_{timeframe}_{window}'])
+def calc_pl(df, params):
+    return df.select(['Datetime', calc_expr(params)])
 """
 }
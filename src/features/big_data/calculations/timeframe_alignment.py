@@ -0,0 +1,63 @@
+import threading
+from typing import Dict, Tuple
+
+import polars as pl
+
+AlignmentKey = Tuple[str, str, int, int]  # (source timeframe, target timeframe, source rows, target rows)
+
+
+class TimeframeAlignment:
+    """
+    Caches, for one ticker during one backtest run, the row mapping between two of its timeframes:
+    for every row of the target timeframe, the row of the last source bar that opened at or before it
+    (the backward as-of match on Datetime). Cross-timeframe lookups then gather on that index
+    instead of repeating a join_asof on every condition evaluation.
+    """
+    def __init__(self):
+        self._indexes: Dict[AlignmentKey, pl.Series] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_index(self, dfs: Dict[str, pl.DataFrame], source_timeframe: str, target_timeframe: str) -> pl.Series:
+        source_df, target_df = dfs[source_timeframe], dfs[target_timeframe]
+        key = (source_timeframe, target_timeframe, source_df.height, target_df.height)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                self.hits += 1
+                return index
+            self.misses += 1
+
+        index = compute_alignment_index(source_df, target_df)
+        with self._lock:
+            return self._indexes.setdefault(key, index)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"entries": len(self._indexes), "hits": self.hits, "misses": self.misses}
+
+
+def compute_alignment_index(source_df: pl.DataFrame, target_df: pl.DataFrame) -> pl.Series:
+    """Source row of every target row, null before the first source bar. Both frames are sorted by Datetime."""
+    rows = source_df['Datetime'].search_sorted(target_df['Datetime'], side='right').cast(pl.Int64) - 1
+    return pl.select(pl.when(rows >= 0).then(rows).cast(pl.UInt32)).to_series().alias('source_row')
+
+
+def align_timeframe(dfs: Dict[str, pl.DataFrame], frame: pl.DataFrame, source_timeframe: str, target_timeframe: str) -> pl.DataFrame:
+    """
+    Returns the columns of frame, which is row-aligned with dfs[source_timeframe] (the frame itself or a calculation on it),
+    gathered onto the rows of dfs[target_timeframe], as a backward join_asof on Datetime would match them.
+    The row mapping comes from the frames' timeframe alignment when they carry one; a frame that is not
+    row-aligned with its timeframe falls back to the join.
+    """
+    source_df, target_df = dfs[source_timeframe], dfs[target_timeframe]
+    value_columns = [column for column in frame.columns if column != 'Datetime']
+    if frame.height != source_df.height:
+        return target_df.select('Datetime').join_asof(frame, on='Datetime', strategy='backward').select(value_columns)
+
+    timeframe_alignment = getattr(dfs, 'timeframe_alignment', None)
+    if timeframe_alignment is None:
+        index = compute_alignment_index(source_df, target_df)
+    else:
+        index = timeframe_alignment.get_index(dfs, source_timeframe, target_timeframe)
+    return frame.select(pl.col(value_columns).gather(index))
@@ -14,7 +14,11 @@ class CandlesApi(BaseApi[CandlesOrch, CandleModel]):
         # Initialize the BaseApi with the enabled routes and dependencies (if any)
         super().__init__(CandlesOrch(), enabled_routes=enabled_routes, dependencies=dependencies)
         self.router.post("/get_candles_by_ticker_from_to", dependencies=dependencies)(self.get_candles_by_ticker_from_to) #type:ignore
+        self.router.get("/cache_stats", dependencies=dependencies)(self.get_cache_stats) #type:ignore
 
 
     async def get_candles_by_ticker_from_to(self, request: GetCandlesByTickerFromToRequest):
         return self.orch.get_candles_by_ticker_from_to(request.stock_name,request.from_date, request.to_date, request.timeframe, return_type="dicts")
+
+    async def get_cache_stats(self):
+        return self.orch.get_cache_stats()
@@ -1,26 +1,41 @@
-from datetime import date, datetime, timedelta
-from typing import Any, Dict, List
-from bson import ObjectId
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, time, timedelta, timezone
+from time import perf_counter
+from typing import Any, Dict, List, Optional
 
 from common.base.base_mongo_bl import BaseMongoBl
 
 import polars as pl
 
+from common.types import TimeFrameDataFrames
+from common.utils.rate_limiter import RateLimiter
+from server.src.common.config import CANDLES_SYNC_MAX_WORKERS, CANDLES_SYNC_REQUESTS_PER_SECOND, CANDLES_SYNC_WRITE_BATCH_SIZE
 from server.src.common.services.models.candles_model import CandleModel
 from common.third_party_api.stock_data_downloader import StockDataDownloader
 from common.third_party_api.yahoo_finance_api import YahooFinanceApi
-from features.big_data.candles.candles_dal import CandlesDal
+from features.big_data.candles.candles_dal import CANDLES_DF_SCHEMA, CandlesDal
+from features.big_data.candles.candles_disk_cache import CandlesDiskCache
+from features.big_data.candles.candles_resampler import CandlesResampler
+from features.big_data.candles.candles_watermarks_dal import CandlesWatermarksDal
 from features.stocks.stocks_bl import StocksBl
 from server.src.common.services.models.stock_model import StockModel
 
 
+logger = logging.getLogger(__name__)
+
 # List of all timeframes supported by yfinance
 yfinance_timeframes = YahooFinanceApi.yfinance_timeframes
+daily_timeframes = ['1d', '5d', '1wk', '1mo', '3mo']  # Bars labeled by exchange date, not by time
 
 class CandlesBl(BaseMongoBl[CandlesDal, CandleModel]):
     def __init__(self):
         super().__init__(CandlesDal)
         self.api = StockDataDownloader(YahooFinanceApi())  # Api instance for fetching stock data
+        self.disk_cache = CandlesDiskCache()  # Local Arrow cache consulted before MongoDB
+        self.watermarks_dal = CandlesWatermarksDal()
+        self.resampler = CandlesResampler()
+        self.rate_limiter = RateLimiter(CANDLES_SYNC_REQUESTS_PER_SECOND, burst=max(1, CANDLES_SYNC_MAX_WORKERS))  # Shared by every sync download
         
     def _to_df(self,candles:List[CandleModel],timeframe:str)->pl.DataFrame:
         candles_df = []
@@ -37,103 +52,187 @@ class CandlesBl(BaseMongoBl[CandlesDal, CandleModel]):
             candles_df.append(candle)
         return pl.DataFrame(candles_df)
 
-    def sync_candles_for_all_timeframes(self,stocks:List[StockModel]):
+    def sync_candles_for_all_timeframes(self,stocks:List[StockModel]) -> Dict[str, Any]:
         """
         Sync candles for all supported timeframes for all stocks.
+        Timeframes resampled from stored ones are not downloaded.
         """
-        # Loop over all supported timeframes
-        print("Starting sync for all timeframes...")
-        for timeframe in yfinance_timeframes:
-            print(f"Syncing candles for timeframe: {timeframe}")
-            self.sync_candles_for_all_stock(stocks,timeframe)
+        logger.debug("Starting sync for all timeframes")
+        return self._sync_candles(stocks, self.resampler.get_synced_timeframes(yfinance_timeframes))
 
-    def sync_candles_for_all_stock(self,stocks:List[StockModel], timeframe: str = '1d'):
+    def sync_candles_for_all_stock(self,stocks:List[StockModel], timeframe: str = '1d') -> Dict[str, Any]:
         """
         Sync candles for all stocks by their tickers for a given timeframe.
-        Fetches the last 2 years of candle data, avoiding duplicates.
+        Fetches the candles after each stock's sync watermark, or the provider's whole window on a first sync.
         """
-        print(f"Syncing {len(stocks)} stocks for timeframe {timeframe}")
-        for stock in stocks:
-            print(f"Syncing {stock.ticker}...")
-            self.sync_candles(str(stock.id), stock.ticker, timeframe)
+        logger.debug("Syncing %d stocks for timeframe %s", len(stocks), timeframe)
+        return self._sync_candles(stocks, [timeframe])
 
     def sync_candles(self, stock_id: str, ticker: str, timeframe: str):
         """
         Sync candlestick data for a stock based on timeframe.
-        Prevent duplicates by checking for existing candles in bulk.
+        Only candles from the stock's sync watermark on are downloaded.
+        """
+        watermark = self.watermarks_dal.get_watermarks([ticker], [timeframe.lower()]).get((ticker, timeframe.lower()))
+        candles_df = self._download_candles(stock_id, ticker, timeframe, watermark)
+        inserted = self._write_candles([candles_df])
+        logger.debug("Inserted %d new candles for stock: %s, timeframe: %s", inserted, ticker, timeframe)
+
+    def _sync_candles(self, stocks: List[StockModel], timeframes: List[str]) -> Dict[str, Any]:
+        """
+        Pipelined sync of every stock x timeframe: a thread pool downloads the candles after each pair's
+        sync watermark concurrently, throttled by the provider rate limiter, while finished downloads are
+        written in batches of CANDLES_SYNC_WRITE_BATCH_SIZE candles. A failed download is reported and skipped,
+        and its watermark stays put. Returns the sync's counts and throughput.
         """
-        end_date = datetime.now()
+        tasks = [(stock, timeframe) for timeframe in timeframes for stock in stocks]
+        watermarks = self.watermarks_dal.get_watermarks([stock.ticker for stock in stocks], [timeframe.lower() for timeframe in timeframes])
+        start_time = perf_counter()
+        downloaded = inserted = failed = pending_candles = 0
+        pending: List[pl.DataFrame] = []
+
+        with ThreadPoolExecutor(max_workers=max(1, CANDLES_SYNC_MAX_WORKERS), thread_name_prefix="candles-sync") as pool:
+            futures = {
+                pool.submit(self._download_candles, str(stock.id), stock.ticker, timeframe, watermarks.get((stock.ticker, timeframe.lower()))): (stock.ticker, timeframe)
+                for stock, timeframe in tasks
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                ticker, timeframe = futures[future]
+                try:
+                    candles_df = future.result()
+                except Exception as e:
+                    failed += 1
+                    logger.warning("Failed to download candles for stock: %s, timeframe: %s: %s", ticker, timeframe, e)
+                    continue
+
+                downloaded += candles_df.height
+                pending.append(candles_df)
+                pending_candles += candles_df.height
+                if pending_candles >= CANDLES_SYNC_WRITE_BATCH_SIZE:
+                    inserted += self._write_candles(pending)
+                    pending, pending_candles = [], 0
+                    elapsed = perf_counter() - start_time
+                    logger.debug("Synced %d/%d downloads, %d new candles, %.1f downloads/s, %.0f candles/s",
+                                 done, len(tasks), inserted, done / elapsed, downloaded / elapsed)
+
+        if pending:
+            inserted += self._write_candles(pending)
+        elapsed = perf_counter() - start_time
+        logger.info("Sync finished in %.1f seconds: %d/%d downloads, %d candles, %d new", elapsed, len(tasks) - failed, len(tasks), downloaded, inserted)
+        return {"downloads": len(tasks), "failed": failed, "downloaded_candles": downloaded, "inserted_candles": inserted, "seconds": elapsed}
+
+    def _download_candles(self, stock_id: str, ticker: str, timeframe: str, watermark: Optional[datetime] = None) -> pl.DataFrame:
+        """
+        Downloads a stock's candles of a timeframe as a CANDLES_SYNC_DF_SCHEMA frame, validated as a whole:
+        OHLCV columns are cast strictly and rows with missing values are dropped.
+        """
+        end_date = datetime.now(timezone.utc)
         
         # Set appropriate start date based on timeframe
-        if timeframe in ['1d', '5d', '1wk', '1mo', '3mo']:
+        if timeframe in daily_timeframes:
             start_date = end_date - timedelta(days=720)  # 2 years
         elif timeframe in ['90m', '60m', '30m', '15m', '5m']:
             start_date = end_date - timedelta(days=59)  # 60 days
         else:
             start_date = end_date - timedelta(days=6)  # 7 days
+        # Only candles from the last synced one on, within what the provider serves for the timeframe
+        if watermark is not None:
+            start_date = max(start_date, watermark.replace(tzinfo=timezone.utc))
         
         # Fetch candles from Api
+        self.rate_limiter.acquire()
         stock_data = self.api.download_data(ticker, start_date, end_date, timeframe)
 
-        # Prepare the documents for insertion into MongoDB
-        docs:List[Dict[str, Any]] = []
-        datetimes_to_check = []
-        for row in stock_data.iter_rows(named=True):
-            curr_date = row["Date"] if row.get("Date") is not None else row.get("Datetime")
-            # Prepare the document to be inserted
-            candle_doc = {
-                "stock_id": ObjectId(stock_id),
-                "stock_name": ticker,
-                "datetime": curr_date,
-                "date": curr_date,
-                "open": float(row["Open"]),
-                "high": float(row["High"]),
-                "low": float(row["Low"]),
-                "close": float(row["Close"]),
-                "volume": float(row["Volume"]),
-                "timeframe": timeframe.lower()
-            }
-            docs.append(candle_doc)
-            datetimes_to_check.append(curr_date)
-
-        # Query the database for existing candles in bulk (by datetime and timeframe)
-        existing_candles = self.dal.find({
-            "stock_id": ObjectId(stock_id),
-            "datetime": {"$in": datetimes_to_check},
-            "timeframe": timeframe.lower()
-        })
-
-        # Create a set of tuples for existing records to check against
-        existing_records = {(candle.datetime, candle.timeframe) for candle in existing_candles}
-
-        # Filter out existing records by their unique combination of fields
-        new_docs = [
-            doc for doc in docs
-            if (doc["datetime"], doc["timeframe"]) not in existing_records
-        ]
-
-        # Insert the new candles into the database
-        if new_docs:
-            print(f"Inserting {len(new_docs)} new candles for stock: {ticker}, timeframe: {timeframe}")
-            self.dal.insert_many(new_docs)
-        else:
-            print(f"No new candles to insert for stock: {ticker}, timeframe: {timeframe}")
+        datetime_column = "Date" if "Date" in stock_data.columns else "Datetime"
+        candle_datetime = pl.col(datetime_column)
+        # MongoDB stores naive datetimes: intraday bars in UTC, daily and longer ones at midnight of their exchange date
+        if getattr(stock_data.schema[datetime_column], "time_zone", None) is not None:
+            if timeframe.lower() not in daily_timeframes:
+                candle_datetime = candle_datetime.dt.convert_time_zone("UTC")
+            candle_datetime = candle_datetime.dt.replace_time_zone(None)
+        candles_df = stock_data.select(candle_datetime.alias("Datetime"), *[column for column in CANDLES_DF_SCHEMA if column != "Datetime"]).cast(CANDLES_DF_SCHEMA)
+        complete_df = candles_df.drop_nulls()
+        if complete_df.height < candles_df.height:
+            logger.warning("Dropped %d incomplete candles for stock: %s, timeframe: %s", candles_df.height - complete_df.height, ticker, timeframe)
+
+        return complete_df.select(
+            pl.lit(stock_id).alias("stock_id"),
+            pl.lit(ticker).alias("stock_name"),
+            pl.lit(timeframe.lower()).alias("timeframe"),
+            *CANDLES_DF_SCHEMA.keys(),
+        )
+
+    def _write_candles(self, downloads: List[pl.DataFrame]) -> int:
+        """
+        Upserts the candles of several downloads, adds the inserted ones to the disk cache and then moves each
+        (ticker, timeframe) watermark to its latest downloaded candle. Returns the number of inserted candles.
+        """
+        candles_df = pl.concat(downloads)
+        if candles_df.is_empty():
+            return 0
+        new_df = candles_df[self.dal.upsert_candles_df(candles_df)]
+        for (ticker, timeframe), pair_df in new_df.partition_by(["stock_name", "timeframe"], as_dict=True).items():
+            self.disk_cache.append(ticker, timeframe, pair_df.select(CANDLES_DF_SCHEMA.keys()))
+
+        # Written only after the candles, so a failed write is downloaded again by the next sync
+        latest_df = candles_df.group_by(["stock_name", "timeframe"]).agg(pl.col("Datetime").max())
+        watermarks = {(ticker, timeframe): last_datetime for ticker, timeframe, last_datetime in latest_df.iter_rows()}
+        self.watermarks_dal.set_watermarks(watermarks, datetime.now(timezone.utc).replace(tzinfo=None))
+        return new_df.height
 
 
     def get_candles_df_by_stock_from_to(self, ticker: str,start_date: date,end_date: date, timeframe: str):
-        candles = self.dal.get_candles_by_stock(ticker,start_date,end_date, timeframe)
-        candles_df = []
-        for candle in candles:
-            candle = {
-                "Datetime": candle.datetime,
-                "Open": candle.open,
-                "High": candle.high,
-                "Low": candle.low,
-                "Close": candle.close,
-                "Volume": candle.volume,
-                "timeframe": timeframe
-                }
-            candles_df.append(candle)
-        return pl.DataFrame(candles_df)
-    
+        start, end = datetime.combine(start_date, time.min), datetime.combine(end_date, time.min)
+        candles_df = self.disk_cache.get(ticker, timeframe, start, end)
+        if candles_df is None:
+            # Load whole months so the written partitions are complete
+            load_start, load_end = self.disk_cache.get_months_load_range(start_date, end_date)
+            months_df = self.dal.get_candles_df_by_stock(ticker, load_start, load_end, timeframe)
+            self.disk_cache.put(ticker, timeframe, self.disk_cache.get_months(start_date, end_date), months_df)
+            candles_df = months_df.filter(pl.col("Datetime").is_between(start, end))
+        return candles_df.with_columns(pl.lit(timeframe).alias("timeframe"))
+
+    def get_candles_dfs_by_stocks_from_to(self, tickers: List[str], start_date: date, end_date: date, timeframes: List[str]) -> Dict[str, TimeFrameDataFrames]:
+        """
+        Loads all tickers x timeframes, serving cached pairs from the disk cache and the rest with one query,
+        and partitions the result per ticker and timeframe.
+        Every requested (ticker, timeframe) pair is present in the result, empty when no candles exist.
+        """
+        start, end = datetime.combine(start_date, time.min), datetime.combine(end_date, time.min)
+        dfs_by_ticker: Dict[str, TimeFrameDataFrames] = {ticker: {} for ticker in tickers}
+        missing_pairs = []
+        for ticker in tickers:
+            for timeframe in timeframes:
+                cached_df = self.disk_cache.get(ticker, timeframe, start, end)
+                if cached_df is None:
+                    missing_pairs.append((ticker, timeframe))
+                else:
+                    dfs_by_ticker[ticker][timeframe] = cached_df.with_columns(pl.lit(timeframe).alias("timeframe"))
+
+        if missing_pairs:
+            missing_tickers = list(dict.fromkeys(ticker for ticker, _ in missing_pairs))
+            missing_timeframes = list(dict.fromkeys(timeframe for _, timeframe in missing_pairs))
+            load_start, load_end = self.disk_cache.get_months_load_range(start_date, end_date)
+            candles_df = self.dal.get_candles_df_by_stocks(missing_tickers, load_start, load_end, missing_timeframes)
+            partitions = candles_df.partition_by(["stock_name", "timeframe"], as_dict=True, include_key=False)
+
+            months = self.disk_cache.get_months(start_date, end_date)
+            for ticker, timeframe in missing_pairs:
+                months_df = partitions.get((ticker, timeframe), pl.DataFrame(schema=CANDLES_DF_SCHEMA))
+                self.disk_cache.put(ticker, timeframe, months, months_df)
+                df = months_df.filter(pl.col("Datetime").is_between(start, end))
+                dfs_by_ticker[ticker][timeframe] = df.with_columns(pl.lit(timeframe).alias("timeframe"))
+        return dfs_by_ticker
+
+    def delete_candles_by_stock(self, ticker: str, timeframe: str):
+        """
+        Deletes all candles of a stock for a timeframe, drops its cached partitions and its sync watermark,
+        so the next sync downloads the provider's whole window again.
+        """
+        result = self.dal.delete_candles_by_stock(ticker, timeframe)
+        self.watermarks_dal.delete_watermark(ticker, timeframe)
+        self.disk_cache.invalidate(ticker, timeframe)
+        return result
 
+    def get_cache_stats(self) -> Dict[str, Any]:
+        return {"disk": self.disk_cache.get_stats()}
@@ -1,43 +1,183 @@
 from datetime import date, datetime
+from itertools import islice
+from typing import Any, Dict, List, Optional
 from common.base.base_mongo_dal import BaseMongoDal
 
-
-from pymongo import ASCENDING
+import polars as pl
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
 
 from server.src.common.services.models.candles_model import CandleModel
 from server.src.common.utils.singleton import singleton
 
 COLLECTION_NAME = "candles"
+LEGACY_UNIQUE_INDEX = "stockName_1_datetime_1_timeframe_1"  # Its range on datetime came before the timeframe equality
+DUPLICATE_KEY_ERROR = 11000
+
+# Stored field -> DataFrame column, in the order the columns are returned
+CANDLES_DF_COLUMNS = {
+    "datetime": "Datetime",
+    "open": "Open",
+    "high": "High",
+    "low": "Low",
+    "close": "Close",
+    "volume": "Volume",
+}
+CANDLES_DF_SCHEMA = {
+    "Datetime": pl.Datetime("us"),
+    "Open": pl.Float64,
+    "High": pl.Float64,
+    "Low": pl.Float64,
+    "Close": pl.Float64,
+    "Volume": pl.Float64,
+}
+CANDLES_PROJECTION = {"_id": 0, **{field: 1 for field in CANDLES_DF_COLUMNS}}
+
+# Extra columns returned by the multi-stock read so rows can be partitioned per stock and timeframe
+CANDLES_BULK_DF_COLUMNS = {"stockName": "stock_name", "timeframe": "timeframe", **CANDLES_DF_COLUMNS}
+CANDLES_BULK_DF_SCHEMA = {"stock_name": pl.String, "timeframe": pl.String, **CANDLES_DF_SCHEMA}
+CANDLES_BULK_PROJECTION = {"_id": 0, **{field: 1 for field in CANDLES_BULK_DF_COLUMNS}}
+
+# Downloaded candles of several stocks and timeframes, as the sync writes them
+CANDLES_SYNC_DF_SCHEMA = {"stock_id": pl.String, "stock_name": pl.String, "timeframe": pl.String, **CANDLES_DF_SCHEMA}
+
+def get_candle_upserts(df: pl.DataFrame) -> List[UpdateOne]:
+    """
+    `$setOnInsert` upserts of the candles of a CANDLES_SYNC_DF_SCHEMA frame, keyed by the unique
+    (stockName, datetime, timeframe) index, with the documents built column by column.
+    """
+    stock_ids = {stock_id: ObjectId(stock_id) for stock_id in df["stock_id"].unique().to_list()}
+    return [
+        UpdateOne(
+            {"stockName": stock_name, "datetime": candle_datetime, "timeframe": timeframe},
+            {"$setOnInsert": {
+                "stockId": stock_ids[stock_id], "stockName": stock_name, "datetime": candle_datetime, "date": candle_datetime,
+                "open": open_, "high": high, "low": low, "close": close, "volume": volume, "timeframe": timeframe,
+            }},
+            upsert=True,
+        )
+        for stock_id, stock_name, timeframe, candle_datetime, open_, high, low, close, volume
+        in zip(*(df[column].to_list() for column in CANDLES_SYNC_DF_SCHEMA))
+    ]
+
 
 @singleton
 class CandlesDal(BaseMongoDal[CandleModel]):
     def __init__(self):
         super().__init__(collection_name=COLLECTION_NAME, data_class=CandleModel)
-        self.collection.create_index([("stockName", ASCENDING), ("datetime", ASCENDING), ("timeframe", ASCENDING)], unique=True)
+        # Equality fields before the datetime range (ESR), so range reads, latest-candle lookups and deletes of
+        # one stock and timeframe are single index ranges; it is also the unique key of the sync's upserts
+        self.collection.create_index([("stockName", ASCENDING), ("timeframe", ASCENDING), ("datetime", ASCENDING)], unique=True)
+        if LEGACY_UNIQUE_INDEX in self.collection.index_information():
+            self.collection.drop_index(LEGACY_UNIQUE_INDEX)
 
     def get_candles_by_stock(self, stock_name: str, start_date: date, end_date: date, timeframe: str) -> list[CandleModel]:
         """
         Retrieves candles for a specific stock by stockId, timeframe, and date range.
         Returns a list of Candle objects.
         """
-        query = {
+        query = self._get_candles_query(stock_name, start_date, end_date, timeframe)
+        return self.find(query)
+
+    def get_candles_df_by_stock(self, stock_name: str, start_date: date, end_date: date, timeframe: str, batch_size: int = 50_000) -> pl.DataFrame:
+        """
+        Retrieves candles for a specific stock, timeframe, and date range as a typed polars DataFrame.
+        Reads the raw cursor with a projection and builds the frame column by column in batches,
+        so no CandleModel or per-candle dict is created. Rows are sorted by datetime.
+        """
+        query = self._get_candles_query(stock_name, start_date, end_date, timeframe)
+        cursor = self.collection.find(query, CANDLES_PROJECTION, batch_size=batch_size).sort("datetime", ASCENDING)
+        return self._cursor_to_df(cursor, CANDLES_DF_COLUMNS, CANDLES_DF_SCHEMA, batch_size)
+
+    def get_candles_df_by_stocks(self, stock_names: List[str], start_date: date, end_date: date, timeframes: List[str], batch_size: int = 50_000) -> pl.DataFrame:
+        """
+        Retrieves candles for several stocks and timeframes in a single `$in` query.
+        Returns one long DataFrame with 'stock_name' and 'timeframe' columns,
+        sorted by stock_name, timeframe and Datetime.
+        """
+        query = self._get_candles_bulk_query(stock_names, start_date, end_date, timeframes)
+        cursor = self.collection.find(query, CANDLES_BULK_PROJECTION, batch_size=batch_size)
+        df = self._cursor_to_df(cursor, CANDLES_BULK_DF_COLUMNS, CANDLES_BULK_DF_SCHEMA, batch_size)
+        # Sorting in polars avoids an in-memory sort on the server for large results
+        return df.sort(["stock_name", "timeframe", "Datetime"])
+
+    def _cursor_to_df(self, cursor, columns: Dict[str, str], schema: Dict[str, Any], batch_size: int) -> pl.DataFrame:
+        """
+        Builds a DataFrame from a projected cursor, `batch_size` documents at a time.
+        `columns` maps the stored field to its DataFrame column.
+        """
+        batches = []
+        while True:
+            docs = list(islice(cursor, batch_size))
+            if not docs:
+                break
+            batches.append(pl.DataFrame(
+                {column: [doc[field] for doc in docs] for field, column in columns.items()},
+                schema=schema,
+            ))
+
+        if not batches:
+            return pl.DataFrame(schema=schema)
+        return pl.concat(batches, rechunk=True)
+
+    def _get_candles_query(self, stock_name: str, start_date: date, end_date: date, timeframe: str) -> Dict[str, Any]:
+        return {
             "stockName": stock_name,
             "timeframe": timeframe,
-            "datetime": {"$gte": datetime.strptime(start_date.strftime('%Y-%m-%d'), '%Y-%m-%d'), "$lte": datetime.strptime(end_date.strftime('%Y-%m-%d'), '%Y-%m-%d')}
+            "datetime": self._get_datetime_range(start_date, end_date)
         }
-        return self.find(query)
 
-    def get_latest_candle(self, stock_id: str, timeframe: str):
+    def _get_candles_bulk_query(self, stock_names: List[str], start_date: date, end_date: date, timeframes: List[str]) -> Dict[str, Any]:
+        return {
+            "stockName": {"$in": stock_names},
+            "timeframe": {"$in": timeframes},
+            "datetime": self._get_datetime_range(start_date, end_date)
+        }
+
+    def _get_stock_timeframe_query(self, stock_name: str, timeframe: str) -> Dict[str, Any]:
+        return {"stockName": stock_name, "timeframe": timeframe}
+
+    def _get_datetime_range(self, start_date: date, end_date: date) -> Dict[str, datetime]:
+        return {"$gte": datetime.strptime(start_date.strftime('%Y-%m-%d'), '%Y-%m-%d'), "$lte": datetime.strptime(end_date.strftime('%Y-%m-%d'), '%Y-%m-%d')}
+
+    def upsert_candles_df(self, df: pl.DataFrame, chunk_size: int = 10_000) -> List[int]:
+        """
+        Inserts the candles of a CANDLES_SYNC_DF_SCHEMA frame that are not stored yet, as unordered bulks of
+        `$setOnInsert` upserts on the unique (stockName, datetime, timeframe) index, chunk_size candles each;
+        stored candles are left untouched. Documents are built column by column from the frame, whose strict
+        cast to the schema replaces validating every candle with CandleModel.
+        Returns the rows of the inserted candles.
+        """
+        df = df.select(list(CANDLES_SYNC_DF_SCHEMA)).cast(CANDLES_SYNC_DF_SCHEMA)
+        inserted_rows: List[int] = []
+        for offset in range(0, df.height, chunk_size):
+            operations = get_candle_upserts(df.slice(offset, chunk_size))
+            inserted_rows.extend(offset + index for index in self._bulk_upsert(operations))
+        return inserted_rows
+
+    def _bulk_upsert(self, operations: List[UpdateOne]) -> List[int]:
+        """Runs the upserts unordered and returns the positions of the inserted documents."""
+        try:
+            result = self.collection.bulk_write(operations, ordered=False)
+            return sorted(result.upserted_ids)
+        except BulkWriteError as bwe:
+            # Two writers upserting the same new candle race on the unique index; the loser's candle is stored anyway
+            if any(error["code"] != DUPLICATE_KEY_ERROR for error in bwe.details["writeErrors"]):
+                print(f"Bulk write error: {bwe.details}")
+                raise
+            return sorted(upserted["index"] for upserted in bwe.details["upserted"])
+
+    def get_latest_candle(self, stock_name: str, timeframe: str) -> Optional[CandleModel]:
         """
-        Retrieves the most recent candle for a stock in a specific timeframe.
-        Returns a Candle object.
+        Retrieves the most recent candle for a stock in a specific timeframe, or None if it has none.
         """
-        query = {"stockId": stock_id, "timeframe": timeframe}
-        return self.find(query)  # Sort by date descending
+        document = self.collection.find_one(self._get_stock_timeframe_query(stock_name, timeframe), sort=[("datetime", DESCENDING)])
+        return None if document is None else self.data_class(**document)
 
-    def delete_candles_by_stock(self, stock_id: str, timeframe: str):
+    def delete_candles_by_stock(self, stock_name: str, timeframe: str):
         """
         Deletes all candles for a specific stock and timeframe.
         Returns the number of deleted documents.
         """
-        return self.delete_many({"stockId": stock_id, "timeframe": timeframe})
+        return self.delete_many(self._get_stock_timeframe_query(stock_name, timeframe))
@@ -0,0 +1,136 @@
+import os
+import shutil
+import threading
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+import polars as pl
+
+from server.src.common.config import CANDLES_CACHE_DIR, CANDLES_CACHE_ENABLED
+from server.src.common.utils.singleton import singleton
+
+
+@singleton
+class CandlesDiskCache:
+    """
+    Local Arrow IPC cache of candles, partitioned as <root>/<ticker>/<timeframe>/<YYYY-MM>.arrow.
+    Partitions are written uncompressed so they can be memory-mapped straight into polars.
+    A month partition is only written from a full-month load, so an existing partition is complete.
+    """
+    def __init__(self, root_dir: str = CANDLES_CACHE_DIR, enabled: bool = CANDLES_CACHE_ENABLED):
+        self.root_dir = root_dir
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, ticker: str, timeframe: str, start: datetime, end: datetime) -> Optional[pl.DataFrame]:
+        """
+        Returns the cached candles between start and end (inclusive), or None when any month is missing.
+        """
+        if not self.enabled:
+            return None
+
+        paths = [self._get_partition_path(ticker, timeframe, month) for month in self.get_months(start, end)]
+        if not all(os.path.exists(path) for path in paths):
+            self._count(hit=False)
+            return None
+
+        frames = [pl.read_ipc(path, memory_map=True) for path in paths]
+        self._count(hit=True)
+        return pl.concat(frames, rechunk=False).filter(pl.col("Datetime").is_between(start, end))
+
+    def put(self, ticker: str, timeframe: str, months: List[Tuple[int, int]], df: pl.DataFrame):
+        """
+        Writes one partition per month in `months`, including empty ones.
+        `df` must hold every candle of those months; rows outside them are ignored.
+        """
+        if not self.enabled:
+            return
+
+        partitions = self._split_by_month(df)
+        with self._lock:
+            for month in months:
+                month_df = partitions.get(month, df.clear())
+                self._write_partition(self._get_partition_path(ticker, timeframe, month), month_df)
+
+    def append(self, ticker: str, timeframe: str, df: pl.DataFrame):
+        """
+        Merges newly inserted candles into the month partitions that are already cached.
+        Months that are not cached stay uncached, since their older candles are unknown here.
+        """
+        if not self.enabled or df.is_empty():
+            return
+
+        with self._lock:
+            for month, month_df in self._split_by_month(df).items():
+                path = self._get_partition_path(ticker, timeframe, month)
+                if not os.path.exists(path):
+                    continue
+                cached_df = pl.read_ipc(path, memory_map=False)
+                merged_df = (
+                    pl.concat([cached_df, month_df.select(cached_df.columns).cast(cached_df.schema)])
+                    .unique(subset="Datetime", keep="last")
+                    .sort("Datetime")
+                )
+                self._write_partition(path, merged_df)
+
+    def invalidate(self, ticker: str, timeframe: Optional[str] = None):
+        """
+        Drops the cached partitions of a ticker, for one timeframe or for all of them.
+        """
+        path = os.path.join(self.root_dir, ticker) if timeframe is None else os.path.join(self.root_dir, ticker, timeframe)
+        with self._lock:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def get_stats(self) -> Dict[str, int | float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+    @staticmethod
+    def get_months(start: date, end: date) -> List[Tuple[int, int]]:
+        """Returns the (year, month) pairs touched by the range, in order."""
+        months = []
+        year, month = start.year, start.month
+        while (year, month) <= (end.year, end.month):
+            months.append((year, month))
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return months
+
+    @staticmethod
+    def get_months_load_range(start: date, end: date) -> Tuple[date, date]:
+        """Returns the dates to load from the database so that every touched month is complete."""
+        year, month = (end.year + 1, 1) if end.month == 12 else (end.year, end.month + 1)
+        return date(start.year, start.month, 1), date(year, month, 1)
+
+    def _get_partition_path(self, ticker: str, timeframe: str, month: Tuple[int, int]) -> str:
+        year, month_number = month
+        return os.path.join(self.root_dir, ticker, timeframe, f"{year:04d}-{month_number:02d}.arrow")
+
+    def _split_by_month(self, df: pl.DataFrame) -> Dict[Tuple[int, int], pl.DataFrame]:
+        keyed_df = df.with_columns(
+            pl.col("Datetime").dt.year().alias("_year"),
+            pl.col("Datetime").dt.month().alias("_month"),
+        )
+        return {
+            (int(year), int(month)): month_df
+            for (year, month), month_df in keyed_df.partition_by(["_year", "_month"], as_dict=True, include_key=False).items()
+        }
+
+    def _write_partition(self, path: str, df: pl.DataFrame):
+        # Write to a temporary file first so readers never map a half-written partition
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        df.write_ipc(tmp_path, compression="uncompressed")
+        os.replace(tmp_path, path)
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
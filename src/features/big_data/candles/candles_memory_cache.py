@@ -0,0 +1,105 @@
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, time
+from typing import Any, Dict, Optional, Tuple
+
+import polars as pl
+
+from server.src.common.config import CANDLES_MEMORY_CACHE_MAX_MB
+from server.src.common.utils.singleton import singleton
+
+CacheKey = Tuple[str, str, date, date]  # (ticker, timeframe, start_date, end_date)
+
+
+@singleton
+class CandlesMemoryCache:
+    """
+    Bounded, byte-size-aware LRU cache of candle DataFrames keyed by (ticker, timeframe, range).
+    A request for a sub-range of a cached range is served by a zero-copy slice of the cached frame.
+    """
+    def __init__(self, max_bytes: int = CANDLES_MEMORY_CACHE_MAX_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[CacheKey, pl.DataFrame] = OrderedDict()
+        self._sizes: Dict[CacheKey, int] = {}
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self.rejected = 0
+
+    def get(self, ticker: str, timeframe: str, start_date: date, end_date: date) -> Optional[pl.DataFrame]:
+        """
+        Returns the candles of the range from any cached range that covers it, or None.
+        """
+        with self._lock:
+            for key, df in self._entries.items():
+                key_ticker, key_timeframe, key_start, key_end = key
+                if key_ticker == ticker and key_timeframe == timeframe and key_start <= start_date and end_date <= key_end:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    if (key_start, key_end) == (start_date, end_date):
+                        return df
+                    return self._slice(df, start_date, end_date)
+            self.misses += 1
+            return None
+
+    def put(self, ticker: str, timeframe: str, start_date: date, end_date: date, df: pl.DataFrame):
+        """
+        Caches a frame and evicts least recently used frames until the cache fits in max_bytes.
+        Cached ranges of the same ticker and timeframe that the new range covers are dropped.
+        """
+        size = df.estimated_size()
+        with self._lock:
+            if size > self.max_bytes:
+                self.rejected += 1
+                return
+
+            covered_keys = [
+                key for key in self._entries
+                if key[:2] == (ticker, timeframe) and start_date <= key[2] and key[3] <= end_date
+            ]
+            for key in covered_keys:
+                self._remove(key)
+
+            key = (ticker, timeframe, start_date, end_date)
+            self._entries[key] = df
+            self._sizes[key] = size
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                evicted_key = next(iter(self._entries))
+                self.evicted_bytes += self._sizes[evicted_key]
+                self.evictions += 1
+                self._remove(evicted_key)
+
+    def invalidate(self, ticker: str, timeframe: Optional[str] = None):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == ticker and (timeframe is None or key[1] == timeframe)]:
+                self._remove(key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "current_bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "evicted_bytes": self.evicted_bytes,
+            "rejected": self.rejected,
+        }
+
+    def _slice(self, df: pl.DataFrame, start_date: date, end_date: date) -> pl.DataFrame:
+        # Candles are sorted by Datetime, so the range maps to one contiguous slice
+        datetimes = df["Datetime"]
+        start_index = datetimes.search_sorted(datetime.combine(start_date, time.min), side="left")
+        end_index = datetimes.search_sorted(datetime.combine(end_date, time.min), side="right")
+        return df.slice(start_index, end_index - start_index)
+
+    def _remove(self, key: CacheKey):
+        del self._entries[key]
+        self.current_bytes -= self._sizes.pop(key)
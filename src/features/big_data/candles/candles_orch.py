@@ -1,9 +1,12 @@
 from typing import Any, Dict, List, Literal, Union, overload
 from features.big_data.candles.candles_bl import CandlesBl
+from features.big_data.candles.candles_memory_cache import CandlesMemoryCache
+from features.big_data.candles.candles_resampler import CandlesResampler
 import polars as pl
-from datetime import datetime
+from datetime import date, datetime
 
 from common.base.base_orch import BaseOrch
+from common.types import TimeFrameDataFrames
 from server.src.common.services.models.candles_model import CandleModel
 from server.src.common.services.models.stock_model import StockModel
 from server.src.features.stocks.stocks_orch import StocksOrch
@@ -13,6 +16,8 @@ class CandlesOrch(BaseOrch[CandlesBl, CandleModel]):
     def __init__(self):
         self.bl = CandlesBl()
         self.stocks_orch = StocksOrch()
+        self.memory_cache = CandlesMemoryCache()  # Shared by every CandlesOrch instance
+        self.resampler = CandlesResampler()
         
         
     @overload
@@ -38,14 +43,91 @@ class CandlesOrch(BaseOrch[CandlesBl, CandleModel]):
     def get_candles_by_ticker_from_to(self, ticker: str, from_date: str, to_date: str, timeframe: str, return_type: Literal['dicts', 'df'] = 'dicts') -> Union[List[Dict], pl.DataFrame]:
         start_date = datetime.strptime(from_date, "%Y-%m-%d").date()
         end_date = datetime.strptime(to_date, "%Y-%m-%d").date()
-        candles_df = self.bl.get_candles_df_by_stock_from_to(ticker, start_date, end_date, timeframe)
+        candles_df = self.memory_cache.get(ticker, timeframe, start_date, end_date)
+        if candles_df is None:
+            source_timeframe = self.resampler.get_source_timeframe(timeframe)
+            if source_timeframe is None:
+                candles_df = self.bl.get_candles_df_by_stock_from_to(ticker, start_date, end_date, timeframe)
+            else:
+                source_df = self.get_candles_by_ticker_from_to(ticker, from_date, to_date, source_timeframe, return_type='df')
+                candles_df = self.resampler.resample(source_df, timeframe)
+            self.memory_cache.put(ticker, timeframe, start_date, end_date, candles_df)
         
         if return_type == 'dicts':
             return candles_df.to_dicts()
         elif return_type == 'df':
             return candles_df
 
+    def get_candles_by_tickers_from_to(self, tickers: List[str], from_date: str, to_date: str, timeframes: List[str]) -> Dict[str, TimeFrameDataFrames]:
+        """
+        Returns candles for every ticker x timeframe as {ticker: {timeframe: DataFrame}},
+        serving cached pairs from memory and loading the rest with a single bulk query.
+        Derived timeframes are resampled from their stored source timeframe, which is loaded with the same query.
+        """
+        start_date = datetime.strptime(from_date, "%Y-%m-%d").date()
+        end_date = datetime.strptime(to_date, "%Y-%m-%d").date()
+
+        stored_timeframes = [timeframe for timeframe in timeframes if not self.resampler.is_derived(timeframe)]
+        derived_dfs: Dict[str, TimeFrameDataFrames] = {ticker: {} for ticker in tickers}
+        missing_derived_pairs = []
+        for ticker in tickers:
+            for timeframe in timeframes:
+                if timeframe in stored_timeframes:
+                    continue
+                cached_df = self.memory_cache.get(ticker, timeframe, start_date, end_date)
+                if cached_df is None:
+                    missing_derived_pairs.append((ticker, timeframe))
+                else:
+                    derived_dfs[ticker][timeframe] = cached_df
+
+        source_timeframes = [self.resampler.get_source_timeframe(timeframe) for _, timeframe in missing_derived_pairs]
+        load_timeframes = list(dict.fromkeys(stored_timeframes + source_timeframes))
+        stored_dfs = self._get_stored_candles(tickers, start_date, end_date, load_timeframes)
+        for (ticker, timeframe), source_timeframe in zip(missing_derived_pairs, source_timeframes):
+            candles_df = self.resampler.resample(stored_dfs[ticker][source_timeframe], timeframe)
+            self.memory_cache.put(ticker, timeframe, start_date, end_date, candles_df)
+            derived_dfs[ticker][timeframe] = candles_df
+
+        return {
+            ticker: {timeframe: stored_dfs[ticker][timeframe] if timeframe in stored_timeframes else derived_dfs[ticker][timeframe] for timeframe in timeframes}
+            for ticker in tickers
+        }
+
+    def _get_stored_candles(self, tickers: List[str], start_date: date, end_date: date, timeframes: List[str]) -> Dict[str, TimeFrameDataFrames]:
+        dfs_by_ticker: Dict[str, TimeFrameDataFrames] = {ticker: {} for ticker in tickers}
+        missing_pairs = []
+        for ticker in tickers:
+            for timeframe in timeframes:
+                cached_df = self.memory_cache.get(ticker, timeframe, start_date, end_date)
+                if cached_df is None:
+                    missing_pairs.append((ticker, timeframe))
+                else:
+                    dfs_by_ticker[ticker][timeframe] = cached_df
+
+        if missing_pairs:
+            missing_tickers = list(dict.fromkeys(ticker for ticker, _ in missing_pairs))
+            missing_timeframes = list(dict.fromkeys(timeframe for _, timeframe in missing_pairs))
+            loaded_dfs = self.bl.get_candles_dfs_by_stocks_from_to(missing_tickers, start_date, end_date, missing_timeframes)
+            for ticker, timeframe in missing_pairs:
+                candles_df = loaded_dfs[ticker][timeframe]
+                self.memory_cache.put(ticker, timeframe, start_date, end_date, candles_df)
+                dfs_by_ticker[ticker][timeframe] = candles_df
+        return dfs_by_ticker
+
+    def delete_candles_by_stock(self, ticker: str, timeframe: str):
+        stock = self.stocks_orch.get_stock_by_ticker(ticker)
+        result = self.bl.delete_candles_by_stock(stock.ticker, timeframe)
+        # Derived timeframes of the ticker may have been resampled from the deleted candles
+        self.memory_cache.invalidate(stock.ticker)
+        return result
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        return {**self.bl.get_cache_stats(), "memory": self.memory_cache.get_stats()}
     
-    def sync_candles_for_all_timeframes(self):
+    def sync_candles_for_all_timeframes(self) -> Dict[str, Any]:
         stocks = self.stocks_orch.get_stocks()
-        self.bl.sync_candles_for_all_timeframes(stocks)
\ No newline at end of file
+        result = self.bl.sync_candles_for_all_timeframes(stocks)
+        # Cached ranges may now miss the newly synced candles
+        for stock in stocks:
+            self.memory_cache.invalidate(stock.ticker)
+        return result
\ No newline at end of file
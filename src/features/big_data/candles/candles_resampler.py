@@ -0,0 +1,90 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+import polars as pl
+
+from server.src.common.config import CANDLES_STORED_TIMEFRAMES
+
+TIMEFRAME_PATTERN = re.compile(r"^(\d+)(m|h|d|wk|mo)$")
+INTRADAY_UNITS = {"m": 1, "h": 60}  # Minutes per unit
+PERIOD_UNITS = {"d": "d", "wk": "w", "mo": "mo"}  # Polars duration unit of daily and longer timeframes
+
+
+class CandlesResampler:
+    """
+    Derives higher timeframes from stored candles with group_by_dynamic, so only a few timeframes need to be synced
+    and stored. The provider serves minute bars for a few days only, so the longer-history intraday timeframes
+    (5m, 60m) stay stored and the timeframes derived from them keep the provider's full history.
+    Intraday timeframes come from the coarsest stored intraday timeframe that divides them, with windows starting
+    at each day's first bar (the session open, like the provider's own bars). Daily and longer timeframes come
+    from stored daily candles, or from intraday ones when no daily timeframe is stored.
+    """
+    def __init__(self, stored_timeframes: List[str] = list(CANDLES_STORED_TIMEFRAMES)):
+        self.stored_timeframes = [timeframe.lower() for timeframe in stored_timeframes]
+
+    def get_source_timeframe(self, timeframe: str) -> Optional[str]:
+        """Stored timeframe a timeframe is resampled from, or None when it is stored itself or cannot be derived."""
+        if timeframe in self.stored_timeframes:
+            return None
+        parsed = _parse_timeframe(timeframe)
+        if parsed is None:
+            return None
+        minutes, _ = parsed
+        stored_minutes: Dict[str, int] = {}
+        for stored in self.stored_timeframes:
+            parsed_stored = _parse_timeframe(stored)
+            if parsed_stored is not None and parsed_stored[0] is not None:
+                stored_minutes[stored] = parsed_stored[0]
+
+        if minutes is None:
+            if "1d" in self.stored_timeframes:
+                return "1d"
+            sources = list(stored_minutes)
+        else:
+            sources = [stored for stored, source_minutes in stored_minutes.items() if minutes % source_minutes == 0]
+        return max(sources, key=stored_minutes.__getitem__) if sources else None
+
+    def is_derived(self, timeframe: str) -> bool:
+        return self.get_source_timeframe(timeframe) is not None
+
+    def get_synced_timeframes(self, timeframes: List[str]) -> List[str]:
+        """Timeframes of the list that are not derived, so they still have to be downloaded and stored."""
+        return [timeframe for timeframe in timeframes if not self.is_derived(timeframe.lower())]
+
+    def resample(self, df: pl.DataFrame, timeframe: str) -> pl.DataFrame:
+        """
+        Aggregates candles sorted by Datetime into timeframe bars labeled by their first bar's time
+        (daily and longer bars by their period start).
+        """
+        minutes, every = _parse_timeframe(timeframe)
+        ohlcv = [
+            pl.col("Open").first(),
+            pl.col("High").max(),
+            pl.col("Low").min(),
+            pl.col("Close").last(),
+            pl.col("Volume").sum(),
+        ]
+        if minutes is None:
+            resampled = df.group_by_dynamic("Datetime", every=every, start_by="monday" if every.endswith("w") else "window").agg(ohlcv)
+        else:
+            # Windows restart at every day's first bar, so sessions that do not open on the hour keep their alignment
+            resampled = (
+                df.with_columns(pl.col("Datetime").dt.date().alias("session"))
+                .group_by_dynamic("Datetime", every=every, start_by="datapoint", group_by="session")
+                .agg(ohlcv)
+                .drop("session")
+            )
+        return resampled.with_columns(pl.lit(timeframe).alias("timeframe"))
+
+
+def _parse_timeframe(timeframe: str) -> Optional[Tuple[Optional[int], str]]:
+    """Minutes of an intraday timeframe (None for daily and longer) and its polars duration, or None if unsupported."""
+    match = TIMEFRAME_PATTERN.match(timeframe)
+    if match is None:
+        return None
+    count, unit = int(match.group(1)), match.group(2)
+    if unit in INTRADAY_UNITS:
+        return count * INTRADAY_UNITS[unit], f"{count * INTRADAY_UNITS[unit]}m"
+    if unit == "d" and count != 1:
+        return None  # Multi-day bars of the provider follow trading days, which calendar windows cannot reproduce
+    return None, f"{count}{PERIOD_UNITS[unit]}"
@@ -0,0 +1,54 @@
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from common.base.base_mongo_dal import BaseMongoDal
+from server.src.common.services.models.candles_model import CandleSyncWatermarkModel
+from server.src.common.utils.singleton import singleton
+
+COLLECTION_NAME = "candles_sync_watermarks"
+
+WatermarkKey = Tuple[str, str]  # (stock name, timeframe)
+
+
+@singleton
+class CandlesWatermarksDal(BaseMongoDal[CandleSyncWatermarkModel]):
+    """
+    Datetime of the latest synced candle of every stock and timeframe, so a sync only downloads later candles.
+    """
+    def __init__(self):
+        super().__init__(collection_name=COLLECTION_NAME, data_class=CandleSyncWatermarkModel)
+        self.collection.create_index([("stockName", ASCENDING), ("timeframe", ASCENDING)], unique=True)
+
+    def get_watermarks(self, stock_names: List[str], timeframes: List[str]) -> Dict[WatermarkKey, datetime]:
+        """
+        Returns the watermark of every stock and timeframe with a single query, without the pairs never synced.
+        """
+        query = {"stockName": {"$in": stock_names}, "timeframe": {"$in": timeframes}}
+        cursor = self.collection.find(query, {"_id": 0, "stockName": 1, "timeframe": 1, "lastDatetime": 1})
+        return {(doc["stockName"], doc["timeframe"]): doc["lastDatetime"] for doc in cursor}
+
+    def set_watermarks(self, watermarks: Dict[WatermarkKey, datetime], synced_at: datetime):
+        """
+        Moves the watermarks forward in one unordered bulk write; a watermark never moves back.
+        """
+        if not watermarks:
+            return
+        operations = [
+            UpdateOne(
+                {"stockName": stock_name, "timeframe": timeframe},
+                {"$max": {"lastDatetime": last_datetime}, "$set": {"syncedAt": synced_at}},
+                upsert=True,
+            )
+            for (stock_name, timeframe), last_datetime in watermarks.items()
+        ]
+        try:
+            self.collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as bwe:
+            print(f"Bulk write error: {bwe.details}")
+            raise
+
+    def delete_watermark(self, stock_name: str, timeframe: str) -> dict[str, int]:
+        return self.delete_one({"stockName": stock_name, "timeframe": timeframe})
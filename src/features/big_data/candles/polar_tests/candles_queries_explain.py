@@ -0,0 +1,45 @@
+from datetime import datetime
+from typing import Any, Dict, List
+
+from pymongo import ASCENDING, DESCENDING
+
+from features.big_data.candles.candles_dal import CandlesDal
+from features.big_data.candles.candles_watermarks_dal import CandlesWatermarksDal
+
+
+def test_candles_queries_use_indexes(ticker: str = "AAPL", timeframe: str = "1m", from_date: str = "2024-09-10", to_date: str = "2024-10-10"):
+    """
+    Explains every query shape of the candles DALs against the configured MongoDB and asserts that each
+    winning plan reads an index (IXSCAN), with no collection scan and no in-memory sort.
+    Reads that return OHLCV still FETCH the documents, since the prices are not part of the index.
+    """
+    candles_dal = CandlesDal()
+    watermarks_dal = CandlesWatermarksDal()
+    start_date = datetime.strptime(from_date, "%Y-%m-%d").date()
+    end_date = datetime.strptime(to_date, "%Y-%m-%d").date()
+
+    queries = {
+        "get_candles_df_by_stock": (candles_dal.collection, candles_dal._get_candles_query(ticker, start_date, end_date, timeframe), [("datetime", ASCENDING)]),
+        "get_candles_df_by_stocks": (candles_dal.collection, candles_dal._get_candles_bulk_query([ticker, "MSFT"], start_date, end_date, [timeframe, "1d"]), None),
+        "upsert_candles_df": (candles_dal.collection, {"stockName": ticker, "datetime": datetime.combine(start_date, datetime.min.time()), "timeframe": timeframe}, None),
+        "get_latest_candle": (candles_dal.collection, candles_dal._get_stock_timeframe_query(ticker, timeframe), [("datetime", DESCENDING)]),
+        "delete_candles_by_stock": (candles_dal.collection, candles_dal._get_stock_timeframe_query(ticker, timeframe), None),
+        "get_watermarks": (watermarks_dal.collection, {"stockName": {"$in": [ticker]}, "timeframe": {"$in": [timeframe]}}, None),
+    }
+    for name, (collection, query, sort) in queries.items():
+        cursor = collection.find(query)
+        if sort is not None:
+            cursor = cursor.sort(sort)
+        stages = _get_stages(cursor.explain()["queryPlanner"]["winningPlan"])
+        print(f"{name}: {' <- '.join(stages)}")
+        assert "IXSCAN" in stages and "COLLSCAN" not in stages and "SORT" not in stages, f"{name} is not served by an index: {stages}"
+
+
+def _get_stages(plan: Dict[str, Any]) -> List[str]:
+    """Stage names of a winning plan, from the root to the leaves (the classic and slot based plan layouts)."""
+    plan = plan.get("queryPlan", plan)
+    stages = [plan["stage"]] if "stage" in plan else []
+    for child in [plan.get("inputStage"), *plan.get("inputStages", [])]:
+        if child is not None:
+            stages.extend(_get_stages(child))
+    return stages
@@ -0,0 +1,31 @@
+from datetime import datetime
+
+from common.utils.timer import Timer
+from features.big_data.candles.candles_bl import CandlesBl
+
+
+def test_columnar_vs_models_loader(ticker: str = "AAPL", from_date: str = "2024-09-10", to_date: str = "2024-10-10", timeframe: str = "1m", repeat: int = 3):
+    """
+    Compares the CandleModel read path (find -> models -> dicts -> DataFrame)
+    with the columnar read path and prints rows/sec for both.
+    """
+    candles_bl = CandlesBl()
+    start_date = datetime.strptime(from_date, "%Y-%m-%d").date()
+    end_date = datetime.strptime(to_date, "%Y-%m-%d").date()
+
+    models_time = 0.0
+    columnar_time = 0.0
+    for _ in range(repeat):
+        with Timer("--------models loader --------") as t:
+            candles = candles_bl.dal.get_candles_by_stock(ticker, start_date, end_date, timeframe)
+            models_df = candles_bl._to_df(candles, timeframe)
+        models_time += t.execution_time
+
+        with Timer("--------columnar loader --------") as t:
+            columnar_df = candles_bl.get_candles_df_by_stock_from_to(ticker, start_date, end_date, timeframe)
+        columnar_time += t.execution_time
+
+    rows = len(columnar_df)
+    print(f"Rows: {rows} (models path returned {len(models_df)})")
+    print(f"models loader:   {rows * repeat / models_time:,.0f} rows/sec")
+    print(f"columnar loader: {rows * repeat / columnar_time:,.0f} rows/sec")
@@ -1,16 +1,21 @@
+import hashlib
 import importlib
 
 import json
 import logging
 import os
+import threading
 from typing import Any, Dict, List
 import polars as pl
 from pymongo.client_session import ClientSession
 
 
 from common.base.base_mongo_bl import BaseMongoBl
-from common.services.models.conditions_model import ConditionsModel
+from common.services.models.conditions_model import ConditionPlan, ConditionsModel
 from features.big_data.calculations.calculations_bl import CalculationsBl
+from features.big_data.calculations.compile_utils import exec_definitions
+from features.big_data.calculations.indicator_cache import attach_indicator, make_calc_indicator, make_indicator_expr
+from features.big_data.calculations.timeframe_alignment import align_timeframe
 from features.big_data.conditions.conditions_dal import ConditionsDal
 from features.big_data.conditions.conditions_documenter import ConditionsDocumenter
 from server.src.common.services.models.calculations_model import CompiledCalc
@@ -31,8 +36,13 @@ class ConditionsBl(BaseMongoBl[ConditionsDal, ConditionsModel]):
         self.assistant = OpenAIAssistant(vector_store_name="conditions_vector_store", assistant_name="conditions_assistant", instructions=f"You are an expert in python programming and data analysis especially using python polars library. Every time you are asked to create a condition follow the instructions: {prompts1.condition_prompt()}")
         self.execution_namespace = {
             '__builtins__': __builtins__,
-            'pl': pl  # Include necessary libraries in the execution environment
+            'pl': pl,  # Include necessary libraries in the execution environment
+            'attach_indicator': attach_indicator,
+            'align_timeframe': align_timeframe,
         }
+        self.plans: Dict[str, ConditionPlan] = {}  # Compiled conditions with their calculation closure, by symbol
+        self._plans_lock = threading.Lock()
+        CalculationsBl().add_change_listener(self._on_calculation_changed)
         
     def get_embedding(self, document: Dict[str, Any]):
         text = f"{document.get('name', '')} {document.get('short_description', '')} {document.get('long_description', '')}"
@@ -91,18 +101,69 @@ class ConditionsBl(BaseMongoBl[ConditionsDal, ConditionsModel]):
 
         self.compiled_calculations = {**self.compiled_calculations, **all_compiled_calcs}
         
-        # Create temporary namespace for compilation
-        temp_namespace = {}
-        
-        # Compile and execute the condition code
-        code_obj = compile(calc_pl, f"<condition {symbol}>", 'exec')
-        exec(code_obj, {**self.execution_namespace, **self.compiled_calculations}, temp_namespace)
+        # Compile and execute the condition code, with cached and expression access to the required calculations
+        temp_namespace = exec_definitions(calc_pl, f"<condition {symbol}>", {
+            **self.execution_namespace, **self.compiled_calculations,
+            'calc_indicator': make_calc_indicator(all_compiled_calcs),
+            'indicator_expr': make_indicator_expr(all_compiled_calcs),
+        })
 
         self.compiled_conditions[symbol] = temp_namespace
         self.execution_namespace[symbol] = temp_namespace
 
         return self.execution_namespace[symbol]
 
+    def get_calculation_sources(self, required_calculations: List[str]) -> Dict[str, str]:
+        """
+        Returns the source of every calculation the condition needs, dependencies first.
+        """
+        return CalculationsBl().get_calculation_sources(required_calculations or [])
+
+    def get_condition_plan(self, symbol: str) -> ConditionPlan:
+        """
+        Returns the compiled condition and its calculation closure, building it from Mongo only on the first call.
+        Plans stay cached until the condition or one of its calculations is updated or deleted.
+        """
+        plan = self.plans.get(symbol)
+        if plan:
+            return plan
+
+        with self._plans_lock:
+            if symbol in self.plans:
+                return self.plans[symbol]
+
+            condition = self.get_condition_by_symbol(symbol)
+            if not condition:
+                raise ValueError(f"Condition {symbol} not found")
+            calculation_sources = self.get_calculation_sources(condition.required_calculations)
+            compiled_calc = self.get_compiled_calc_pl(condition.calc_pl, condition.symbol, condition.required_calculations)
+
+            version = hashlib.sha256(condition.calc_pl.encode())
+            for calculation_symbol, calc_pl in calculation_sources.items():
+                version.update(f"\0{calculation_symbol}\0{calc_pl}".encode())
+
+            plan = ConditionPlan(symbol=condition.symbol, version=version.hexdigest(), params=condition.params or {},
+                                 calc_pl=compiled_calc['calc_pl'], calc_expr=compiled_calc.get('calc_expr'), calc_pl_source=condition.calc_pl,
+                                 calculation_sources=calculation_sources)
+            self.plans[symbol] = plan
+            return plan
+
+    def invalidate_condition(self, symbol: str):
+        with self._plans_lock:
+            self.plans.pop(symbol, None)
+            self.compiled_conditions.pop(symbol, None)
+            self.execution_namespace.pop(symbol, None)
+
+    def _on_calculation_changed(self, calculation_symbol: str):
+        # Drop every plan whose closure contains the calculation, and the compiled calculations they were built with
+        with self._plans_lock:
+            self.compiled_calculations = {}
+            for symbol, plan in list(self.plans.items()):
+                if calculation_symbol.lower() in (required_symbol.lower() for required_symbol in plan['calculation_sources']):
+                    self.plans.pop(symbol, None)
+                    self.compiled_conditions.pop(symbol, None)
+                    self.execution_namespace.pop(symbol, None)
+
     def execute_condition(self, class_name: str, params: dict, dfs: pl.DataFrame):
         """
         Executes the specified condition on the provided DataFrame.
@@ -122,6 +183,7 @@ class ConditionsBl(BaseMongoBl[ConditionsDal, ConditionsModel]):
         """
         try:
             self.dal.update(symbol, update_data)
+            self.invalidate_condition(symbol)
             return {"status": "success", "message": "Condition updated."}
         except Exception as e:
             return {"status": "error", "message": str(e)}
@@ -132,6 +194,7 @@ class ConditionsBl(BaseMongoBl[ConditionsDal, ConditionsModel]):
         """
         try:
             self.dal.delete(symbol)
+            self.invalidate_condition(symbol)
             return {"status": "success", "message": "Condition deleted."}
         except Exception as e:
             return {"status": "error", "message": str(e)}
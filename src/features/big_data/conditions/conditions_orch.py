@@ -6,7 +6,7 @@ from common.base.base_orch import BaseOrch
 from common.services.proxy.interfaces.big_data.candles_common_services_contract import CandlesCommonServicesContract
 from common.services.proxy.proxy_locator_cs import ProxyLocatorCS
 from common.services.proxy.interfaces.stocks_common_services_contract import StocksCommonServicesContract
-from server.src.common.services.models.conditions_model import ConditionsModel
+from server.src.common.services.models.conditions_model import ConditionPlan, ConditionsModel
 from server.src.common.utils.singleton import singleton
 from server.src.features.big_data.conditions.condition_checker import ConditionChecker
 
@@ -30,6 +30,9 @@ class ConditionsOrch(BaseOrch[ConditionsBl, ConditionsModel]):
     def get_compiled_calc_pl(self, condition: ConditionsModel):
         return self.bl.get_compiled_calc_pl(condition.calc_pl, condition.symbol, condition.required_calculations)
             
+    def get_condition_plan(self, symbol: str) -> ConditionPlan:
+        return self.bl.get_condition_plan(symbol)
+            
     def find_similar_conditions(self, embedding, top_k=5):
         return self.bl.find_similar_conditions(embedding, top_k)
 
@@ -74,11 +74,11 @@ def calc_pl(dfs, params):
 
         # Calculate ATR using required calculations dynamically
         atr_params = {"timeframe": condition_timeframe, "window": atr_window}
-        atr_result = globals().get('atr')['calc_pl'](df, atr_params)
+        atr_result = calc_indicator(dfs, 'atr', atr_params)
 
         # Merge ATR result into the original DataFrame
         atr_col = f"ATR_{condition_timeframe}_{atr_window}"
-        df = df.join(atr_result, on="Datetime", how="left")
+        df = attach_indicator(df, atr_result)
 
         # Compute the threshold for price movement based on ATR
         threshold_col = (pl.col(atr_col) * atr_multiplier).alias("atr_threshold")
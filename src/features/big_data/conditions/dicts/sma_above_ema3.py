@@ -30,11 +30,11 @@ def calc_pl(dfs, params):
     sma_params = {"timeframe": condition_timeframe, "window": sma_window}
     ema_params = {"timeframe": condition_timeframe, "window": ema_window}
 
-    sma_result = globals().get('sma')['calc_pl'](df, sma_params)
-    ema_result = globals().get('ema')['calc_pl'](df, ema_params)
+    sma_result = calc_indicator(dfs, 'sma', sma_params)
+    ema_result = calc_indicator(dfs, 'ema', ema_params)
 
     # Merge SMA and EMA results into the original DataFrame
-    df = df.join(sma_result, on="Datetime", how="left").join(ema_result, on="Datetime", how="left")
+    df = attach_indicator(attach_indicator(df, sma_result), ema_result)
 
     # Generate column names
     sma_col = f"SMA_{condition_timeframe}_{sma_window}"
@@ -54,4 +54,15 @@ def calc_pl(dfs, params):
 
     # Return the condition as a Boolean Series
     return df.with_columns(condition.alias("Condition")).select("Condition")
+
+def calc_expr(params):
+    # Same condition as one expression on the condition timeframe, for fused lazy plans
+    condition_timeframe = params['condition_timeframe']
+    sma = indicator_expr('sma', {"timeframe": condition_timeframe, "window": params['sma_window']})
+    ema = indicator_expr('ema', {"timeframe": condition_timeframe, "window": params['ema_window']})
+    if params['is_long']:
+        condition = (sma.shift(1) <= ema.shift(1)) & (sma > ema)
+    else:
+        condition = (sma.shift(1) >= ema.shift(1)) & (sma < ema)
+    return condition.alias("Condition")
 """
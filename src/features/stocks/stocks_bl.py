@@ -46,5 +46,12 @@ class StocksBl(BaseMongoBl[StocksDal, StockModel]):
         """
         return self.dal.get_stock_by_ticker(ticker)
     
+    def get_stocks_by_tickers(self, tickers: list[str]):
+        """
+        Retrieves the stocks matching the given ticker symbols.
+        Returns a list of Stock objects.
+        """
+        return self.dal.get_stocks_by_tickers(tickers)
+    
     def get_stocks(self):
         return self.dal.find({})
\ No newline at end of file
@@ -19,6 +19,13 @@ class StocksDal(BaseMongoDal[StockModel]):
         """
         return self.find_one({"ticker": ticker})
 
+    def get_stocks_by_tickers(self, tickers: list[str]) -> list[StockModel]:
+        """
+        Retrieves all stocks matching the given ticker symbols in a single query.
+        Returns a list of Stock objects.
+        """
+        return self.find({"ticker": {"$in": tickers}})
+
     def get_stock_by_name(self, name: str) -> list[StockModel]:
         """
         Retrieves stocks with a similar name.
@@ -19,6 +19,16 @@ class StocksOrch(BaseOrch[StocksBl, StockModel]):
             raise ValueError(f"Stock with ticker '{ticker}' not found.")
         return stock
     
+    def get_stocks_by_tickers(self, tickers: list[str]) -> list[StockModel]:
+        """
+        Retrieve stocks by their ticker symbols in a single lookup.
+        """
+        stocks = self.bl.get_stocks_by_tickers(tickers)
+        missing_tickers = set(tickers) - {stock.ticker for stock in stocks}
+        if missing_tickers:
+            raise ValueError(f"Stocks with tickers {sorted(missing_tickers)} not found.")
+        return stocks
+    
     def add_stock_if_not_exists(self, ticker: str, company_name: str = ""):
         """
         Add a stock to the database if it does not already exist.
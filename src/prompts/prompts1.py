@@ -78,8 +78,9 @@ Use standardized terms for actions and logical operators (e.g., crosses_above, g
         - `dfs`: A dictionary where each key is a timeframe, and each value is a DataFrame with columns {columns}. Only the condition timeframe can include {after_entry_columns} if used for exit.
         - `params`: The parameters for the condition, as structured above.
       - **Function Details**:
-        - Execute required calculations dynamically using `globals().get('<calculation_class_name>')['calc_pl'](df, params)` and expect the result to be a `pl.DataFrame` with Datetime and the calculated columns like SMA_<timeframe>_<window>.
-        - If different timeframes are used, merge them on the condition timeframe and fill missing values from the higher timeframe if needed.
+        - Execute required calculations with `calc_indicator(dfs, '<calculation_symbol>', params)`, where `params` must include the `timeframe`; it is computed once per run and shared with other conditions. Expect the result to be a `pl.DataFrame` with Datetime and the calculated columns like SMA_<timeframe>_<window>.
+        - Attach calculation results to the frame they were computed from with `attach_indicator(df, result)` instead of joining on Datetime.
+        - If different timeframes are used, bring higher timeframe columns onto the condition timeframe with `align_timeframe(dfs, frame, source_timeframe, condition_timeframe)` instead of `join_asof`; `frame` is `dfs[source_timeframe]` or a calculation on it, and the result is row-aligned with `dfs[condition_timeframe]` (attach it with `with_columns`).
         - **Unique Column Names**: Because we not know if there are cases where df contain the same column multiple times (e.g., two SMAs with different windows), ensure unique column names and append the parameter value and timeframe (e.g., `SMA_<timeframe>_<window>`).
         - **Adapt the logic** to handle both long and short positions as defined by `is_long`.
         - avoid nested f-string issue.
@@ -150,6 +151,7 @@ Create a new calculation Python Dictionary that defines a technical indicator or
             - Dont add any comments for Args and Returns and dont add try-catch blocks.
             - Include at the top: `import` relevant libraries, `import polars as pl`..
             Other used calculations will be available via `globals().get('<calculation_symbol>')`.
+            - Prefer defining the calculation once as `calc_expr(params)` returning the aliased `pl.Expr` (or a list of them), and implement `calc_pl` as `df.select(['Datetime', calc_expr(params)])`, so it can also be fused into lazy plans.
             - **Avoid Overwriting**: Do not overwrite existing columns when performing new calculations on the same DataFrame, use alias with timeframe and parameter value.
             - use alias with logical naming to avoid multiple expressions are returning the same default column.
             - If any required calculation (such as SMA, EMA, etc.) already exists, reuse it dynamically using `globals().get('<symbol>')['calc_pl'](df, params)` and alias the result how you want.